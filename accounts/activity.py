@@ -0,0 +1,115 @@
+"""
+Throttled tracking of ``CustomUser.last_activity``.
+
+Authenticated requests report activity to a per-process tracker, which
+records a user at most once per ``USER_ACTIVITY_WINDOW`` seconds. A
+background thread writes the collected timestamps with a single bulk UPDATE
+once per window, so pending values reach the database even when no further
+requests arrive, and no request pays for writing other users' activity.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACTIVITY_WINDOW = 300
+
+
+def tracking_enabled():
+    """Whether authenticated requests record activity at all"""
+    return getattr(settings, 'USER_ACTIVITY_TRACKING', True)
+
+
+def get_activity_window():
+    """Seconds between recorded activity updates for the same user"""
+    return getattr(settings, 'USER_ACTIVITY_WINDOW', DEFAULT_ACTIVITY_WINDOW)
+
+
+class ActivityTracker:
+    """Per-process map of users' last recorded and unsaved activity"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._pending = {}
+        self._worker = None
+
+    def touch(self, user_id, now=None):
+        """Record activity for a user; return False if it fell inside the window"""
+        if not tracking_enabled():
+            return False
+        now = now or timezone.now()
+        window = get_activity_window()
+        with self._lock:
+            last_seen = self._last_seen.get(user_id)
+            if last_seen is not None and (now - last_seen).total_seconds() < window:
+                return False
+            self._last_seen[user_id] = now
+            self._pending[user_id] = now
+        if window <= 0:
+            self.flush()
+        else:
+            self._ensure_worker()
+        return True
+
+    def flush(self):
+        """Write pending timestamps in bulk and return the number of users updated"""
+        window = get_activity_window()
+        now = timezone.now()
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            # Forget users idle for longer than the window to keep the map small
+            self._last_seen = {
+                user_id: seen for user_id, seen in self._last_seen.items()
+                if (now - seen).total_seconds() < window
+            }
+        if not batch:
+            return 0
+
+        User = get_user_model()
+        users = [User(pk=user_id, last_activity=seen) for user_id, seen in batch.items()]
+        try:
+            User.objects.bulk_update(users, ['last_activity'], batch_size=500)
+        except Exception:
+            with self._lock:
+                for user_id, seen in batch.items():
+                    self._pending.setdefault(user_id, seen)
+            raise
+        return len(users)
+
+    def _ensure_worker(self):
+        # Started lazily so every (forked) worker process gets its own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(max(get_activity_window(), 1))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush user activity')
+            finally:
+                connections.close_all()
+
+
+activity_tracker = ActivityTracker()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        activity_tracker.flush()
+    except Exception:
+        logger.exception('Failed to flush user activity on shutdown')
@@ -10,6 +10,7 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ['role', 'is_staff', 'is_active', 'date_joined']
     search_fields = ['username', 'email', 'first_name', 'last_name']
     ordering = ['-date_joined']
+    readonly_fields = ['last_activity']
     
     fieldsets = UserAdmin.fieldsets + (
         ('Role & Profile', {'fields': ('role', 'bio', 'profile_image', 'last_activity')}),
@@ -1,19 +1,32 @@
-from django.utils import timezone
-from django.contrib.auth import get_user_model
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 
-User = get_user_model()
+from .activity import activity_tracker
 
 
 class UserActivityMiddleware:
     """Middleware to track user activity"""
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
     
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
         if request.user.is_authenticated:
-            # Update last_activity timestamp
-            User.objects.filter(pk=request.user.pk).update(last_activity=timezone.now())
+            # Throttled per user and written in bulk by the tracker
+            activity_tracker.touch(request.user.pk)
         
         response = self.get_response(request)
         return response
+    
+    async def __acall__(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            # touch() occasionally flushes to the database, which must not run on the event loop
+            await sync_to_async(activity_tracker.touch)(user.pk)
+        return await self.get_response(request)
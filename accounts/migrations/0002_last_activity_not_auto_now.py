@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
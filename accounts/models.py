@@ -15,7 +15,7 @@ class CustomUser(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='reader')
     bio = models.TextField(blank=True, null=True)
     profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
-    last_activity = models.DateTimeField(auto_now=True)
+    last_activity = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
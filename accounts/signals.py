@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from blog import jobs
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def generate_profile_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Create resized copies of a newly uploaded profile image"""
+    if raw or not instance.profile_image or (update_fields and 'profile_image' not in update_fields):
+        return
+    name = instance.profile_image.name
+    jobs.enqueue('blog.generate_image_variants', {'name': name}, key=f'image-variants:{name}')
@@ -1,3 +1,66 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .activity import ActivityTracker
+
+User = get_user_model()
+
+
+@override_settings(USER_ACTIVITY_WINDOW=60)
+class ActivityTrackerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='pass12345')
+        cls.bob = User.objects.create_user('bob', password='pass12345')
+
+    def test_activity_is_throttled_per_window(self):
+        tracker = ActivityTracker()
+        now = timezone.now()
+
+        self.assertTrue(tracker.touch(self.alice.pk, now=now))
+        self.assertFalse(tracker.touch(self.alice.pk, now=now + timedelta(seconds=30)))
+        self.assertTrue(tracker.touch(self.alice.pk, now=now + timedelta(seconds=61)))
+
+    def test_pending_activity_is_flushed_in_bulk(self):
+        tracker = ActivityTracker()
+        now = timezone.now()
+        tracker.touch(self.alice.pk, now=now)
+        tracker.touch(self.bob.pk, now=now)
+        self.alice.refresh_from_db()
+        self.assertIsNone(self.alice.last_activity)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(tracker.flush(), 2)
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.last_activity, now)
+        self.assertEqual(self.bob.last_activity, now)
+
+    def test_profile_save_does_not_touch_last_activity(self):
+        self.alice.bio = 'Hello'
+        self.alice.save()
+        self.alice.refresh_from_db()
+        self.assertIsNone(self.alice.last_activity)
+
+
+@override_settings(USER_ACTIVITY_WINDOW=1)
+class ActivityFlushTests(TransactionTestCase):
+    def test_pending_activity_is_written_without_another_touch(self):
+        alice = User.objects.create_user('alice', password='pass12345')
+        tracker = ActivityTracker()
+        now = timezone.now()
+        tracker.touch(alice.pk, now=now)
+
+        # The background flusher writes it within a window or so
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            alice.refresh_from_db()
+            if alice.last_activity is not None:
+                break
+            time.sleep(0.1)
+        self.assertEqual(alice.last_activity, now)
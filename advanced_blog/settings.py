@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -59,12 +60,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'blog.routers.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog.instrumentation.RequestInstrumentationMiddleware',
     'accounts.middleware.UserActivityMiddleware',
 ]
 
@@ -103,6 +106,84 @@ DATABASES = {
 if 'DATABASE_URL' in os.environ:
     DATABASES['default'] = dj_database_url.config(conn_max_age=600, ssl_require=True)
 
+# Read replicas: a comma-separated list of database URLs (e.g.
+# sqlite:////path/to/replica.sqlite3 or postgres://...) added as replica1,
+# replica2, ... Safe-method requests read from a replica; writes, and reads
+# for BLOG_PRIMARY_PIN_SECONDS after a browser's last write, use the primary
+BLOG_DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    # Tests run against the primary alone
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    BLOG_DATABASE_REPLICAS.append(alias)
+if BLOG_DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+BLOG_PRIMARY_PIN_SECONDS = int(os.environ.get('BLOG_PRIMARY_PIN_SECONDS', '10'))
+
+
+# Cache
+# Page-cache invalidation bumps versions in this cache, so every worker process
+# must share it: REDIS_URL selects Redis (needs the redis package), otherwise a
+# file-based cache in CACHE_DIR is shared by the workers on one box. Local
+# memory is per process and only used in development (DEBUG) without either
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif 'CACHE_DIR' in os.environ or not DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'advanced_blog_cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Anonymous full-page cache for public blog pages (seconds)
+BLOG_PAGE_CACHE_ENABLED = os.environ.get('BLOG_PAGE_CACHE_ENABLED', 'True') == 'True'
+BLOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('BLOG_PAGE_CACHE_TIMEOUT', '300'))
+
+# RSS/Atom feeds: items per feed, and how long (seconds) a rendered feed is
+# kept; feeds are regenerated as soon as a post in them changes regardless
+BLOG_FEED_ITEMS = int(os.environ.get('BLOG_FEED_ITEMS', '20'))
+BLOG_FEED_CACHE_TIMEOUT = int(os.environ.get('BLOG_FEED_CACHE_TIMEOUT', '86400'))
+# Public address of the site, used for absolute URLs in sitemaps and robots.txt
+BLOG_SITE_URL = os.environ.get('BLOG_SITE_URL') or (
+    f"https://{os.environ['RAILWAY_PUBLIC_DOMAIN']}" if 'RAILWAY_PUBLIC_DOMAIN' in os.environ
+    else 'http://localhost:8000'
+)
+
+# Sitemap files written by `manage.py generate_sitemaps`, at most
+# BLOG_SITEMAP_SEGMENT_SIZE URLs each
+BLOG_SITEMAP_ROOT = os.environ.get('BLOG_SITEMAP_ROOT', str(BASE_DIR / 'sitemaps'))
+BLOG_SITEMAP_SEGMENT_SIZE = int(os.environ.get('BLOG_SITEMAP_SEGMENT_SIZE', '50000'))
+
+# Comments shown on a post page and per "load more" request
+BLOG_COMMENTS_PER_PAGE = int(os.environ.get('BLOG_COMMENTS_PER_PAGE', '20'))
+# Pending comments listed for bulk moderation on the author dashboard
+BLOG_MODERATION_QUEUE_SIZE = int(os.environ.get('BLOG_MODERATION_QUEUE_SIZE', '50'))
+
+# Related posts stored per post by `manage.py refresh_related_posts`
+BLOG_RELATED_POSTS = int(os.environ.get('BLOG_RELATED_POSTS', '5'))
+
+# Trending ranking: seconds for a view's weight to halve, posts kept per
+# ranking, and seconds between rebuilds of the trending and most-read lists;
+# "most read" counts the views of the last BLOG_POPULAR_DAYS days
+BLOG_TRENDING_HALF_LIFE = int(os.environ.get('BLOG_TRENDING_HALF_LIFE', '21600'))
+BLOG_RANKING_SIZE = int(os.environ.get('BLOG_RANKING_SIZE', '50'))
+BLOG_TRENDING_REFRESH_INTERVAL = int(os.environ.get('BLOG_TRENDING_REFRESH_INTERVAL', '60'))
+BLOG_POPULAR_DAYS = int(os.environ.get('BLOG_POPULAR_DAYS', '7'))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -166,6 +247,54 @@ CKEDITOR_CONFIGS = {
     },
 }
 
+# Post view counts are buffered in memory and written in batches every
+# BLOG_VIEW_COUNT_FLUSH_INTERVAL seconds (0 writes each view immediately);
+# BLOG_VIEW_COUNTING=False stops counting views altogether
+BLOG_VIEW_COUNTING = os.environ.get('BLOG_VIEW_COUNTING', 'True') == 'True'
+BLOG_VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('BLOG_VIEW_COUNT_FLUSH_INTERVAL', '10'))
+
+# CustomUser.last_activity is recorded at most once per user per window (seconds)
+USER_ACTIVITY_TRACKING = os.environ.get('USER_ACTIVITY_TRACKING', 'True') == 'True'
+USER_ACTIVITY_WINDOW = int(os.environ.get('USER_ACTIVITY_WINDOW', '300'))
+
+# Serve the public read views (home, post, category, tag, search) with their
+# async variants; only worthwhile under an ASGI server (see DEPLOYMENT.md)
+BLOG_ASYNC_VIEWS = os.environ.get('BLOG_ASYNC_VIEWS', 'False') == 'True'
+
+# Background jobs (blog.jobs). With BLOG_JOBS_EAGER on (the default) they run
+# in-process after the triggering transaction commits, so a deployment that
+# only starts the web server (railway.json) still runs them. Turn it off once
+# `manage.py run_worker` runs next to the web server (the Procfile `worker:`
+# process) to take the work off requests; the worker also retries failed jobs.
+# Finished jobs are deleted after BLOG_JOB_RETENTION seconds.
+BLOG_JOBS_EAGER = os.environ.get('BLOG_JOBS_EAGER', 'True') == 'True'
+BLOG_JOB_RETRY_DELAY = int(os.environ.get('BLOG_JOB_RETRY_DELAY', '10'))
+BLOG_JOB_RETENTION = int(os.environ.get('BLOG_JOB_RETENTION', str(7 * 24 * 3600)))
+
+# Per-request instrumentation (blog.instrumentation). Timings are sent in a
+# Server-Timing header when BLOG_SERVER_TIMING is on (it exposes them to every
+# visitor, so it defaults to DEBUG) and BLOG_REQUEST_LOG_SAMPLE_RATE of
+# requests (0-1) are logged as JSON lines; queries slower than
+# BLOG_SLOW_QUERY_MS are logged as warnings (0 turns that off)
+BLOG_SERVER_TIMING = os.environ.get('BLOG_SERVER_TIMING', str(DEBUG)) == 'True'
+BLOG_REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('BLOG_REQUEST_LOG_SAMPLE_RATE', '0.01'))
+BLOG_SLOW_QUERY_MS = float(os.environ.get('BLOG_SLOW_QUERY_MS', '100'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'blog.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('BLOG_INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
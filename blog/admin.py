@@ -1,11 +1,12 @@
 from django.contrib import admin
-from .models import Post, Category, Tag, Comment
+from django.utils import timezone
+from .models import Post, Category, Tag, Comment, Job
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """Admin for Category model"""
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'published_post_count', 'created_at']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
     ordering = ['name']
@@ -14,7 +15,7 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     """Admin for Tag model"""
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'published_post_count', 'created_at']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
     ordering = ['name']
@@ -31,7 +32,7 @@ class CommentInline(admin.TabularInline):
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     """Admin for Post model"""
-    list_display = ['title', 'author', 'category', 'status', 'views', 'created_at', 'published_at']
+    list_display = ['title', 'author', 'category', 'status', 'views', 'approved_comment_count', 'created_at', 'published_at']
     list_filter = ['status', 'category', 'tags', 'created_at', 'published_at']
     search_fields = ['title', 'content', 'author__username']
     prepopulated_fields = {'slug': ('title',)}
@@ -39,6 +40,7 @@ class PostAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
     inlines = [CommentInline]
+    readonly_fields = ['views']
     
     fieldsets = (
         ('Basic Information', {
@@ -74,12 +76,31 @@ class CommentAdmin(admin.ModelAdmin):
     
     def approve_comments(self, request, queryset):
         """Bulk approve comments"""
-        queryset.update(approved=True)
-        self.message_user(request, f'{queryset.count()} comments approved.')
+        approved = queryset.approve()
+        self.message_user(request, f'{approved} comments approved.')
     approve_comments.short_description = 'Approve selected comments'
     
     def disapprove_comments(self, request, queryset):
         """Bulk disapprove comments"""
-        queryset.update(approved=False)
-        self.message_user(request, f'{queryset.count()} comments disapproved.')
+        disapproved = queryset.disapprove()
+        self.message_user(request, f'{disapproved} comments disapproved.')
     disapprove_comments.short_description = 'Disapprove selected comments'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Admin for background jobs"""
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'idempotency_key']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at']
+    actions = ['retry_jobs']
+    ordering = ['-created_at']
+    
+    def retry_jobs(self, request, queryset):
+        """Queue failed jobs again"""
+        retried = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f'{retried} jobs queued again.')
+    retry_jobs.short_description = 'Retry selected failed jobs'
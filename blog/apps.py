@@ -6,4 +6,7 @@ class BlogConfig(AppConfig):
     name = 'blog'
     
     def ready(self):
+        # Hooks every new database connection, so it must be in place before the first one opens
+        import blog.instrumentation
         import blog.signals
+        import blog.tasks
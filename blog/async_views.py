@@ -0,0 +1,107 @@
+"""
+Async variants of the public read views.
+
+They reuse the synchronous views' querysets, templates and page cache, but
+fetch their data with the async ORM from the event loop, awaiting the post
+list and the sidebar together. Under an ASGI server a slow query or a slow
+client then holds a coroutine instead of a whole worker. Templates are
+still rendered by Django in a worker thread. ``blog.urls`` routes to these
+views when ``BLOG_ASYNC_VIEWS`` is enabled.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import aprefetch_related_objects
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+
+from . import popularity
+from .models import Category, Post, Tag
+from .related import related_cards
+from .viewcounts import view_counts
+from .views import CategoryPostsView, HomeView, PostDetailView, SearchView, TagPostsView, get_comment_paginator
+
+
+class AsyncListViewMixin:
+    """Run a paginated ListView's queries on the event loop"""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = await self.aget_queryset()
+        page_size = self.get_paginate_by(self.object_list)
+        self._paginated, extra_context = await asyncio.gather(
+            self.apaginate_queryset(self.object_list, page_size),
+            self.aget_extra_context(),
+        )
+        context = self.get_context_data()
+        context.update(extra_context)
+        return self.render_to_response(context)
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def aget_extra_context(self):
+        """Evaluated context entries fetched alongside the page of posts"""
+        return {}
+
+    def paginate_queryset(self, queryset, page_size):
+        # The page was already fetched asynchronously in get()
+        return self._paginated
+
+
+class AsyncHomeView(AsyncListViewMixin, HomeView):
+    async def aget_extra_context(self):
+        categories, tags, trending_posts = await asyncio.gather(
+            _alist(Category.objects.filter(published_post_count__gt=0)),
+            _alist(Tag.objects.filter(published_post_count__gt=0)),
+            sync_to_async(popularity.ranked_cards)(popularity.TRENDING, self.trending_size),
+        )
+        return {'categories': categories, 'tags': tags, 'trending_posts': trending_posts}
+
+    def get_trending_posts(self):
+        # Fetched alongside the page in aget_extra_context()
+        return []
+
+
+class AsyncCategoryPostsView(AsyncListViewMixin, CategoryPostsView):
+    async def aget_queryset(self):
+        self.category = await aget_object_or_404(Category, slug=self.kwargs['slug'])
+        return Post.objects.published().filter(category=self.category).cards()
+
+
+class AsyncTagPostsView(AsyncListViewMixin, TagPostsView):
+    async def aget_queryset(self):
+        self.tag = await aget_object_or_404(Tag, slug=self.kwargs['slug'])
+        return Post.objects.published().filter(tags=self.tag).cards()
+
+
+class AsyncSearchView(AsyncListViewMixin, SearchView):
+    pass
+
+
+class AsyncPostDetailView(PostDetailView):
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_visible_posts(await request.auser()).select_related('author', 'category')
+        try:
+            self.object = await queryset.aget(slug=self.kwargs['slug'])
+        except Post.DoesNotExist:
+            raise Http404('No post found matching the query')
+
+        recorded, comments_page, related_posts, _ = await asyncio.gather(
+            sync_to_async(view_counts.record)(self.object.pk),
+            get_comment_paginator(self.object.pk).apage(),
+            _alist(related_cards(self.object)),
+            aprefetch_related_objects([self.object], 'tags'),
+        )
+        self.object.views += recorded
+        self.comments_page = comments_page
+        context = self.get_context_data(object=self.object)
+        context['related_posts'] = related_posts
+        return self.render_to_response(context)
+
+    def get_comments_page(self):
+        # Fetched alongside the post in get()
+        return self.comments_page
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
@@ -0,0 +1,249 @@
+"""
+Latency benchmarks for the blog and accounts URLs.
+
+``ENDPOINTS`` lists every route in ``blog/urls.py`` and ``accounts/urls.py``
+with the user it is requested as and how its URL arguments are picked from
+the data in the database. ``run()`` drives each one through the Django test
+client in-process, so the numbers cover URL resolution, middleware, views,
+queries and template rendering but not a network or WSGI server. Requests are
+sent one after another, so the figures are latencies, not the throughput of
+concurrent clients. Endpoints marked ``writes`` change rows other requests
+or real users see; ``run(read_only=True)`` leaves them out for databases
+that are not throwaway copies, and ``rolled_back()`` undoes whatever else a
+run writes there (sessions of the logged-in users, rebuilt rankings).
+Results are plain dicts that ``compare()`` checks against a stored baseline.
+"""
+import io
+import statistics
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import synthetic
+from .models import Post
+
+
+@dataclass
+class Endpoint:
+    name: str
+    viewname: str
+    role: str = 'anonymous'
+    method: str = 'GET'
+    kwargs: tuple = ()
+    query: str = ''
+    data: dict = field(default_factory=dict)
+    writes: bool = False
+
+
+ENDPOINTS = (
+    Endpoint('home', 'blog:home'),
+    Endpoint('search', 'blog:search', query='query={word}'),
+    Endpoint('post_detail', 'blog:post_detail', kwargs=('post_slug',)),
+    Endpoint('post_comments', 'blog:post_comments', kwargs=('post_slug',)),
+    Endpoint('category_posts', 'blog:category_posts', kwargs=('category_slug',)),
+    Endpoint('tag_posts', 'blog:tag_posts', kwargs=('tag_slug',)),
+    Endpoint('trending', 'blog:trending'),
+    Endpoint('popular', 'blog:popular'),
+    Endpoint('latest_feed', 'blog:latest_feed'),
+    Endpoint('latest_atom_feed', 'blog:latest_atom_feed'),
+    Endpoint('category_feed', 'blog:category_feed', kwargs=('category_slug',)),
+    Endpoint('category_atom_feed', 'blog:category_atom_feed', kwargs=('category_slug',)),
+    Endpoint('tag_feed', 'blog:tag_feed', kwargs=('tag_slug',)),
+    Endpoint('tag_atom_feed', 'blog:tag_atom_feed', kwargs=('tag_slug',)),
+    Endpoint('post_detail_reader', 'blog:post_detail', role='reader', kwargs=('post_slug',)),
+    Endpoint(
+        'add_comment', 'blog:add_comment', role='reader', method='POST',
+        kwargs=('post_slug',), data={'content': 'Benchmark comment.'}, writes=True,
+    ),
+    Endpoint('post_create', 'blog:post_create', role='author'),
+    Endpoint('post_update', 'blog:post_update', role='author', kwargs=('post_slug',)),
+    Endpoint('post_delete', 'blog:post_delete', role='author', kwargs=('post_slug',)),
+    Endpoint('author_dashboard', 'blog:author_dashboard', role='author'),
+    Endpoint(
+        'approve_comment', 'blog:approve_comment', role='author', method='POST',
+        kwargs=('comment_pk',), writes=True,
+    ),
+    Endpoint(
+        'moderate_comments', 'blog:moderate_comments', role='author', method='POST',
+        data={'action': 'approve', 'comment_ids': '{comment_pk}'}, writes=True,
+    ),
+    Endpoint('robots_txt', 'blog:robots_txt'),
+    Endpoint('register', 'accounts:register'),
+    Endpoint('login', 'accounts:login'),
+    Endpoint('profile', 'accounts:profile', role='author'),
+)
+
+# Routes that would destroy the objects or the session the other requests rely on
+SKIPPED = {
+    'blog:delete_comment': 'deletes the comment it is given',
+    'accounts:logout': 'ends the session of the benchmark user',
+    'blog:sitemap_index': 'serves files written by generate_sitemaps',
+    'blog:sitemap_segment': 'serves files written by generate_sitemaps',
+}
+
+ARGUMENT_NAMES = {'post_slug': 'slug', 'category_slug': 'slug', 'tag_slug': 'slug', 'comment_pk': 'pk'}
+
+
+def sample_arguments():
+    """Pick a published post with a category, tag and comment to build URLs from"""
+    post = (
+        Post.objects.published()
+        .filter(category__isnull=False, tags__isnull=False, comments__isnull=False)
+        .select_related('author', 'category')
+        .order_by('-approved_comment_count', '-pk')
+        .first()
+    )
+    if post is None:
+        raise LookupError('Benchmarks need a published post with a category, a tag and a comment.')
+    comment = post.comments.order_by('pk').first()
+    reader = get_user_model().objects.exclude(pk=post.author_id).order_by('pk').first() or post.author
+    return {
+        'post_slug': post.slug,
+        'category_slug': post.category.slug,
+        'tag_slug': post.tags.order_by('pk').first().slug,
+        'comment_pk': comment.pk,
+        'word': post.title.split()[0].lower(),
+        'users': {'reader': reader, 'author': post.author},
+    }
+
+
+def endpoint_url(endpoint, arguments):
+    kwargs = {ARGUMENT_NAMES[name]: arguments[name] for name in endpoint.kwargs}
+    url = reverse(endpoint.viewname, kwargs=kwargs)
+    if endpoint.query:
+        url += '?' + endpoint.query.format(**arguments)
+    return url
+
+
+def endpoint_data(endpoint, arguments):
+    return {key: value.format(**arguments) if isinstance(value, str) else value for key, value in endpoint.data.items()}
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of ``values``"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies, queries, statuses):
+    """Reduce per-request timings (in seconds) to the reported figures"""
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'statuses': sorted(set(statuses)),
+    }
+
+
+def benchmark_endpoint(client, endpoint, url, requests, warmup, data=None):
+    """Time ``requests`` calls of one endpoint after ``warmup`` untimed ones"""
+    send = getattr(client, endpoint.method.lower())
+    data = endpoint.data if data is None else data
+    for _ in range(warmup):
+        send(url, data)
+    latencies, queries, statuses = [], [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(url, data)
+            latencies.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        statuses.append(response.status_code)
+    return summarize(latencies, queries, statuses)
+
+
+def default_host():
+    """A host the test client may use under ALLOWED_HOSTS"""
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+    return 'localhost' if host.startswith('.') or host == '*' else host
+
+
+def role_clients(arguments, host='localhost'):
+    """A test client per role, logged in as the sampled users"""
+    clients = {'anonymous': Client(SERVER_NAME=host)}
+    for role, user in arguments['users'].items():
+        clients[role] = Client(SERVER_NAME=host)
+        clients[role].force_login(user)
+    return clients
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is rolled back, leaving the database as it was"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def throwaway_database(posts, seed=0):
+    """Run the block against a fresh test database seeded with ``posts`` synthetic posts"""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        synthetic.generate(
+            posts=posts,
+            users=max(20, posts // 50),
+            tags=max(10, min(500, posts // 4)),
+            seed=seed,
+        )
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def run(requests=50, warmup=5, host='localhost', only=None, progress=None, read_only=False):
+    """Benchmark every endpoint (or the names in ``only``) and return results by name"""
+    arguments = sample_arguments()
+    clients = role_clients(arguments, host)
+
+    results = {}
+    for endpoint in ENDPOINTS:
+        if (only and endpoint.name not in only) or (read_only and endpoint.writes):
+            continue
+        url = endpoint_url(endpoint, arguments)
+        data = endpoint_data(endpoint, arguments)
+        result = benchmark_endpoint(clients[endpoint.role], endpoint, url, requests, warmup, data)
+        results[endpoint.name] = {'method': endpoint.method, 'url': url, 'role': endpoint.role, **result}
+        if progress:
+            progress(endpoint.name, results[endpoint.name])
+    return results
+
+
+def compare(results, baseline, tolerance=0.2, min_delta_ms=1.0):
+    """
+    Return a list of regressions against ``baseline``: p95 latency more than
+    ``tolerance`` (and ``min_delta_ms``) slower, more queries per request,
+    or a different set of status codes.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        limit = previous['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > limit and current['p95_ms'] - previous['p95_ms'] >= min_delta_ms:
+            regressions.append(
+                f'{name}: p95 {current["p95_ms"]:.1f}ms, baseline {previous["p95_ms"]:.1f}ms'
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: {current["queries"]:g} queries per request, baseline {previous["queries"]:g}'
+            )
+        if current['statuses'] != previous['statuses']:
+            regressions.append(f'{name}: status {current["statuses"]}, baseline {previous["statuses"]}')
+    return regressions
@@ -0,0 +1,213 @@
+"""
+Full-page cache for anonymous readers.
+
+Cached pages are stored under keys that embed the current version of every
+scope the page depends on (``post:<slug>``, ``category:<slug>``, ``home``...).
+Signal handlers in ``blog.signals`` bump those versions when posts,
+categories, tags or approved comments change, which orphans exactly the
+affected pages without enumerating cache keys. Versions expire a while after
+the longest page or feed timeout, so scopes nobody asks for again (including
+the slugs of URLs that 404) do not pile up in the cache; a version that
+expires only costs its pages a re-render. Works with any Django cache
+backend, but a version bump only reaches the processes sharing that cache:
+local memory is per process and only suits a single development server.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .routers import get_pin_seconds, get_replicas, reading_from_replica
+
+HOME = 'home'
+TAXONOMY = 'taxonomy'
+
+
+def post_scope(slug):
+    return f'post:{slug}'
+
+
+def category_scope(slug):
+    return f'category:{slug}'
+
+
+def tag_scope(slug):
+    return f'tag:{slug}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'BLOG_PAGE_CACHE_ALIAS', 'default')]
+
+
+_BUMPED_KEY = 'blog:page-version:bumped'
+
+
+def _version_key(scope):
+    return f'blog:page-version:{scope}'
+
+
+def get_version_timeout():
+    """Seconds a scope version is kept: twice the longest a page or feed is cached"""
+    longest = max(
+        getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 300) or 0,
+        getattr(settings, 'BLOG_FEED_CACHE_TIMEOUT', 24 * 3600) or 0,
+    )
+    return 2 * longest or None
+
+
+def get_versions(scopes):
+    """Return the current version of each scope, initialising missing ones"""
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh, unique starting point: an evicted version key must
+            # never fall back to a number older pages were stored under
+            cache.add(key, time.time_ns(), get_version_timeout())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes):
+    """Invalidate every cached page depending on any of ``scopes``"""
+    cache = get_cache()
+    for scope in set(scopes):
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), get_version_timeout())
+    if get_replicas():
+        cache.set(_BUMPED_KEY, time.time(), None)
+
+
+def lag_safe_timeout(timeout):
+    """
+    ``timeout``, or the replica lag window if the content was read from a
+    replica that may not have seen the change behind the last version bump.
+    """
+    if not reading_from_replica():
+        return timeout
+    bumped = get_cache().get(_BUMPED_KEY)
+    lag = get_pin_seconds()
+    if bumped is None or time.time() - bumped >= lag:
+        return timeout
+    return lag if timeout is None else min(timeout, lag)
+
+
+def bump_versions_on_commit(scopes):
+    """Bump versions once the current transaction commits"""
+    scopes = list(scopes)
+    transaction.on_commit(lambda: bump_versions(scopes))
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve anonymous GET requests for a view from the page cache.
+
+    Views declare the scopes their output depends on with
+    ``get_page_cache_scopes()``. ``get_page_cache_meta()`` is stored next to
+    the page and handed to ``page_cache_hit()`` when it is served again.
+    """
+    page_cache_timeout = None
+
+    def get_page_cache_scopes(self):
+        raise ImproperlyConfigured(f'{self.__class__.__name__} must define get_page_cache_scopes().')
+
+    def get_page_cache_meta(self):
+        return {}
+
+    def page_cache_hit(self, request, meta):
+        """Hook for side effects that must run even for cached responses"""
+
+    def get_page_cache_timeout(self):
+        if self.page_cache_timeout is not None:
+            return self.page_cache_timeout
+        return getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 300)
+
+    def is_page_cacheable(self, request):
+        return (
+            getattr(settings, 'BLOG_PAGE_CACHE_ENABLED', True)
+            and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            # Flash messages are rendered into the page for this visitor only
+            and not len(get_messages(request))
+        )
+
+    def get_page_cache_key(self, request):
+        versions = '.'.join(str(version) for version in get_versions(self.get_page_cache_scopes()))
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'blog:page:{self.__class__.__name__}:{versions}:{path}'
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self._async_dispatch(request, *args, **kwargs)
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_page_cache_key(request)
+        cached = get_cache().get(key)
+        if cached is not None:
+            self.page_cache_hit(request, cached['meta'])
+            return self._cached_response(request, cached)
+
+        response = super().dispatch(request, *args, **kwargs)
+        self._store_after_render(request, key, response)
+        return response
+
+    async def _async_dispatch(self, request, *args, **kwargs):
+        # Session, user and cache-version lookups are synchronous; run them together off the event loop
+        key = await sync_to_async(self._page_cache_key_if_cacheable)(request)
+        if key is None:
+            return await super().dispatch(request, *args, **kwargs)
+
+        cached = await get_cache().aget(key)
+        if cached is not None:
+            await sync_to_async(self.page_cache_hit)(request, cached['meta'])
+            return self._cached_response(request, cached)
+
+        response = await super().dispatch(request, *args, **kwargs)
+        self._store_after_render(request, key, response)
+        return response
+
+    def _page_cache_key_if_cacheable(self, request):
+        return self.get_page_cache_key(request) if self.is_page_cacheable(request) else None
+
+    def _cached_response(self, request, cached):
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        for header, value in cached['headers'].items():
+            response[header] = value
+        if not cached['headers']:
+            return response
+        # Revalidate against the validators stored with the page, without touching the database
+        last_modified = response.get('Last-Modified')
+        return get_conditional_response(
+            request, etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+            response=response,
+        )
+
+    def _store_after_render(self, request, key, response):
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(lambda rendered: self._store_page(request, key, rendered))
+
+    def _store_page(self, request, key, response):
+        if response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            return
+        get_cache().set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {
+                header: response[header] for header in ('ETag', 'Last-Modified') if response.has_header(header)
+            },
+            'meta': self.get_page_cache_meta(),
+        }, lag_safe_timeout(self.get_page_cache_timeout()))
@@ -0,0 +1,63 @@
+"""
+Lightweight post projection for listings.
+
+``Post.objects.cards()`` selects only the columns a post card displays,
+joined with the author and category names, and yields ``PostCard`` objects
+instead of model instances. Detail and category URLs are built from a
+pattern reversed once per queryset evaluation rather than once per card.
+"""
+from django.db.models.query import ValuesIterable
+from django.urls import reverse
+
+CARD_FIELDS = (
+    'id', 'title', 'slug', 'excerpt', 'featured_image', 'views',
+    'created_at', 'published_at',
+    'author__username', 'category__name', 'category__slug',
+)
+
+_SLUG_PLACEHOLDER = '__slug__'
+
+
+def _url_pattern(viewname):
+    """Return the URL of ``viewname`` split around its slug argument"""
+    head, _, tail = reverse(viewname, kwargs={'slug': _SLUG_PLACEHOLDER}).partition(_SLUG_PLACEHOLDER)
+    return head, tail
+
+
+class PostCard:
+    """Read-only summary of a post, enough to render it in a listing"""
+
+    def __init__(self, row, post_url, category_url, image_storage):
+        self.id = self.pk = row['id']
+        self.title = row['title']
+        self.slug = row['slug']
+        self.excerpt = row['excerpt']
+        self.views = row['views']
+        self.created_at = row['created_at']
+        self.published_at = row['published_at']
+        self.author_username = row['author__username']
+        self.category_name = row['category__name']
+        self.url = post_url[0] + self.slug + post_url[1]
+        if row['category__slug']:
+            self.category_url = category_url[0] + row['category__slug'] + category_url[1]
+        else:
+            self.category_url = None
+        self.image_name = row['featured_image'] or None
+        self.image_url = image_storage.url(self.image_name) if self.image_name else None
+
+    def __repr__(self):
+        return f'<PostCard: {self.title}>'
+
+    def get_absolute_url(self):
+        return self.url
+
+
+class PostCardIterable(ValuesIterable):
+    """Turn the rows of a ``values(*CARD_FIELDS)`` queryset into PostCards"""
+
+    def __iter__(self):
+        post_url = _url_pattern('blog:post_detail')
+        category_url = _url_pattern('blog:category_posts')
+        image_storage = self.queryset.model._meta.get_field('featured_image').storage
+        for row in super().__iter__():
+            yield PostCard(row, post_url, category_url, image_storage)
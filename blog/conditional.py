@@ -0,0 +1,117 @@
+"""
+Conditional GET (ETag / Last-Modified) for public pages.
+
+``ConditionalGetMixin`` asks the view for its validators, which come from a
+query far cheaper than building the page, and answers a matching
+``If-None-Match`` or ``If-Modified-Since`` with 304 Not Modified before the
+view fetches or renders anything. Full responses carry the validators so
+browsers and CDNs can revalidate next time. The ETag also covers the page
+cache versions of the view's scopes and who is asking, so anything that
+invalidates the page cache, or logging in, changes it too.
+
+ETags are weak: the markup is equivalent but not byte-identical between
+renders, since CSRF tokens are masked afresh every time.
+
+Listings send the ETag alone. The newest ``updated_at`` on a page does not
+move when a post on it is deleted or unpublished, so a Last-Modified built
+from it would answer ``If-Modified-Since`` with a stale 304; the ETag covers
+the scope versions those removals bump.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.contrib.messages import get_messages
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_versions
+from .pagination import CursorPaginator, InvalidCursor
+
+
+class ConditionalGetMixin:
+    """Answer revalidation requests from ``get_validators()`` without rendering"""
+
+    def get_validators(self):
+        """
+        Return ``(last_modified, parts)`` for the requested page, where
+        ``parts`` is anything with a stable ``repr`` that changes whenever the
+        page would and ``last_modified`` may be None to send only the ETag.
+        Return None to serve the request unconditionally.
+        """
+        raise ImproperlyConfigured(f'{self.__class__.__name__} must define get_validators().')
+
+    def not_modified(self, request):
+        """Hook for side effects that must run even when a 304 is sent"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self._async_dispatch_conditional(request, *args, **kwargs)
+        validators = self._request_validators(request)
+        if validators is not None:
+            response = self._not_modified_response(request, validators)
+            if response is not None:
+                return response
+        response = super().dispatch(request, *args, **kwargs)
+        return self._add_validators(response, validators)
+
+    async def _async_dispatch_conditional(self, request, *args, **kwargs):
+        validators = await sync_to_async(self._request_validators)(request)
+        if validators is not None:
+            response = await sync_to_async(self._not_modified_response)(request, validators)
+            if response is not None:
+                return response
+        response = await super().dispatch(request, *args, **kwargs)
+        return self._add_validators(response, validators)
+
+    def _request_validators(self, request):
+        if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+            # Flash messages are shown once, so such a page is never "unchanged"
+            return None
+        validators = self.get_validators()
+        if validators is None:
+            return None
+        last_modified, parts = validators
+        scopes = self.get_page_cache_scopes() if hasattr(self, 'get_page_cache_scopes') else []
+        viewer = request.user.pk if request.user.is_authenticated else 'anonymous'
+        digest = hashlib.md5(repr((parts, get_versions(scopes), viewer)).encode()).hexdigest()
+        return f'W/"{digest}"', int(last_modified.timestamp()) if last_modified else None
+
+    def _not_modified_response(self, request, validators):
+        etag, last_modified = validators
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            return None
+        if response.status_code == 304:
+            self.not_modified(request)
+        return self._add_validators(response, validators)
+
+    def _add_validators(self, response, validators):
+        if validators is not None and response.status_code in (200, 304):
+            response['ETag'], last_modified = validators
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class CursorPageConditionalMixin(ConditionalGetMixin):
+    """
+    Validators for cursor-paginated post listings: an ETag over the ids and
+    ``updated_at`` of the posts on the requested page, read with the same
+    keyset query the page itself uses but without any other columns.
+    """
+
+    def get_validator_queryset(self):
+        raise ImproperlyConfigured(f'{self.__class__.__name__} must define get_validator_queryset().')
+
+    def get_validators(self):
+        queryset = self.get_validator_queryset().values('id', 'published_at', 'updated_at')
+        paginator = CursorPaginator(queryset, self.get_paginate_by(queryset), self.cursor_ordering)
+        try:
+            rows = paginator.page(self.request.GET.get(self.cursor_query_param)).object_list
+        except InvalidCursor:
+            return None
+        if not rows:
+            # Unknown categories and tags must still get their 404
+            return None
+        return None, [(row['id'], row['updated_at']) for row in rows]
@@ -0,0 +1,203 @@
+"""
+Post body processing pipeline.
+
+``process_content`` runs once when a post is saved and turns the raw
+CKEditor HTML into everything the site needs to display it: sanitized HTML
+with lazily loaded images and anchored headings, plain-text statistics, a
+table of contents and a fallback excerpt. The results are stored on the
+post so requests never re-parse the body.
+"""
+import math
+from dataclasses import dataclass, field
+from html import escape, unescape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.utils.text import Truncator, slugify
+
+WORDS_PER_MINUTE = 200
+EXCERPT_LENGTH = 200
+TOC_LEVELS = {'h2': 2, 'h3': 3}
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'cite', 'code', 'del', 'div', 'em',
+    'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins',
+    'li', 'ol', 'p', 'pre', 's', 'small', 'span', 'strike', 'strong', 'sub', 'sup',
+    'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title', 'target', 'rel'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+# Elements removed together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'form', 'noscript', 'template', 'svg', 'math'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Elements that separate words in the extracted text
+BLOCK_TAGS = {
+    'blockquote', 'caption', 'div', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'li', 'ol', 'p', 'pre', 'table', 'td', 'th', 'tr', 'ul',
+}
+# Open elements implicitly closed by a new sibling, as browsers do
+IMPLICIT_CLOSE = {
+    'li': {'li'},
+    'p': {'p'},
+    'td': {'td', 'th'},
+    'th': {'td', 'th'},
+    'tr': {'tr', 'td', 'th'},
+}
+
+
+@dataclass
+class ProcessedContent:
+    html: str
+    text: str
+    word_count: int
+    reading_time: int
+    toc: list = field(default_factory=list)
+    excerpt: str = ''
+
+
+def _is_safe_url(url):
+    # Browsers ignore whitespace and control characters inside the scheme
+    url = ''.join(char for char in url if ord(char) > 32)
+    try:
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        return False
+    return scheme in ALLOWED_SCHEMES
+
+
+class _ContentParser(HTMLParser):
+    """Single pass over the body: sanitize, annotate and collect text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.output = []
+        self.text = []
+        self.toc = []
+        self.open_tags = []
+        self.dropped_depth = 0
+        self.heading = None
+        self.used_ids = set()
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropped_depth or tag in DROPPED_TAGS:
+            if tag in DROPPED_TAGS and tag not in VOID_TAGS:
+                self.dropped_depth += 1
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        if self.open_tags and self.open_tags[-1] in IMPLICIT_CLOSE.get(tag, ()):
+            self.handle_endtag(self.open_tags[-1])
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        clean = {}
+        for name, value in attrs:
+            if name in allowed and value is not None:
+                if name in URL_ATTRIBUTES and not _is_safe_url(value):
+                    continue
+                clean[name] = value
+        if tag == 'img':
+            clean.setdefault('loading', 'lazy')
+            clean.setdefault('decoding', 'async')
+        if tag == 'a' and clean.get('target') == '_blank':
+            clean['rel'] = 'noopener noreferrer'
+
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in clean.items())
+        if tag in TOC_LEVELS and self.heading is None:
+            # The anchor id depends on the heading text, filled in at the end tag
+            self.heading = {'tag': tag, 'index': len(self.output), 'attrs': rendered, 'text': []}
+        self.output.append(f'<{tag}{rendered}>')
+        if tag in VOID_TAGS:
+            self.text.append(' ')
+        else:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.dropped_depth or tag in DROPPED_TAGS:
+            # Self-closed: there is no content to drop and no end tag will follow
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropped_depth:
+            if tag in DROPPED_TAGS:
+                self.dropped_depth -= 1
+            return
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside this element so the output stays balanced
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.output.append(f'</{open_tag}>')
+            if self.heading is not None and open_tag == self.heading['tag']:
+                self._finish_heading()
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+    def _finish_heading(self):
+        heading, self.heading = self.heading, None
+        title = ' '.join(''.join(heading['text']).split())
+        if not title:
+            return
+        anchor = base = slugify(title) or 'section'
+        suffix = 2
+        while anchor in self.used_ids:
+            anchor = f'{base}-{suffix}'
+            suffix += 1
+        self.used_ids.add(anchor)
+        self.output[heading['index']] = f'<{heading["tag"]} id="{anchor}"{heading["attrs"]}>'
+        self.toc.append({'level': TOC_LEVELS[heading['tag']], 'id': anchor, 'title': title})
+
+    def _add_text(self, text, raw):
+        if self.dropped_depth:
+            return
+        self.output.append(raw)
+        self.text.append(text)
+        if self.heading is not None:
+            self.heading['text'].append(text)
+
+    def handle_data(self, data):
+        self._add_text(data, escape(data, quote=False))
+
+    def handle_entityref(self, name):
+        self._add_text(unescape(f'&{name};'), f'&{name};')
+
+    def handle_charref(self, name):
+        self._add_text(unescape(f'&#{name};'), f'&#{name};')
+
+    def close(self):
+        super().close()
+        # Unclosed dropped elements end with the document
+        self.dropped_depth = 0
+        while self.open_tags:
+            self.handle_endtag(self.open_tags[-1])
+
+
+def process_content(content):
+    """Sanitize a post body and derive everything stored alongside it"""
+    parser = _ContentParser()
+    parser.feed(content or '')
+    parser.close()
+
+    text = ' '.join(''.join(parser.text).split())
+    word_count = len(text.split())
+    return ProcessedContent(
+        html=''.join(parser.output),
+        text=text,
+        word_count=word_count,
+        reading_time=max(1, math.ceil(word_count / WORDS_PER_MINUTE)) if word_count else 0,
+        toc=parser.toc,
+        excerpt=Truncator(text).chars(EXCERPT_LENGTH),
+    )
@@ -0,0 +1,45 @@
+"""
+Denormalized counters: published posts per Category and Tag, and approved
+comments per Post.
+
+Signal handlers in ``blog.signals`` and ``CommentQuerySet`` keep the
+counters current as posts and comments change; the ``recount_*`` functions
+rebuild them from scratch and back the ``recount`` management command.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def adjust_published_post_count(model, pks, delta):
+    """Add ``delta`` to the counter of every ``model`` row in ``pks``"""
+    pks = [pk for pk in pks if pk is not None]
+    if not pks or not delta:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        # Never push a drifted counter below zero; `recount` repairs drift
+        queryset = queryset.filter(published_post_count__gte=-delta)
+    queryset.update(published_post_count=F('published_post_count') + delta)
+
+
+def _count_subquery(queryset, group_field):
+    counts = queryset.order_by().values(group_field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def recount_published_posts(Category, Tag, Post):
+    """Recompute every Category and Tag counter with one UPDATE per table"""
+    published = Post.objects.filter(status='published')
+    Category.objects.update(published_post_count=_count_subquery(
+        published.filter(category=OuterRef('pk')), 'category'
+    ))
+    Tag.objects.update(published_post_count=_count_subquery(
+        Post.tags.through.objects.filter(tag=OuterRef('pk'), post__status='published'), 'tag'
+    ))
+
+
+def recount_approved_comments(Post, Comment):
+    """Recompute every Post.approved_comment_count with a single UPDATE"""
+    Post.objects.update(approved_comment_count=_count_subquery(
+        Comment.objects.filter(post=OuterRef('pk'), approved=True), 'post'
+    ))
@@ -0,0 +1,168 @@
+"""
+RSS and Atom feeds for the whole site, each category and each tag.
+
+Feeds are built with Django's syndication framework and the rendered XML is
+kept in the page cache under the same scope versions as the matching
+listing (``home``, ``category:<slug>``, ``tag:<slug>``). Those versions only
+move when a published post in the listing is saved, published, unpublished
+or deleted, so a feed is regenerated on the first poll after such a change
+and every other poll is served from the cache with an ETag that readers can
+revalidate against. There is no Last-Modified: the newest item date does not
+move when a post is unpublished or deleted, so ``If-Modified-Since`` would
+get a stale 304. Items carry the stored excerpt; post bodies are never
+loaded.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+
+from .cache import HOME, TAXONOMY, category_scope, get_cache, get_versions, lag_safe_timeout, tag_scope
+from .models import Category, Post, Tag
+
+DEFAULT_FEED_ITEMS = 20
+DEFAULT_FEED_CACHE_TIMEOUT = 24 * 3600
+
+
+class CachedFeed(Feed):
+    """Serve a feed from the cache until one of its scopes changes"""
+
+    def get_cache_scopes(self, **kwargs):
+        # Items list their category and tag names
+        return [HOME, TAXONOMY]
+
+    def __call__(self, request, *args, **kwargs):
+        versions = '.'.join(str(version) for version in get_versions(self.get_cache_scopes(**kwargs)))
+        path = hashlib.md5(request.path.encode()).hexdigest()
+        key = f'blog:feed:{self.__class__.__name__}:{versions}:{path}'
+        cache = get_cache()
+
+        cached = cache.get(key)
+        if cached is None:
+            response = super().__call__(request, *args, **kwargs)
+            cached = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                # The cached bytes are served verbatim, so a strong validator is accurate
+                'etag': f'"{hashlib.md5(response.content).hexdigest()}"',
+            }
+            cache.set(key, cached, lag_safe_timeout(
+                getattr(settings, 'BLOG_FEED_CACHE_TIMEOUT', DEFAULT_FEED_CACHE_TIMEOUT)
+            ))
+
+        response = self.build_response(cached)
+        return get_conditional_response(request, etag=cached['etag'], response=response)
+
+    def build_response(self, cached):
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        response['ETag'] = cached['etag']
+        return response
+
+    def get_posts(self, obj):
+        return (
+            Post.objects.published()
+            .select_related('author', 'category')
+            .prefetch_related('tags')
+            .only(
+                'title', 'slug', 'excerpt', 'published_at', 'updated_at',
+                'author__username', 'category__name', 'category__slug',
+            )
+        )
+
+    def items(self, obj=None):
+        limit = getattr(settings, 'BLOG_FEED_ITEMS', DEFAULT_FEED_ITEMS)
+        return self.get_posts(obj).order_by('-published_at', '-id')[:limit]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.excerpt
+
+    def item_pubdate(self, item):
+        return item.published_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+    def item_author_name(self, item):
+        return item.author.username
+
+    def item_categories(self, item):
+        categories = [tag.name for tag in item.tags.all()]
+        if item.category_id:
+            categories.insert(0, item.category.name)
+        return categories
+
+
+class LatestPostsFeed(CachedFeed):
+    title = 'Advanced Blog'
+    description = 'The latest posts on Advanced Blog'
+
+    def link(self):
+        return reverse('blog:home')
+
+
+class CategoryFeed(CachedFeed):
+    def get_cache_scopes(self, **kwargs):
+        # TAXONOMY covers the category being renamed
+        return [category_scope(kwargs['slug']), TAXONOMY]
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Category, slug=slug)
+
+    def title(self, obj):
+        return f'{obj.name} - Advanced Blog'
+
+    def description(self, obj):
+        return obj.description or f'The latest posts in {obj.name}'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def get_posts(self, obj):
+        return super().get_posts(obj).filter(category=obj)
+
+
+class TagFeed(CachedFeed):
+    def get_cache_scopes(self, **kwargs):
+        return [tag_scope(kwargs['slug']), TAXONOMY]
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Tag, slug=slug)
+
+    def title(self, obj):
+        return f'#{obj.name} - Advanced Blog'
+
+    def description(self, obj):
+        return f'The latest posts tagged {obj.name}'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def get_posts(self, obj):
+        return super().get_posts(obj).filter(tags=obj)
+
+
+class AtomLatestPostsFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class AtomCategoryFeed(CategoryFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AtomTagFeed(TagFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
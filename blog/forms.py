@@ -49,3 +49,27 @@ class SearchForm(forms.Form):
             'placeholder': 'Search posts...'
         })
     )
+
+
+class CommentModerationForm(forms.Form):
+    """Action to apply to a batch of selected comments"""
+    ACTION_CHOICES = (
+        ('approve', 'Approve'),
+        ('disapprove', 'Unapprove'),
+        ('delete', 'Delete'),
+    )
+    MAX_COMMENTS = 500
+    
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    comment_ids = forms.TypedMultipleChoiceField(coerce=int)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Any id is accepted here; the view only touches comments the user may moderate
+        self.fields['comment_ids'].valid_value = lambda value: str(value).isdigit()
+    
+    def clean_comment_ids(self):
+        ids = self.cleaned_data['comment_ids']
+        if len(ids) > self.MAX_COMMENTS:
+            raise forms.ValidationError(f'Select at most {self.MAX_COMMENTS} comments at a time.')
+        return ids
@@ -0,0 +1,118 @@
+"""
+Resized variants of uploaded images.
+
+Every featured or profile image gets WebP and JPEG copies at a few fixed
+widths, stored next to the other media under ``variants/<original name>/``.
+Templates reference them through ``srcset`` so browsers download the
+smallest file that fills the slot instead of the original upload. Variants
+are generated once, when an image is uploaded or by the
+``generate_image_variants`` command, and reused from disk afterwards.
+
+The widths generated for each image are recorded in the cache at that point,
+so rendering a ``srcset`` never asks the storage which files exist; on remote
+storage every such check would be an HTTP request.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .cache import get_cache
+
+DEFAULT_WIDTHS = (160, 320, 640, 960)
+FORMATS = {
+    'webp': {'format': 'WEBP', 'content_type': 'image/webp', 'options': {'quality': 80, 'method': 4}},
+    'jpeg': {'format': 'JPEG', 'content_type': 'image/jpeg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+VARIANT_ROOT = 'variants'
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'BLOG_IMAGE_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def _widths_key(name):
+    return f'blog:image-widths:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def record_widths(name, widths):
+    """Remember the widths the variants of an image exist at"""
+    get_cache().set(_widths_key(name), list(widths), None)
+
+
+def variant_widths(name, storage=None):
+    """Widths the variants of an image exist at, as recorded when they were generated"""
+    widths = get_cache().get(_widths_key(name))
+    if widths is None:
+        # Generated before widths were recorded, or evicted: look once and remember
+        storage = storage or default_storage
+        widths = [width for width in get_widths() if storage.exists(variant_name(name, width, 'jpeg'))]
+        record_widths(name, widths)
+    return widths
+
+
+def variant_name(name, width, fmt):
+    """Storage name of one variant of the image stored as ``name``"""
+    return posixpath.join(VARIANT_ROOT, name, f'{width}w.{fmt}')
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparent areas onto white
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', image.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[fmt]['format'], **FORMATS[fmt]['options'])
+    return buffer.getvalue()
+
+
+def generate_variants(name, storage=None, force=False):
+    """
+    Create the missing variants of an image and return their storage names.
+
+    Widths larger than the original are skipped, so small images keep only
+    the variants that actually save bytes.
+    """
+    storage = storage or default_storage
+    widths = get_widths()
+    wanted = [
+        (width, fmt) for width in widths for fmt in FORMATS
+        if force or not storage.exists(variant_name(name, width, fmt))
+    ]
+    if not wanted:
+        record_widths(name, widths)
+        return []
+
+    with storage.open(name) as source:
+        with Image.open(source) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+
+    created = []
+    for width, fmt in wanted:
+        if width > original.width:
+            continue
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        target = variant_name(name, width, fmt)
+        if storage.exists(target):
+            storage.delete(target)
+        created.append(storage.save(target, ContentFile(_encode(resized, fmt))))
+    record_widths(name, [width for width in widths if width <= original.width])
+    return created
+
+
+def srcset(name, fmt, storage=None, widths=None):
+    """Return the ``srcset`` value listing the variants of an image"""
+    storage = storage or default_storage
+    if widths is None:
+        widths = variant_widths(name, storage)
+    return ', '.join(f'{storage.url(variant_name(name, width, fmt))} {width}w' for width in widths)
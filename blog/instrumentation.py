@@ -0,0 +1,168 @@
+"""
+Per-request timing instrumentation.
+
+``RequestInstrumentationMiddleware`` measures how long each request spends
+in the view, in template rendering and in SQL, and how many queries it ran.
+With ``BLOG_SERVER_TIMING`` on (by default only under ``DEBUG``, since the
+figures tell any visitor how the site performs) they are sent back in a
+``Server-Timing`` header, which browser developer tools show in the network
+panel. A ``BLOG_REQUEST_LOG_SAMPLE_RATE`` share of requests (1% by default)
+is logged as one JSON line on the ``blog.instrumentation`` logger. Queries
+slower than ``BLOG_SLOW_QUERY_MS`` are logged on ``blog.instrumentation.sql``.
+
+Queries are timed by a database execute wrapper that every connection gets
+when it opens; it only records anything while a request is being measured.
+Rendering is timed for TemplateResponses, which Django renders after the
+view returns; a view that calls ``render()`` itself counts it as view time.
+"""
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+sql_logger = logging.getLogger(f'{__name__}.sql')
+
+_current = ContextVar('blog_request_metrics', default=None)
+
+DEFAULT_SAMPLE_RATE = 0.01
+
+
+class RequestMetrics:
+    """Timings collected while serving one request"""
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.render_started = None
+        self.finished = None
+        self.queries = 0
+        self.slow_queries = 0
+        self.db_time = 0.0
+
+    def durations(self):
+        """Milliseconds spent in each phase of the request"""
+        view_ended = self.render_started or self.finished
+        return {
+            'db': self.db_time * 1000,
+            'view': (view_ended - self.view_started) * 1000 if self.view_started else 0.0,
+            'render': (self.finished - self.render_started) * 1000 if self.render_started else 0.0,
+            'total': (self.finished - self.started) * 1000,
+        }
+
+    def server_timing(self):
+        durations = self.durations()
+        return ', '.join(
+            f'{name};dur={duration:.1f}' + (f';desc="{self.queries} queries"' if name == 'db' else '')
+            for name, duration in durations.items()
+        )
+
+    def as_log_record(self, status_code):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'status': status_code,
+            'queries': self.queries,
+            'slow_queries': self.slow_queries,
+            **{f'{name}_ms': round(duration, 2) for name, duration in self.durations().items()},
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper that counts and times queries of the request being measured"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        threshold = getattr(settings, 'BLOG_SLOW_QUERY_MS', 0)
+        if threshold and duration * 1000 >= threshold:
+            metrics.slow_queries += 1
+            sql_logger.warning(
+                'Slow query (%.1fms) during %s %s: %s', duration * 1000, metrics.method, metrics.path, sql
+            )
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestInstrumentationMiddleware:
+    """Report per-request query count and view, template and database time"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would run sync hooks in a worker thread on every async request
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = request._request_metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, response)
+
+    async def __acall__(self, request):
+        metrics = request._request_metrics = RequestMetrics(request)
+        # Copied into the threads that run the ORM, so their queries are counted too
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._request_metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request._request_metrics.render_started = time.perf_counter()
+        return response
+
+    # Bound in place of the hooks above when the middleware runs async
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request._request_metrics.view_started = time.perf_counter()
+
+    async def _aprocess_template_response(self, request, response):
+        request._request_metrics.render_started = time.perf_counter()
+        return response
+
+    def finish(self, metrics, response):
+        metrics.finished = time.perf_counter()
+        if getattr(settings, 'BLOG_SERVER_TIMING', settings.DEBUG):
+            timing = metrics.server_timing()
+            if response.has_header('Server-Timing'):
+                timing = f'{response["Server-Timing"]}, {timing}'
+            response['Server-Timing'] = timing
+
+        sample_rate = getattr(settings, 'BLOG_REQUEST_LOG_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        if sample_rate >= 1 or random.random() < sample_rate:
+            logger.info(json.dumps(metrics.as_log_record(response.status_code), sort_keys=True))
+        return response
@@ -0,0 +1,225 @@
+"""
+Database-backed background jobs.
+
+Side effects that should not slow down the request that triggers them are
+registered with ``@job`` and queued with ``enqueue()``. The job row is
+written in the caller's transaction, so a job exists exactly when the change
+that caused it was committed, and ``manage.py run_worker`` executes it
+afterwards. Failed jobs are retried with exponential backoff. An optional
+idempotency key makes enqueueing the same piece of work twice a no-op. No
+broker is needed: workers claim rows with a conditional UPDATE, which is safe
+on both SQLite and PostgreSQL.
+
+With ``BLOG_JOBS_EAGER`` enabled (the default), jobs run in-process right
+after the transaction commits, so deployments without a worker still run
+them; a worker then only picks up retries and delayed jobs. Finished jobs
+are deleted after ``BLOG_JOB_RETENTION`` seconds by ``prune()``, which
+workers call every hour and ``manage.py prune_jobs`` runs on demand.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 10
+MAX_RETRY_DELAY = 3600
+DEFAULT_LOCK_TIMEOUT = 600
+DEFAULT_RETENTION = 7 * 24 * 3600
+PRUNE_INTERVAL = 3600
+
+registry = {}
+
+
+def job(name, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as a job; it is called with the job payload as keyword arguments"""
+    def decorator(func):
+        if name in registry:
+            raise ValueError(f'A job named {name!r} is already registered.')
+        func.job_name = name
+        func.max_attempts = max_attempts
+        registry[name] = func
+        return func
+    return decorator
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next try of a job that has failed ``attempts`` times"""
+    base = getattr(settings, 'BLOG_JOB_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    """
+    Queue a registered job and return its Job row.
+
+    When ``key`` is given and a job with that idempotency key already exists,
+    whatever its state, that job is returned and nothing new is queued.
+    """
+    if name not in registry:
+        raise KeyError(f'No job named {name!r} is registered.')
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'max_attempts': registry[name].max_attempts,
+        'run_after': timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        new_job = Job.objects.create(**fields)
+    else:
+        existing = Job.objects.filter(idempotency_key=key).first()
+        if existing is not None:
+            return existing
+        try:
+            with transaction.atomic():
+                new_job = Job.objects.create(idempotency_key=key, **fields)
+        except IntegrityError:
+            # Lost a race with a concurrent enqueue of the same key
+            return Job.objects.get(idempotency_key=key)
+
+    if getattr(settings, 'BLOG_JOBS_EAGER', False) and not delay:
+        transaction.on_commit(lambda: _run_eagerly(new_job.pk))
+    return new_job
+
+
+def _run_eagerly(job_id):
+    claimed = claim(f'eager:{os.getpid()}', job_ids=[job_id])
+    if claimed:
+        run(claimed[0])
+
+
+def claim(worker_id, limit=1, job_ids=None):
+    """Mark up to ``limit`` due jobs as running for this worker and return them"""
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+    if job_ids is not None:
+        candidates = candidates.filter(pk__in=job_ids)
+    claimed = []
+    for pk in candidates.order_by('run_after', 'id').values_list('pk', flat=True)[:limit * 4]:
+        # Only one worker can move a row out of the queued state
+        won = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+        if won:
+            claimed.append(Job.objects.get(pk=pk))
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def run(claimed_job):
+    """Execute a claimed job and record its outcome; return True on success"""
+    func = registry.get(claimed_job.name)
+    try:
+        if func is None:
+            raise LookupError(f'No job named {claimed_job.name!r} is registered.')
+        func(**claimed_job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if claimed_job.attempts < claimed_job.max_attempts:
+            delay = retry_delay(claimed_job.attempts)
+            logger.warning('Job %s failed, retrying in %ss', claimed_job, delay, exc_info=True)
+            Job.objects.filter(pk=claimed_job.pk).update(
+                status=Job.QUEUED, run_after=timezone.now() + timedelta(seconds=delay),
+                locked_by='', locked_at=None, last_error=error,
+            )
+        else:
+            logger.error('Job %s failed permanently', claimed_job, exc_info=True)
+            Job.objects.filter(pk=claimed_job.pk).update(
+                status=Job.FAILED, finished_at=timezone.now(), last_error=error,
+            )
+        return False
+    Job.objects.filter(pk=claimed_job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def requeue_stale(timeout=None):
+    """Return jobs whose worker died mid-run to the queue and report how many"""
+    if timeout is None:
+        timeout = getattr(settings, 'BLOG_JOB_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_by='', locked_at=None, run_after=timezone.now()
+    )
+
+
+def prune(retention=None):
+    """Delete jobs that finished successfully more than ``retention`` seconds ago and report how many"""
+    if retention is None:
+        retention = getattr(settings, 'BLOG_JOB_RETENTION', DEFAULT_RETENTION)
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    # Failed jobs are kept for inspection
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    """Run queued jobs on a pool of threads until stopped"""
+
+    def __init__(self, threads=4, poll_interval=1.0, burst=False):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stopping = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._next_prune = 0
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+
+    def start(self):
+        requeue_stale()
+        self._prune_if_due()
+        pool = [
+            threading.Thread(target=self._loop, args=(f'{self.name}:{index}',), name=f'job-worker-{index}')
+            for index in range(self.threads)
+        ]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return self.processed
+
+    def stop(self):
+        self.stopping.set()
+
+    def _loop(self, worker_id):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                claimed = claim(worker_id)
+                if not claimed:
+                    if self.burst:
+                        break
+                    self._prune_if_due()
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                run(claimed[0])
+                with self._lock:
+                    self.processed += 1
+        finally:
+            connection.close()
+
+    def _prune_if_due(self):
+        with self._lock:
+            if time.monotonic() < self._next_prune:
+                return
+            self._next_prune = time.monotonic() + PRUNE_INTERVAL
+        try:
+            pruned = prune()
+        except DatabaseError:
+            logger.exception('Failed to prune finished jobs')
+            return
+        if pruned:
+            logger.info('Pruned %s finished jobs', pruned)
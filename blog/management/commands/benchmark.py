@@ -0,0 +1,124 @@
+import json
+import platform
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from blog import benchmarks, popularity
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure p50/p95/p99 latency and queries per request for every blog '
+        'and accounts URL, optionally failing on regressions against a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000, help='Synthetic posts to seed (default: 2000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset (default: 0)')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint (default: 50)')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first (default: 5)')
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints', metavar='NAME',
+            help='Only run this endpoint; repeat for several (default: all)'
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p95 slowdown against the baseline as a fraction (default: 0.2)'
+        )
+        parser.add_argument(
+            '--min-delta', type=float, default=1.0,
+            help='Ignore p95 slowdowns smaller than this many milliseconds (default: 1.0)'
+        )
+        parser.add_argument(
+            '--use-current-db', action='store_true',
+            help=(
+                'Benchmark the configured database as it is instead of seeding a throwaway test database; '
+                'endpoints that write are skipped and everything else the run writes is rolled back'
+            )
+        )
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Leave the anonymous page cache on (off by default so every request runs the view)'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+        unknown = set(options['endpoints'] or ()) - {endpoint.name for endpoint in benchmarks.ENDPOINTS}
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+
+        host = benchmarks.default_host()
+        if options['use_current_db']:
+            database = benchmarks.rolled_back()
+        else:
+            self.stdout.write(f'Seeding a throwaway database with {options["posts"]} synthetic posts...')
+            database = benchmarks.throwaway_database(options['posts'], options['seed'])
+        with database, override_settings(
+            BLOG_PAGE_CACHE_ENABLED=options['page_cache'],
+            # Their buffers are written by background threads, outside the database the run is confined to
+            BLOG_VIEW_COUNTING=False,
+            USER_ACTIVITY_TRACKING=False,
+            BLOG_JOBS_EAGER=True,
+            BLOG_REQUEST_LOG_SAMPLE_RATE=0,
+        ):
+            # Rankings are rebuilt off the request path in production
+            popularity.refresh()
+            try:
+                results = benchmarks.run(
+                    requests=options['requests'], warmup=options['warmup'], host=host,
+                    only=options['endpoints'], progress=self.report, read_only=options['use_current_db'],
+                )
+            except LookupError as exc:
+                raise CommandError(str(exc))
+
+        for viewname, reason in benchmarks.SKIPPED.items():
+            self.stdout.write(f'  skipped {viewname}: {reason}')
+        if options['use_current_db']:
+            for endpoint in benchmarks.ENDPOINTS:
+                if endpoint.writes and (not options['endpoints'] or endpoint.name in options['endpoints']):
+                    self.stdout.write(f'  skipped {endpoint.name}: writes to the configured database')
+
+        if options['output']:
+            document = {
+                'meta': {
+                    'created_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'database': connection.vendor,
+                    'posts': None if options['use_current_db'] else options['posts'],
+                    'seed': options['seed'],
+                    'requests': options['requests'],
+                    'page_cache': options['page_cache'],
+                },
+                'endpoints': results,
+            }
+            with open(options['output'], 'w') as handle:
+                json.dump(document, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = benchmarks.compare(
+                results, baseline['endpoints'], tolerance=options['tolerance'], min_delta_ms=options['min_delta'],
+            )
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'  {name:<20} p50 {result["p50_ms"]:7.1f}ms  p95 {result["p95_ms"]:7.1f}ms  '
+            f'p99 {result["p99_ms"]:7.1f}ms  mean {result["mean_ms"]:7.1f}ms  '
+            f'{result["queries"]:5.1f} queries  status {result["statuses"]}'
+        )
@@ -0,0 +1,188 @@
+import asyncio
+import importlib
+import io
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+
+def _load_urlconf(async_views):
+    """Re-import the URLconf so blog.urls picks the requested view variants"""
+    with override_settings(BLOG_ASYNC_VIEWS=async_views):
+        clear_url_caches()
+        importlib.reload(importlib.import_module('blog.urls'))
+        importlib.reload(sys.modules[settings.ROOT_URLCONF])
+
+
+def _summarize(started, results):
+    # Latency runs from when the client sends its request, so it includes time queued for a worker
+    return {
+        'elapsed': max(finished for _, finished, _ in results) - started,
+        'latencies': [finished - issued for issued, finished, _ in results],
+        'statuses': [code for _, _, code in results],
+    }
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync views behind a fixed pool of WSGI workers with the async views '
+        'on the ASGI handler, with the same number of clients connected to each and every '
+        'client reading its response slowly'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Path to request (default: /)')
+        parser.add_argument('--requests', type=int, default=60, help='Total requests per run (default: 60)')
+        parser.add_argument(
+            '--client-delay', type=float, default=0.2,
+            help='Seconds each client takes to read its response (default: 0.2)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Clients with a request in flight at once, the same for both handlers (default: 20)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Sync WSGI workers, like gunicorn --workers (default: 4)'
+        )
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Leave the anonymous page cache on (off by default so every request runs the view)'
+        )
+
+    def handle(self, *args, **options):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        if host.startswith('.') or host == '*':
+            host = 'localhost'
+        path, query = (options['path'].split('?', 1) + [''])[:2]
+        self.request = {'host': host, 'path': path, 'query': query}
+        self.delay = options['client_delay']
+        total = options['requests']
+        concurrency = options['concurrency']
+        if min(total, concurrency, options['workers']) < 1:
+            raise CommandError('--requests, --concurrency and --workers must be at least 1.')
+
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=options['page_cache']):
+            try:
+                _load_urlconf(async_views=False)
+                wsgi = self.run_wsgi(total, concurrency, options['workers'])
+                _load_urlconf(async_views=True)
+                asgi = asyncio.run(self.run_asgi(total, concurrency))
+            finally:
+                _load_urlconf(async_views=settings.BLOG_ASYNC_VIEWS)
+
+        self.stdout.write(
+            f'{total} requests to {options["path"]} from {concurrency} clients at a time, '
+            f'each reading its response for {self.delay:.2f}s\n'
+        )
+        self.report(f'WSGI, sync views, {options["workers"]} worker threads for {concurrency} clients', wsgi)
+        self.report(f'ASGI, async views, one event loop for {concurrency} clients', asgi)
+        speedup = wsgi['elapsed'] / asgi['elapsed'] if asgi['elapsed'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'ASGI finished {speedup:.1f}x faster than {options["workers"]} WSGI workers '
+            f'with {concurrency} slow clients connected.'
+        ))
+
+    def report(self, label, result):
+        latencies = result['latencies']
+        self.stdout.write(
+            f'{label}:\n'
+            f'  wall time   {result["elapsed"]:.2f}s\n'
+            f'  throughput  {len(latencies) / result["elapsed"]:.1f} req/s\n'
+            f'  latency     p50 {statistics.median(latencies) * 1000:.0f}ms, '
+            f'p95 {_percentile(latencies, 0.95) * 1000:.0f}ms\n'
+            f'  statuses    {sorted(set(result["statuses"]))}\n'
+        )
+
+    def run_wsgi(self, total, concurrency, workers):
+        handler = WSGIHandler()
+        clients = threading.BoundedSemaphore(concurrency)
+
+        def one_request(issued):
+            # A sync worker stays busy until the client has read the whole response
+            status = []
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': self.request['path'],
+                'QUERY_STRING': self.request['query'], 'SCRIPT_NAME': '',
+                'SERVER_NAME': self.request['host'], 'SERVER_PORT': '80', 'HTTP_HOST': self.request['host'],
+                'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            }
+            body = handler(environ, lambda code, headers, exc_info=None: status.append(int(code.split()[0])))
+            try:
+                b''.join(body)
+                time.sleep(self.delay)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+                connections.close_all()
+            return issued, time.perf_counter(), status[0]
+
+        def client(issued):
+            try:
+                return one_request(issued)
+            finally:
+                clients.release()
+
+        started = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in range(total):
+                # A client sends its request once one of the connected clients is done; it then waits for a worker
+                clients.acquire()
+                futures.append(pool.submit(client, time.perf_counter()))
+        return _summarize(started, [future.result() for future in futures])
+
+    async def run_asgi(self, total, concurrency):
+        handler = ASGIHandler()
+        clients = asyncio.Semaphore(concurrency)
+
+        async def one_request():
+            status = []
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': self.request['path'], 'raw_path': self.request['path'].encode(),
+                'query_string': self.request['query'].encode(), 'root_path': '',
+                'headers': [(b'host', self.request['host'].encode())],
+                'client': ('127.0.0.1', 0), 'server': (self.request['host'], 80),
+            }
+
+            requested = []
+
+            async def receive():
+                if requested:
+                    # The client stays connected; Django cancels this wait once it has responded
+                    await asyncio.Event().wait()
+                requested.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    # The event loop serves other requests while this client reads
+                    await asyncio.sleep(self.delay)
+
+            async with clients:
+                issued = time.perf_counter()
+                await handler(scope, receive, send)
+                return issued, time.perf_counter(), status[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one_request() for _ in range(total)))
+        return _summarize(started, results)
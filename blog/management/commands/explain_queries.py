@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from blog import benchmarks, popularity, queryplans
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the SQL of every blog and accounts URL and report sequential scans, '
+        'sorts without an index and suggested composite indexes per view'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000, help='Synthetic posts to seed (default: 2000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset (default: 0)')
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints', metavar='NAME',
+            help='Only explain this endpoint; repeat for several (default: all)'
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Ignore findings on tables with fewer rows than this (default: 1000)'
+        )
+        parser.add_argument('--format', choices=['text', 'json'], default='text', help='Report format (default: text)')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+        parser.add_argument(
+            '--use-current-db', action='store_true',
+            help=(
+                'Explain against the configured database as it is instead of seeding a throwaway test database; '
+                'endpoints that write are skipped and everything else the run writes is rolled back'
+            )
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['endpoints'] or ()) - {endpoint.name for endpoint in benchmarks.ENDPOINTS}
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+
+        if options['use_current_db']:
+            database = benchmarks.rolled_back()
+        else:
+            self.stderr.write(f'Seeding a throwaway database with {options["posts"]} synthetic posts...')
+            database = benchmarks.throwaway_database(options['posts'], options['seed'])
+        with database, override_settings(
+            # Every request has to reach the view and run its own queries
+            BLOG_PAGE_CACHE_ENABLED=False,
+            # Their buffers are written by background threads, outside the database the run is confined to
+            BLOG_VIEW_COUNTING=False,
+            USER_ACTIVITY_TRACKING=False,
+            BLOG_JOBS_EAGER=True,
+            BLOG_REQUEST_LOG_SAMPLE_RATE=0,
+        ):
+            # Rankings are rebuilt off the request path in production
+            popularity.refresh_if_due()
+            try:
+                report = queryplans.run(
+                    only=options['endpoints'], min_rows=options['min_rows'],
+                    host=benchmarks.default_host(), progress=self.progress, read_only=options['use_current_db'],
+                )
+            except (LookupError, NotImplementedError) as exc:
+                raise CommandError(str(exc))
+
+        if options['format'] == 'json':
+            output = json.dumps(report, indent=2, sort_keys=True) + '\n'
+        else:
+            output = queryplans.format_text(report) + '\n'
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(output, ending='')
+
+    def progress(self, name, result):
+        self.stderr.write(
+            f'  {name:<20} {result["queries"]:3d} queries  {len(result["findings"]):3d} findings  '
+            f'status {result["status"]}'
+        )
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from blog import images
+from blog.models import Post
+
+
+def _generate(name, force):
+    # Runs in a worker process; failures are reported back instead of raised
+    try:
+        return name, len(images.generate_variants(name, force=force)), None
+    except OSError as exc:
+        return name, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG variants for existing featured and profile images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate variants that already exist'
+        )
+
+    def handle(self, *args, **options):
+        names = set(Post.objects.exclude(featured_image='').exclude(featured_image=None)
+                    .values_list('featured_image', flat=True))
+        names.update(get_user_model().objects.exclude(profile_image='').exclude(profile_image=None)
+                     .values_list('profile_image', flat=True))
+        names = sorted(names)
+        self.stdout.write(f'Processing {len(names)} images with {options["workers"]} workers...')
+
+        created = failed = 0
+        # Resizing is CPU bound, so images are spread over processes rather than threads
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for name, count, error in pool.map(_generate, names, [options['force']] * len(names), chunksize=4):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                created += count
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} variants; {failed} images failed.'))
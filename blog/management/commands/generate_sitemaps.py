@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from blog import sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Write the sitemap index and segments, rewriting only segments whose posts changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rewrite every segment instead of only the changed ones'
+        )
+        parser.add_argument('--base-url', help='Site address for absolute URLs (default: BLOG_SITE_URL)')
+        parser.add_argument('--root', help='Directory to write to (default: BLOG_SITEMAP_ROOT)')
+
+    def handle(self, *args, **options):
+        stats = sitemaps.generate(
+            base_url=options['base_url'],
+            root=options['root'],
+            full=options['full'],
+            progress=lambda name: self.stdout.write(f'Wrote sitemap-{name}.xml'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Sitemaps up to date: {stats["written"]} segments written, {stats["unchanged"]} unchanged, '
+            f'{stats["removed"]} removed.'
+        ))
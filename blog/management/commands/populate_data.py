@@ -1,5 +1,9 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from blog import synthetic
 from blog.models import Category, Tag, Post, Comment
 from django.utils.text import slugify
 import random
@@ -8,9 +12,32 @@ User = get_user_model()
 
 
 class Command(BaseCommand):
-    help = 'Populate the database with sample data'
+    help = 'Populate the database with sample data, or a large synthetic dataset with --scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, metavar='POSTS',
+            help='Generate this many synthetic posts (with users, tags and comments) using bulk inserts'
+        )
+        parser.add_argument('--users', type=int, help='Synthetic users to create (default: POSTS / 50, at least 100)')
+        parser.add_argument('--tags', type=int, default=500, help='Synthetic tags to create (default: 500)')
+        parser.add_argument('--comments', type=float, default=3, help='Average comments per published post (default: 3)')
+        parser.add_argument('--words', type=int, default=300, help='Average words per post body (default: 300)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same dataset (default: 0)')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes generating post chunks in parallel; best on PostgreSQL, SQLite serializes writers (default: 1)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Posts per chunk and transaction (default: 2000)')
+        parser.add_argument(
+            '--skip-search-index', action='store_true',
+            help='Do not rebuild the full-text index after generating'
+        )
 
     def handle(self, *args, **kwargs):
+        if kwargs.get('scale'):
+            return self.generate_synthetic(kwargs)
+
         self.stdout.write('Creating sample data...')
 
         # Create users
@@ -265,3 +292,35 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Admin: admin / admin123'))
         self.stdout.write(self.style.SUCCESS('Authors: john_author / author123, jane_author / author123'))
         self.stdout.write(self.style.SUCCESS('Readers: reader1 / reader123, reader2 / reader123'))
+
+    def generate_synthetic(self, options):
+        posts = options['scale']
+        users = options['users'] or max(100, posts // 50)
+        self.stdout.write(
+            f'Generating {posts} posts, {users} users and {options["tags"]} tags '
+            f'with seed {options["seed"]} on {options["workers"]} worker(s)...'
+        )
+        started = time.monotonic()
+
+        def progress(created_posts, links, comments):
+            self.stdout.write(f'  {created_posts}/{posts} posts, {links} tag links, {comments} comments')
+
+        try:
+            totals = synthetic.generate(
+                posts, users, options['tags'],
+                seed=options['seed'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                words=options['words'],
+                comments=options['comments'],
+                progress=progress,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if not options['skip_search_index']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {totals[0]} posts, {totals[1]} tag links and {totals[2]} comments '
+            f'in {time.monotonic() - started:.1f}s. Synthetic users log in with password {synthetic.PASSWORD!r}.'
+        ))
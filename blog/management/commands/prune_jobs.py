@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from blog import jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete background jobs that finished successfully a while ago'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=None, metavar='SECONDS',
+            help='Keep jobs that finished more recently than this (default: BLOG_JOB_RETENTION, 7 days)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = jobs.prune(options['older_than'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} finished jobs.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog import search
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from published posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts indexed per transaction (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Post.objects.filter(status='published').only('id', 'title', 'content').order_by('pk')
+
+        self.stdout.write('Clearing search index...')
+        search.clear_index()
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            # Walk the table by primary key so each batch is an indexed range scan
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                search.index_posts(batch)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'Indexed {indexed} posts...')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {indexed} posts indexed.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.counters import recount_approved_comments, recount_published_posts
+from blog.models import Category, Tag, Post, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized counters to repair drift'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_published_posts(Category, Tag, Post)
+            recount_approved_comments(Post, Comment)
+        self.stdout.write(self.style.SUCCESS('Post, comment, category and tag counters recomputed.'))
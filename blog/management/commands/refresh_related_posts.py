@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from blog import related
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related posts of posts changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute every published post instead of only the stale ones'
+        )
+        parser.add_argument(
+            '--top-k', type=int,
+            help='Related posts to store per post (default: BLOG_RELATED_POSTS)'
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] is not None and options['top_k'] < 1:
+            raise CommandError('--top-k must be at least 1.')
+        stats = related.refresh(
+            top_k=options['top_k'],
+            full=options['full'],
+            progress=lambda done, total: self.stdout.write(f'Refreshed {done}/{total} posts'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Related posts up to date: {stats["refreshed"]} of {stats["total"]} published posts refreshed.'
+        ))
@@ -0,0 +1,69 @@
+import multiprocessing
+import signal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from blog.jobs import Worker
+
+
+def _serve(threads, poll_interval, burst):
+    """Run one worker in the current process until SIGTERM/SIGINT or, in burst mode, an empty queue"""
+    worker = Worker(threads=threads, poll_interval=poll_interval, burst=burst)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: worker.stop())
+    return worker.start()
+
+
+def _serve_in_child(threads, poll_interval, burst):
+    django.setup()
+    _serve(threads, poll_interval, burst)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs queued with blog.jobs.enqueue()'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Worker threads per process (default: 4)'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Worker processes; use more than one for CPU-heavy jobs such as image resizing (default: 1)'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds an idle thread waits before polling the queue again (default: 1.0)'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no due jobs are left instead of waiting for new ones'
+        )
+
+    def handle(self, *args, **options):
+        threads, processes = options['threads'], options['processes']
+        poll_interval, burst = options['poll_interval'], options['burst']
+        self.stdout.write(f'Starting {processes} worker process(es) with {threads} thread(s) each...')
+
+        if processes <= 1:
+            processed = _serve(threads, poll_interval, burst)
+            self.stdout.write(self.style.SUCCESS(f'Worker stopped after {processed} jobs.'))
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=_serve_in_child, args=(threads, poll_interval, burst))
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+                child.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
@@ -0,0 +1,71 @@
+import html
+
+from django.db import NotSupportedError, migrations
+from django.utils.html import strip_tags
+
+# Frozen copy of the blog.search schema and indexing as of this migration;
+# later changes to that module must not change what this migration does
+INDEX_TABLE = 'blog_post_search'
+
+CREATE_INDEX = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5(title, body, tokenize='porter unicode61')",
+    ],
+    'postgresql': [
+        f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+        'post_id bigint PRIMARY KEY REFERENCES blog_post (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'title text NOT NULL, body text NOT NULL, document tsvector NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_idx ON {INDEX_TABLE} USING GIN (document)',
+    ],
+}
+INSERT_ROW = {
+    'sqlite': f'INSERT INTO {INDEX_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+    'postgresql': (
+        f'INSERT INTO {INDEX_TABLE} (post_id, title, body, document) '
+        "VALUES (%s, %s, %s, setweight(to_tsvector('english', %s), 'A') "
+        "|| setweight(to_tsvector('english', %s), 'B'))"
+    ),
+}
+
+
+def _vendor(connection):
+    if connection.vendor not in CREATE_INDEX:
+        raise NotSupportedError(f'Full-text search is not available on {connection.vendor}.')
+    return connection.vendor
+
+
+def _document_text(content):
+    return ' '.join(html.unescape(strip_tags(content or '')).split())
+
+
+def create_search_index(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    vendor = _vendor(schema_editor.connection)
+    with schema_editor.connection.cursor() as cursor:
+        for statement in CREATE_INDEX[vendor]:
+            cursor.execute(statement)
+        published = Post.objects.using(schema_editor.connection.alias).filter(status='published')
+        rows = []
+        for pk, title, content in published.values_list('pk', 'title', 'content').iterator():
+            body = _document_text(content)
+            rows.append((pk, title, body) if vendor == 'sqlite' else (pk, title, body, title, body))
+        if rows:
+            cursor.executemany(INSERT_ROW[vendor], rows)
+
+
+def drop_search_index(apps, schema_editor):
+    _vendor(schema_editor.connection)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
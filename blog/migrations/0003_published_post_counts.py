@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:59
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Frozen copy of blog.counters.recount_published_posts as of this migration
+def _count(queryset, group_field):
+    counts = queryset.order_by().values(group_field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def populate_counts(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Category = apps.get_model('blog', 'Category')
+    Tag = apps.get_model('blog', 'Tag')
+    Post = apps.get_model('blog', 'Post')
+    published = Post.objects.using(alias).filter(status='published')
+    Category.objects.using(alias).update(published_post_count=_count(
+        published.filter(category=OuterRef('pk')), 'category'
+    ))
+    Tag.objects.using(alias).update(published_post_count=_count(
+        Post.tags.through.objects.using(alias).filter(tag=OuterRef('pk'), post__status='published'), 'tag'
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='published_post_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='published_post_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
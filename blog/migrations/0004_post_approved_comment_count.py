@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:00
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Frozen copy of blog.counters.recount_approved_comments as of this migration
+def populate_counts(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    counts = (
+        Comment.objects.using(alias).filter(post=OuterRef('pk'), approved=True)
+        .order_by().values('post').annotate(total=Count('pk')).values('total')
+    )
+    Post.objects.using(alias).update(
+        approved_comment_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_published_post_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='approved_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_approved_comment_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-published_at', '-id'], name='blog_post_status_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', 'status', '-published_at', '-id'], name='blog_post_category_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,225 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:04
+
+import math
+from html import escape, unescape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# Frozen copy of the blog.content pipeline as of this migration; later
+# changes to that module must not change what this migration stores
+
+WORDS_PER_MINUTE = 200
+TOC_LEVELS = {'h2': 2, 'h3': 3}
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'cite', 'code', 'del', 'div', 'em',
+    'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins',
+    'li', 'ol', 'p', 'pre', 's', 'small', 'span', 'strike', 'strong', 'sub', 'sup',
+    'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title', 'target', 'rel'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+# Elements removed together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'form', 'noscript', 'template', 'svg', 'math'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Elements that separate words in the extracted text
+BLOCK_TAGS = {
+    'blockquote', 'caption', 'div', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'li', 'ol', 'p', 'pre', 'table', 'td', 'th', 'tr', 'ul',
+}
+# Open elements implicitly closed by a new sibling, as browsers do
+IMPLICIT_CLOSE = {
+    'li': {'li'},
+    'p': {'p'},
+    'td': {'td', 'th'},
+    'th': {'td', 'th'},
+    'tr': {'tr', 'td', 'th'},
+}
+
+
+def _is_safe_url(url):
+    # Browsers ignore whitespace and control characters inside the scheme
+    url = ''.join(char for char in url if ord(char) > 32)
+    try:
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        return False
+    return scheme in ALLOWED_SCHEMES
+
+
+class _ContentParser(HTMLParser):
+    """Single pass over the body: sanitize, annotate and collect text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.output = []
+        self.text = []
+        self.toc = []
+        self.open_tags = []
+        self.dropped_depth = 0
+        self.heading = None
+        self.used_ids = set()
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropped_depth or tag in DROPPED_TAGS:
+            if tag in DROPPED_TAGS and tag not in VOID_TAGS:
+                self.dropped_depth += 1
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        if self.open_tags and self.open_tags[-1] in IMPLICIT_CLOSE.get(tag, ()):
+            self.handle_endtag(self.open_tags[-1])
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        clean = {}
+        for name, value in attrs:
+            if name in allowed and value is not None:
+                if name in URL_ATTRIBUTES and not _is_safe_url(value):
+                    continue
+                clean[name] = value
+        if tag == 'img':
+            clean.setdefault('loading', 'lazy')
+            clean.setdefault('decoding', 'async')
+        if tag == 'a' and clean.get('target') == '_blank':
+            clean['rel'] = 'noopener noreferrer'
+
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in clean.items())
+        if tag in TOC_LEVELS and self.heading is None:
+            # The anchor id depends on the heading text, filled in at the end tag
+            self.heading = {'tag': tag, 'index': len(self.output), 'attrs': rendered, 'text': []}
+        self.output.append(f'<{tag}{rendered}>')
+        if tag in VOID_TAGS:
+            self.text.append(' ')
+        else:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.dropped_depth or tag in DROPPED_TAGS:
+            # Self-closed: there is no content to drop and no end tag will follow
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropped_depth:
+            if tag in DROPPED_TAGS:
+                self.dropped_depth -= 1
+            return
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside this element so the output stays balanced
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.output.append(f'</{open_tag}>')
+            if self.heading is not None and open_tag == self.heading['tag']:
+                self._finish_heading()
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+    def _finish_heading(self):
+        heading, self.heading = self.heading, None
+        title = ' '.join(''.join(heading['text']).split())
+        if not title:
+            return
+        anchor = base = slugify(title) or 'section'
+        suffix = 2
+        while anchor in self.used_ids:
+            anchor = f'{base}-{suffix}'
+            suffix += 1
+        self.used_ids.add(anchor)
+        self.output[heading['index']] = f'<{heading["tag"]} id="{anchor}"{heading["attrs"]}>'
+        self.toc.append({'level': TOC_LEVELS[heading['tag']], 'id': anchor, 'title': title})
+
+    def _add_text(self, text, raw):
+        if self.dropped_depth:
+            return
+        self.output.append(raw)
+        self.text.append(text)
+        if self.heading is not None:
+            self.heading['text'].append(text)
+
+    def handle_data(self, data):
+        self._add_text(data, escape(data, quote=False))
+
+    def handle_entityref(self, name):
+        self._add_text(unescape(f'&{name};'), f'&{name};')
+
+    def handle_charref(self, name):
+        self._add_text(unescape(f'&#{name};'), f'&#{name};')
+
+    def close(self):
+        super().close()
+        # Unclosed dropped elements end with the document
+        self.dropped_depth = 0
+        while self.open_tags:
+            self.handle_endtag(self.open_tags[-1])
+
+
+def _process(content):
+    parser = _ContentParser()
+    parser.feed(content or '')
+    parser.close()
+    word_count = len(''.join(parser.text).split())
+    reading_time = max(1, math.ceil(word_count / WORDS_PER_MINUTE)) if word_count else 0
+    return ''.join(parser.output), word_count, reading_time, parser.toc
+
+
+def render_existing_posts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    manager = Post.objects.using(schema_editor.connection.alias)
+    fields = ['rendered_content', 'word_count', 'reading_time', 'toc']
+    batch = []
+    for post in manager.only('id', 'content').iterator(chunk_size=500):
+        post.rendered_content, post.word_count, post.reading_time, post.toc = _process(post.content)
+        batch.append(post)
+        if len(batch) == 500:
+            manager.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        manager.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rendered_content',
+            field=models.TextField(blank=True, editable=False, help_text='Sanitized HTML served on the detail page'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='toc',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_related_posts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_era',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['trending_era', '-trending_score'], name='blog_post_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='postviewbucket',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='blog.post'),
+        ),
+        migrations.AddIndex(
+            model_name='postviewbucket',
+            index=models.Index(fields=['start'], name='blog_postviewbucket_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postviewbucket',
+            constraint=models.UniqueConstraint(fields=('post', 'start'), name='blog_postviewbucket_post_start_uniq'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_post_popularity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('approved', False)), fields=['-created_at'], name='blog_comment_pending_idx'),
+        ),
+    ]
@@ -1,15 +1,29 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
+from django.dispatch import Signal
 from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from ckeditor_uploader.fields import RichTextUploadingField
 
+from .cards import CARD_FIELDS, PostCardIterable
+from .tracking import TrackedFieldsMixin
+
+
+def _save_atomically(instance, save, *args, **kwargs):
+    """Run ``save`` so the counter updates of the post_save handlers commit with the row"""
+    using = kwargs.get('using') or router.db_for_write(type(instance), instance=instance)
+    with transaction.atomic(using=using, savepoint=False):
+        save(*args, **kwargs)
+
 
 class Category(models.Model):
     """Category model for organizing blog posts"""
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(blank=True)
+    published_post_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -32,6 +46,7 @@ class Tag(models.Model):
     """Tag model for post categorization"""
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True)
+    published_post_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -49,16 +64,44 @@ class Tag(models.Model):
         return reverse('blog:tag_posts', kwargs={'slug': self.slug})
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    """Query helpers for posts"""
+    
+    def published(self):
+        return self.filter(status='published')
+    
+    def without_body(self):
+        """Skip the potentially large body columns that listings never show"""
+        return self.defer('content', 'rendered_content', 'toc')
+    
+    def cards(self):
+        """Yield PostCard summaries instead of full model instances"""
+        clone = self.values(*CARD_FIELDS)
+        clone._iterable_class = PostCardIterable
+        return clone
+
+
+class Post(TrackedFieldsMixin, models.Model):
     """Blog post model"""
     STATUS_CHOICES = (
         ('draft', 'Draft'),
         ('published', 'Published'),
     )
     
+    # Denormalized counters updated in place, excluded from full saves
+    COUNTER_FIELDS = ('views', 'approved_comment_count', 'trending_score', 'trending_era')
+    # Columns derived from content by blog.content.process_content
+    CONTENT_DERIVED_FIELDS = ('rendered_content', 'word_count', 'reading_time', 'toc', 'excerpt')
+    # Stored values remembered on load so signals can detect transitions
+    tracked_fields = ('status', 'category_id', 'slug')
+    
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
     content = RichTextUploadingField()
+    rendered_content = models.TextField(blank=True, editable=False, help_text='Sanitized HTML served on the detail page')
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text='Minutes')
+    toc = models.JSONField(default=list, blank=True, editable=False)
     excerpt = models.TextField(max_length=500, blank=True, help_text='Brief description for post listing')
     featured_image = models.ImageField(upload_to='post_images/', blank=True, null=True)
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
@@ -66,15 +109,28 @@ class Post(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, related_name='posts')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     views = models.PositiveIntegerField(default=0)
+    approved_comment_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
+    # Time-decayed view score kept by blog.popularity, relative to the start of trending_era
+    trending_score = models.FloatField(default=0, editable=False)
+    trending_era = models.PositiveIntegerField(default=0, editable=False)
+    # When blog.related last computed this post's related posts
+    related_refreshed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    objects = PostQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['status']),
+            # Keyset pagination of published listings on (published_at, id)
+            models.Index(fields=['status', '-published_at', '-id'], name='blog_post_status_keyset_idx'),
+            models.Index(fields=['category', 'status', '-published_at', '-id'], name='blog_post_category_keyset_idx'),
+            # Top trending posts of an era, read in score order
+            models.Index(fields=['trending_era', '-trending_score'], name='blog_post_trending_idx'),
         ]
     
     def __str__(self):
@@ -83,20 +139,103 @@ class Post(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.process_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields).union(self.CONTENT_DERIVED_FIELDS)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Counters are maintained with F() updates; never write back stale copies
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        _save_atomically(self, super().save, *args, **kwargs)
+    
+    def process_content(self):
+        """Refresh the sanitized HTML, statistics and excerpt derived from content"""
+        from .content import process_content
+        processed = process_content(self.content)
+        self.rendered_content = processed.html
+        self.word_count = processed.word_count
+        self.reading_time = processed.reading_time
+        self.toc = processed.toc
         # Auto-generate excerpt from content if not provided
-        if not self.excerpt and self.content:
-            from django.utils.html import strip_tags
-            self.excerpt = strip_tags(self.content)[:200] + '...'
-        super().save(*args, **kwargs)
+        if not self.excerpt:
+            self.excerpt = processed.excerpt
     
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
     def get_comments_count(self):
-        return self.comments.filter(approved=True).count()
+        return self.approved_comment_count
+
+
+def adjust_approved_comment_counts(deltas):
+    """Apply a {post_id: delta} mapping, one UPDATE per distinct delta"""
+    by_delta = {}
+    for post_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(post_id)
+    for delta, post_ids in by_delta.items():
+        queryset = Post.objects.filter(pk__in=post_ids)
+        if delta < 0:
+            queryset = queryset.filter(approved_comment_count__gte=-delta)
+        queryset.update(approved_comment_count=F('approved_comment_count') + delta)
 
 
-class Comment(models.Model):
+# Sent after a bulk moderation call changes the approval of comments or
+# deletes approved ones, which bypasses Comment.save() and Comment.delete();
+# provides ``post_ids``
+comments_moderated = Signal()
+
+
+class CommentQuerySet(models.QuerySet):
+    """Bulk moderation that keeps Post.approved_comment_count in sync"""
+    
+    def _set_approved(self, approved):
+        with transaction.atomic(using=self.db):
+            # Lock the rows that will flip so the counter deltas stay exact
+            changed = list(self.exclude(approved=approved).select_for_update().values_list('pk', 'post_id'))
+            if not changed:
+                return 0
+            self.model.objects.filter(pk__in=[pk for pk, _ in changed]).update(
+                approved=approved, updated_at=timezone.now()
+            )
+            deltas = {}
+            for _, post_id in changed:
+                deltas[post_id] = deltas.get(post_id, 0) + (1 if approved else -1)
+            adjust_approved_comment_counts(deltas)
+        comments_moderated.send(sender=self.model, post_ids=set(deltas))
+        return len(changed)
+    
+    def approve(self):
+        """Approve every comment in the queryset and return how many changed"""
+        return self._set_approved(True)
+    
+    def disapprove(self):
+        """Unapprove every comment in the queryset and return how many changed"""
+        return self._set_approved(False)
+    
+    def purge(self):
+        """Delete every comment in the queryset with one DELETE and return how many went"""
+        with transaction.atomic(using=self.db):
+            doomed = list(self.select_for_update().values_list('pk', 'post_id', 'approved'))
+            if not doomed:
+                return 0
+            # Nothing references comments; skip the collector and its per-row signals
+            self.model.objects.filter(pk__in=[pk for pk, _, _ in doomed])._raw_delete(self.db)
+            deltas = {}
+            for _, post_id, approved in doomed:
+                if approved:
+                    deltas[post_id] = deltas.get(post_id, 0) - 1
+            adjust_approved_comment_counts(deltas)
+        if deltas:
+            comments_moderated.send(sender=self.model, post_ids=set(deltas))
+        return len(doomed)
+
+
+class Comment(TrackedFieldsMixin, models.Model):
     """Comment model for post discussions"""
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
@@ -105,10 +244,17 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CommentQuerySet.as_manager()
+    
+    tracked_fields = ('approved', 'post_id')
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['post', '-created_at']),
+            # Comment pages are keyset-paged on (created_at, id) within a post
+            models.Index(fields=['post', '-created_at', '-id'], name='blog_comment_post_keyset_idx'),
+            # The moderation queue; only pending comments are indexed
+            models.Index(fields=['-created_at'], condition=models.Q(approved=False), name='blog_comment_pending_idx'),
         ]
     
     def __str__(self):
@@ -118,4 +264,78 @@ class Comment(models.Model):
         # Auto-approve comments from authors and admins
         if self.user.is_author() or self.user.is_admin():
             self.approved = True
-        super().save(*args, **kwargs)
+        _save_atomically(self, super().save, *args, **kwargs)
+
+
+class PostViewBucket(models.Model):
+    """Views of a post during one hour, written by blog.popularity"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_buckets')
+    start = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'start'], name='blog_postviewbucket_post_start_uniq'),
+        ]
+        indexes = [
+            # Summing the buckets of the popularity window, and pruning older ones
+            models.Index(fields=['start'], name='blog_postviewbucket_start_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.views} views of {self.post_id} from {self.start:%Y-%m-%d %H:00}'
+
+
+class RelatedPost(models.Model):
+    """One of a post's most similar posts, precomputed by blog.related"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_from')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            # Also the index the detail page reads a post's list through
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_post_rank_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.related_id} related to {self.post_id} (#{self.rank})'
+
+
+class Job(models.Model):
+    """Background task stored in the database and run by the run_worker command"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            # Workers poll for due jobs in run_after order
+            models.Index(fields=['status', 'run_after'], name='blog_job_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
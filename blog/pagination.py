@@ -0,0 +1,178 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are addressed by an opaque token holding the sort key of the row at
+the page boundary, so fetching any page is an index range scan of
+``per_page + 1`` rows: no ``COUNT(*)`` and no ``OFFSET``, however deep the
+page. The trade-off is that there are no page numbers or totals.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """One page of results with tokens for its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by a unique, uniformly ordered key.
+
+    ``ordering`` lists model fields that together identify a row, all
+    descending (``-field``) or all ascending; the last one should be the
+    primary key to break ties. Rows with a NULL key are excluded.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-published_at', '-id')):
+        descending = {name.startswith('-') for name in ordering}
+        if len(descending) != 1:
+            raise ValueError('Cursor ordering fields must share one direction.')
+        self.descending = descending.pop()
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.model_fields = [queryset.model._meta.get_field(name) for name in self.fields]
+        nullable = {f'{field.name}__isnull': False for field in self.model_fields if field.null}
+        self.queryset = queryset.filter(**nullable)
+        self.per_page = per_page
+
+    def encode_cursor(self, item, direction):
+        values = []
+        for name in self.fields:
+            value = item[name] if isinstance(item, dict) else getattr(item, name)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        payload = json.dumps({'k': values, 'd': direction}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = [field.to_python(value) for field, value in zip(self.model_fields, payload['k'], strict=True)]
+            direction = payload['d']
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+        if direction not in ('next', 'prev') or None in values:
+            raise InvalidCursor(cursor)
+        return values, direction
+
+    def _seek(self, values, forward):
+        # (a, b) after (x, y) is a < x OR (a = x AND b < y) for descending keys
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            prefix = {field: value for field, value in zip(self.fields[:i], values[:i])}
+            condition |= Q(**prefix, **{f'{name}__{lookup}': values[i]})
+        return condition
+
+    def _ordering(self, forward):
+        sign = '-' if self.descending == forward else ''
+        return [f'{sign}{name}' for name in self.fields]
+
+    def _prepare(self, cursor):
+        if not cursor:
+            values, direction = None, 'next'
+        else:
+            values, direction = self.decode_cursor(cursor)
+        forward = direction == 'next'
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        return queryset.order_by(*self._ordering(forward))[:self.per_page + 1], values, forward
+
+    def _build_page(self, rows, values, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous and rows else None,
+        )
+
+    def page(self, cursor=None):
+        queryset, values, forward = self._prepare(cursor)
+        return self._build_page(list(queryset), values, forward)
+
+    async def apage(self, cursor=None):
+        queryset, values, forward = self._prepare(cursor)
+        return self._build_page([row async for row in queryset], values, forward)
+
+
+class CursorPaginationMixin:
+    """
+    Let a ListView switch between offset and cursor pagination.
+
+    Set ``pagination_mode = 'cursor'`` on a view to page by ``cursor_ordering``
+    with ``?cursor=<token>`` links; the default keeps Django's Paginator.
+    """
+    pagination_mode = 'offset'
+    cursor_ordering = ('-published_at', '-id')
+    cursor_query_param = 'cursor'
+
+    def get_pagination_mode(self):
+        return self.pagination_mode
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.get_pagination_mode() != 'cursor':
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Async counterpart of paginate_queryset"""
+        if self.get_pagination_mode() != 'cursor':
+            return await sync_to_async(super().paginate_queryset)(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = await paginator.apage(self.request.GET.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = self.get_pagination_mode() == 'cursor'
+        return context
@@ -0,0 +1,165 @@
+"""
+Trending and popular posts.
+
+Every flush of the view-count buffer also counts its views in an hourly
+``PostViewBucket`` per post and adds them to the posts' time-decayed scores.
+
+A view at time ``t`` is worth ``2 ** (-(now - t) / BLOG_TRENDING_HALF_LIFE)``.
+Decaying every score by the same factor keeps their order, so scores are
+stored relative to a fixed moment instead: a view adds
+``2 ** ((t - era_start) / half_life)`` to ``trending_score``, which is a plain
+``score = score + weight`` folded into the flush's ``UPDATE`` of ``views``,
+and ranking is an index scan on ``trending_score``. Weights double every
+half-life, so time is cut into eras of ``ERA_HALF_LIVES`` half-lives to keep
+them finite. A post last read in the previous era has its score scaled into
+the current one by the same ``UPDATE``; anything older has decayed to
+nothing and restarts from the new views.
+
+Two rankings are kept precomputed in the page cache, as lists of post ids:
+
+* ``TRENDING`` orders posts by decayed score, merging the top posts of the
+  current and the previous era.
+* ``POPULAR`` orders posts by their views in the last
+  ``BLOG_POPULAR_DAYS`` days, summed from the buckets.
+
+Both are rebuilt by the view-count flusher, off the request path, at most
+every ``BLOG_TRENDING_REFRESH_INTERVAL`` seconds. Readers only read the cache
+(an empty ranking until the first rebuild) and fetch the cards of the listed
+ids with one query, however many posts the site has.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from .cache import get_cache
+from .models import Post, PostViewBucket
+
+TRENDING = 'trending'
+POPULAR = 'popular'
+
+DEFAULT_HALF_LIFE = 6 * 3600
+DEFAULT_POPULAR_DAYS = 7
+DEFAULT_RANKING_SIZE = 50
+DEFAULT_REFRESH_INTERVAL = 60
+# Weights reach 2 ** ERA_HALF_LIVES by the end of an era; far within float range
+ERA_HALF_LIVES = 64
+
+_RANKING_KEY = 'blog:ranking:{}'
+_REFRESHED_KEY = 'blog:ranking:refreshed'
+
+
+def get_half_life():
+    return getattr(settings, 'BLOG_TRENDING_HALF_LIFE', DEFAULT_HALF_LIFE)
+
+
+def get_popular_window():
+    return timedelta(days=getattr(settings, 'BLOG_POPULAR_DAYS', DEFAULT_POPULAR_DAYS))
+
+
+def get_ranking_size():
+    return getattr(settings, 'BLOG_RANKING_SIZE', DEFAULT_RANKING_SIZE)
+
+
+def get_refresh_interval():
+    return getattr(settings, 'BLOG_TRENDING_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+
+
+def era_and_weight(now):
+    """The current era and what one view is worth in it"""
+    half_life = get_half_life()
+    elapsed = now.timestamp() / half_life
+    era = int(elapsed // ERA_HALF_LIVES)
+    return era, 2 ** (elapsed - era * ERA_HALF_LIVES)
+
+
+def score_updates(views, now):
+    """``update()`` arguments adding ``views`` read at ``now`` to a post's decayed score"""
+    era, weight = era_and_weight(now)
+    added = views * weight
+    return {
+        'trending_score': Case(
+            When(trending_era=era, then=F('trending_score') + added),
+            When(trending_era=era - 1, then=F('trending_score') * 2.0 ** -ERA_HALF_LIVES + added),
+            default=Value(added),
+        ),
+        'trending_era': era,
+    }
+
+
+def bucket_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_buckets(counts, now):
+    """Add a ``{post_id: views}`` batch to the posts' buckets for the hour of ``now``"""
+    start = bucket_start(now)
+    # Create missing buckets empty, then increment; concurrent flushes of
+    # other processes only ever add to the same rows
+    PostViewBucket.objects.bulk_create(
+        [PostViewBucket(post_id=post_id, start=start) for post_id in counts], ignore_conflicts=True,
+    )
+    by_increment = {}
+    for post_id, count in counts.items():
+        by_increment.setdefault(count, []).append(post_id)
+    for increment, post_ids in by_increment.items():
+        PostViewBucket.objects.filter(post__in=post_ids, start=start).update(views=F('views') + increment)
+
+
+def compute_trending(now, size):
+    era, _ = era_and_weight(now)
+    ranked = []
+    for age in (0, 1):
+        scale = 2.0 ** (-age * ERA_HALF_LIVES)
+        rows = (
+            Post.objects.published()
+            .filter(trending_era=era - age, trending_score__gt=0)
+            .order_by('-trending_score')
+            .values_list('pk', 'trending_score')[:size]
+        )
+        ranked.extend((score * scale, pk) for pk, score in rows)
+    ranked.sort(reverse=True)
+    return [pk for score, pk in ranked[:size]]
+
+
+def compute_popular(now, size):
+    rows = (
+        PostViewBucket.objects
+        .filter(start__gte=bucket_start(now - get_popular_window()), post__status='published')
+        .values('post')
+        .annotate(total=Sum('views'))
+        .order_by('-total', '-post')[:size]
+    )
+    return [row['post'] for row in rows]
+
+
+def refresh(now=None):
+    """Rebuild both rankings, drop expired buckets and return the rankings"""
+    now = now or timezone.now()
+    size = get_ranking_size()
+    rankings = {TRENDING: compute_trending(now, size), POPULAR: compute_popular(now, size)}
+    # Kept until replaced: a late rebuild leaves readers the last known ranking
+    get_cache().set_many({_RANKING_KEY.format(name): ids for name, ids in rankings.items()}, None)
+    PostViewBucket.objects.filter(start__lt=bucket_start(now - get_popular_window())).delete()
+    return rankings
+
+
+def refresh_if_due():
+    """Rebuild the rankings unless that happened within the refresh interval"""
+    if get_cache().add(_REFRESHED_KEY, True, get_refresh_interval()):
+        refresh()
+
+
+def get_ranking(name):
+    """Post ids of ranking ``name``, best first, as last rebuilt"""
+    return get_cache().get(_RANKING_KEY.format(name)) or []
+
+
+def ranked_cards(name, limit=None):
+    """Cards of the published posts of ranking ``name``, in ranking order"""
+    ids = get_ranking(name)[:limit]
+    if not ids:
+        return []
+    cards = {card.pk: card for card in Post.objects.published().filter(pk__in=ids).cards()}
+    return [cards[pk] for pk in ids if pk in cards]
@@ -0,0 +1,250 @@
+"""
+Query-plan advisor.
+
+``run()`` requests every endpoint of ``blog.benchmarks.ENDPOINTS`` once,
+records the SQL each one sends with a database execute wrapper, and asks the
+database how it would run every distinct statement: ``EXPLAIN QUERY PLAN`` on
+SQLite, ``EXPLAIN (ANALYZE, FORMAT JSON)`` on PostgreSQL (plain ``EXPLAIN``
+for writes, which ANALYZE would execute again). Plans are searched for
+
+* sequential scans: a whole table read row by row, and
+* sorts: a temporary B-tree (SQLite) or Sort node (PostgreSQL) built for
+  ``ORDER BY``, ``GROUP BY`` or ``DISTINCT`` instead of reading an index in
+  order.
+
+Tables with fewer than ``min_rows`` rows are skipped; scanning them is
+cheaper than any index. For each finding the statement's equality filters
+and ordering on that table are read back out of the SQL and turned into a
+suggested composite index, equality columns first and ordering columns
+last, unless an existing index already starts with those fields.
+"""
+import json
+import re
+
+from django.apps import apps
+from django.db import connection
+
+from . import benchmarks
+
+_SKIPPED_STATEMENTS = ('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN', 'COMMIT')
+_SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+_SQLITE_SORT_RE = re.compile(r'^USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)')
+_CLAUSE_END_RE = re.compile(r' (?:GROUP BY|ORDER BY|HAVING|LIMIT|OFFSET)\b')
+_QUOTED_COLUMN = r'"(?P<table>\w+)"\."(?P<column>\w+)"'
+_EQUALITY_RE = re.compile(_QUOTED_COLUMN + r'\s*(?:=|IN \()')
+_ORDER_COLUMN_RE = re.compile(_QUOTED_COLUMN + r'(?P<direction> DESC| ASC)?')
+
+
+def capture(client, endpoint, url, data):
+    """The ``(sql, params)`` of every statement one request of ``endpoint`` runs"""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        if not many:
+            statements.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    send = getattr(client, endpoint.method.lower())
+    with connection.execute_wrapper(record):
+        response = send(url, data)
+    return response.status_code, statements
+
+
+def explain(sql, params):
+    """The plan of one statement as ``(kind, table, detail)`` findings and raw lines"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            lines = [row[-1] for row in cursor.fetchall()]
+            return _sqlite_findings(lines, sql), lines
+        if connection.vendor == 'postgresql':
+            analyse = 'ANALYZE, ' if sql.lstrip().upper().startswith('SELECT') else ''
+            cursor.execute(f'EXPLAIN ({analyse}FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            findings = []
+            _postgresql_findings(plan[0]['Plan'], findings, sql)
+            return findings, [json.dumps(plan[0]['Plan'], sort_keys=True)]
+    raise NotImplementedError(f'No query-plan support for the {connection.vendor} backend.')
+
+
+def _sort_table(sql, fallback):
+    # Plans do not say which table a sort is for; the first ordering column does
+    match = _ORDER_COLUMN_RE.search(_clauses(sql)[1])
+    return match.group('table') if match else fallback
+
+
+def _sqlite_findings(lines, sql):
+    findings = []
+    first = None
+    for line in lines:
+        scan = _SQLITE_SCAN_RE.match(line)
+        if scan:
+            findings.append(('sequential scan', scan.group(1), line))
+        if line.startswith(('SCAN ', 'SEARCH ')) and first is None:
+            first = line.split()[1]
+        sort = _SQLITE_SORT_RE.match(line)
+        if sort:
+            findings.append((f'sort for {sort.group(1)}', _sort_table(sql, first), line))
+    return findings
+
+
+def _postgresql_findings(node, findings, sql):
+    if node.get('Node Type') == 'Seq Scan':
+        findings.append(('sequential scan', node['Relation Name'], node.get('Filter', '')))
+    for child in node.get('Plans', ()):
+        _postgresql_findings(child, findings, sql)
+    if node.get('Node Type') in ('Sort', 'Incremental Sort'):
+        table = _sort_table(sql, _first_relation(node))
+        findings.append(('sort for ORDER BY', table, ', '.join(node.get('Sort Key', []))))
+
+
+def _first_relation(node):
+    if 'Relation Name' in node:
+        return node['Relation Name']
+    for child in node.get('Plans', ()):
+        relation = _first_relation(child)
+        if relation:
+            return relation
+    return None
+
+
+def _clauses(sql):
+    """The WHERE and ORDER BY clauses of a statement, roughly"""
+    where = order = ''
+    if ' WHERE ' in sql:
+        where = sql.split(' WHERE ', 1)[1]
+        end = _CLAUSE_END_RE.search(where)
+        where = where[:end.start()] if end else where
+    if ' ORDER BY ' in sql:
+        order = sql.rsplit(' ORDER BY ', 1)[1]
+        order = re.split(r' LIMIT | OFFSET ', order)[0]
+    return where, order
+
+
+def _models_by_table():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def suggest_index(sql, table, models=None):
+    """A ``(model label, fields)`` index that would serve ``sql`` on ``table``, or None"""
+    models = models or _models_by_table()
+    model = models.get(table)
+    if model is None:
+        return None
+    fields_by_column = {field.column: field.name for field in model._meta.concrete_fields}
+    where, order = _clauses(sql)
+
+    fields = []
+    for match in _EQUALITY_RE.finditer(where):
+        name = fields_by_column.get(match.group('column'))
+        if match.group('table') == table and name and name not in fields:
+            fields.append(name)
+    if any(_is_indexed(model, [name], unique=True) for name in fields):
+        # One row at most; nothing to scan or sort
+        return None
+    for match in _ORDER_COLUMN_RE.finditer(order):
+        name = fields_by_column.get(match.group('column'))
+        if match.group('table') == table and name and name not in fields and f'-{name}' not in fields:
+            fields.append(f'-{name}' if match.group('direction') == ' DESC' else name)
+    if not fields or _is_indexed(model, fields):
+        return None
+    return model._meta.label, fields
+
+
+def _existing_indexes(model, unique=False):
+    indexes = [] if unique else [list(index.fields) for index in model._meta.indexes]
+    indexes += [
+        list(constraint.fields) for constraint in model._meta.constraints
+        # Partial unique constraints only cover some rows
+        if getattr(constraint, 'fields', None) and not getattr(constraint, 'condition', None)
+    ]
+    indexes += [list(fields) for fields in model._meta.unique_together]
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.unique or (field.db_index and not unique):
+            indexes.append([field.name])
+    return indexes
+
+
+def _is_indexed(model, fields, unique=False):
+    # Direction does not matter to a B-tree read from one end or the other
+    wanted = [name.lstrip('-') for name in fields]
+    for existing in _existing_indexes(model, unique):
+        existing = [name.lstrip('-') for name in existing]
+        if (existing == wanted) if unique else (existing[:len(wanted)] == wanted):
+            return True
+    return False
+
+
+def _table_sizes():
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def run(only=None, min_rows=1000, host='localhost', progress=None, read_only=False):
+    """Explain the SQL of every endpoint (or the names in ``only``) and return a report by name"""
+    arguments = benchmarks.sample_arguments()
+    clients = benchmarks.role_clients(arguments, host)
+    sizes = _table_sizes()
+    models = _models_by_table()
+
+    report = {}
+    for endpoint in benchmarks.ENDPOINTS:
+        if (only and endpoint.name not in only) or (read_only and endpoint.writes):
+            continue
+        url = benchmarks.endpoint_url(endpoint, arguments)
+        status, statements = capture(clients[endpoint.role], endpoint, url, benchmarks.endpoint_data(endpoint, arguments))
+
+        findings, suggestions, explained = [], [], set()
+        for sql, params in statements:
+            if sql.lstrip().upper().startswith(_SKIPPED_STATEMENTS) or sql in explained:
+                continue
+            explained.add(sql)
+            for kind, table, detail in explain(sql, params)[0]:
+                if table is None or sizes.get(table, 0) < min_rows:
+                    continue
+                findings.append({'kind': kind, 'table': table, 'rows': sizes[table], 'detail': detail, 'sql': sql})
+                suggestion = suggest_index(sql, table, models)
+                if suggestion and list(suggestion) not in [[s['model'], s['fields']] for s in suggestions]:
+                    suggestions.append({'model': suggestion[0], 'fields': suggestion[1]})
+        report[endpoint.name] = {
+            'method': endpoint.method,
+            'url': url,
+            'status': status,
+            'queries': len(statements),
+            'explained': len(explained),
+            'findings': findings,
+            'suggestions': suggestions,
+        }
+        if progress:
+            progress(endpoint.name, report[endpoint.name])
+    return report
+
+
+def format_text(report, sql_width=160):
+    """Render a report as plain text, one block per endpoint with findings"""
+    lines = []
+    for name, result in report.items():
+        if not result['findings']:
+            continue
+        lines.append(
+            f'{name} ({result["method"]} {result["url"]}): {result["queries"]} queries, '
+            f'{len(result["findings"])} findings'
+        )
+        for finding in result['findings']:
+            lines.append(f'  {finding["kind"]} on {finding["table"]} ({finding["rows"]} rows): {finding["detail"]}')
+            sql = ' '.join(finding['sql'].split())
+            lines.append(f'    {sql[:sql_width]}{"..." if len(sql) > sql_width else ""}')
+        for suggestion in result['suggestions']:
+            lines.append(f'  suggest on {suggestion["model"]}: models.Index(fields={suggestion["fields"]!r})')
+        lines.append('')
+    clean = [name for name, result in report.items() if not result['findings']]
+    if clean:
+        lines.append(f'No findings: {", ".join(clean)}')
+    return '\n'.join(lines)
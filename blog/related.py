@@ -0,0 +1,225 @@
+"""
+Precomputed related posts.
+
+Every published post is turned into a sparse TF-IDF vector over the words of
+its title (counted twice), excerpt and body plus one feature per tag and one
+for its category. Vectors keep their ``MAX_TERMS`` heaviest features and are
+L2-normalised, so the dot product of two vectors is their cosine similarity.
+An inverted index from feature to ``(post, weight)`` postings turns "score one
+post against every other" into a sparse matrix-vector product that only
+touches posts sharing a feature with it; features found in more than
+``MAX_DOCUMENT_FREQUENCY`` of the posts are left out of the index like stop
+words. The ``top_k`` best matches are stored as ``RelatedPost`` rows, which
+the detail page reads with one query on the ``(post, rank)`` index.
+
+``refresh()`` is incremental. Posts saved since their list was computed
+(``updated_at > related_refreshed_at``) are rescored, together with posts
+whose list shows one of them or an unpublished post, and posts that a changed
+post now outscores the weakest entry of. Document frequencies drift as posts
+come and go; ``full=True`` recomputes everything against the current corpus.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from . import cache
+from .models import Post, RelatedPost
+from .search import document_text
+
+DEFAULT_TOP_K = 5
+MAX_TERMS = 64
+MAX_DOCUMENT_FREQUENCY = 0.1
+# Below this many posts even very common features are kept
+MIN_PRUNED_FREQUENCY = 100
+TITLE_WEIGHT = 2
+TAG_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+BATCH_SIZE = 500
+
+_WORD_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+_STOP_WORDS = frozenset(
+    'about after all also and are because been but can could did does for from had has have her his how '
+    'into its just more most not now one only other our out over she should some such than that the their '
+    'them then there these they this those through too under very was were what when where which while '
+    'who why will with would you your'.split()
+)
+
+
+def get_top_k():
+    return getattr(settings, 'BLOG_RELATED_POSTS', DEFAULT_TOP_K)
+
+
+def tokenize(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in _STOP_WORDS]
+
+
+def _term_counts(title, excerpt, body, category_id, tag_ids):
+    counts = Counter(tokenize(f'{excerpt} {document_text(body)}'))
+    for word in tokenize(title):
+        counts[word] += TITLE_WEIGHT
+    for tag_id in tag_ids:
+        counts[f'#t{tag_id}'] = TAG_WEIGHT
+    if category_id:
+        counts[f'#c{category_id}'] = CATEGORY_WEIGHT
+    return counts
+
+
+class Corpus:
+    """TF-IDF vectors of all published posts and their inverted index"""
+
+    def __init__(self, documents):
+        # documents: iterable of (post_id, slug, term counts)
+        self.ids, self.slugs, raw = [], {}, []
+        features = {}
+        frequency = Counter()
+        for post_id, slug, counts in documents:
+            self.ids.append(post_id)
+            self.slugs[post_id] = slug
+            # Intern features as integers; millions of repeated strings add up
+            row = [(features.setdefault(term, len(features)), count) for term, count in counts.items()]
+            frequency.update(feature for feature, _ in row)
+            raw.append(row)
+
+        total = len(self.ids)
+        self.position = {post_id: index for index, post_id in enumerate(self.ids)}
+        idf = {feature: math.log((1 + total) / (1 + df)) + 1 for feature, df in frequency.items()}
+        ceiling = max(MIN_PRUNED_FREQUENCY, MAX_DOCUMENT_FREQUENCY * total)
+
+        self.vectors = []
+        self.postings = defaultdict(list)
+        for index, row in enumerate(raw):
+            weighted = heapq.nlargest(
+                MAX_TERMS, ((feature, (1 + math.log(count)) * idf[feature]) for feature, count in row),
+                key=lambda item: item[1],
+            )
+            norm = math.sqrt(sum(weight * weight for _, weight in weighted)) or 1.0
+            vector = [(feature, weight / norm) for feature, weight in weighted]
+            self.vectors.append(vector)
+            for feature, weight in vector:
+                if frequency[feature] <= ceiling:
+                    self.postings[feature].append((index, weight))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, post_id):
+        """Cosine similarity of ``post_id`` with every post it shares an indexed feature with"""
+        index = self.position[post_id]
+        totals = defaultdict(float)
+        for feature, weight in self.vectors[index]:
+            for other, other_weight in self.postings.get(feature, ()):
+                totals[other] += weight * other_weight
+        totals.pop(index, None)
+        return {self.ids[other]: score for other, score in totals.items()}
+
+    def neighbours(self, post_id, top_k, scores=None):
+        """The ``top_k`` most similar posts as ``(post_id, score)``, best first"""
+        scores = self.scores(post_id) if scores is None else scores
+        # Ties go to the newer post so the order is stable between runs
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def load_corpus():
+    """Build the corpus from every published post, streaming the rows"""
+    posts = Post.objects.published()
+    tags = defaultdict(list)
+    for post_id, tag_id in Post.tags.through.objects.filter(post__in=posts).values_list('post_id', 'tag_id').iterator():
+        tags[post_id].append(tag_id)
+    rows = posts.order_by('pk').values_list(
+        'pk', 'slug', 'title', 'excerpt', 'rendered_content', 'category_id'
+    ).iterator(chunk_size=2000)
+    return Corpus(
+        (pk, slug, _term_counts(title, excerpt, body, category_id, tags.get(pk, ())))
+        for pk, slug, title, excerpt, body, category_id in rows
+    )
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _referrers(post_ids):
+    referrers = set()
+    for chunk in _chunks(post_ids):
+        referrers.update(RelatedPost.objects.filter(related__in=chunk).values_list('post_id', flat=True))
+    return referrers
+
+
+def _stale_posts(corpus, top_k):
+    """Published posts whose stored list may no longer be the best one"""
+    changed = set(
+        Post.objects.published()
+        .filter(Q(related_refreshed_at__isnull=True) | Q(updated_at__gt=F('related_refreshed_at')))
+        .values_list('pk', flat=True)
+    ) & corpus.position.keys()
+    stale = set(changed)
+    # A changed post may have dropped out of the lists showing it...
+    stale |= _referrers(changed)
+    stale |= set(
+        RelatedPost.objects.exclude(related__status='published').values_list('post_id', flat=True)
+    )
+    # ...or now beat the weakest entry of a list it is not in yet
+    floors = {
+        row['post']: row['floor'] if row['entries'] >= top_k else 0.0
+        for row in RelatedPost.objects.values('post').annotate(entries=Count('pk'), floor=Min('score'))
+    }
+    scored = {}
+    for post_id in changed:
+        scored[post_id] = scores = corpus.scores(post_id)
+        stale.update(other for other, score in scores.items() if score > floors.get(other, 0.0))
+    return {post_id for post_id in stale if post_id in corpus.position}, scored
+
+
+def refresh(top_k=None, full=False, progress=None):
+    """
+    Recompute the related posts of stale posts (all of them with ``full``)
+    and return how many posts were ``refreshed`` out of ``total``.
+    """
+    top_k = top_k or get_top_k()
+    started = timezone.now()
+    corpus = load_corpus()
+
+    # Drafts and unpublished posts show no related posts
+    RelatedPost.objects.exclude(post__status='published').delete()
+    if full:
+        stale, scored = set(corpus.ids), {}
+    else:
+        stale, scored = _stale_posts(corpus, top_k)
+
+    refreshed = 0
+    for batch in _chunks(sorted(stale)):
+        rows = [
+            RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+            for post_id in batch
+            for rank, (related_id, score) in enumerate(
+                corpus.neighbours(post_id, top_k, scored.get(post_id)), start=1
+            )
+        ]
+        with transaction.atomic():
+            RelatedPost.objects.filter(post__in=batch).delete()
+            RelatedPost.objects.bulk_create(rows)
+            # Saves made while this run was going still count as changes next time
+            Post.objects.filter(pk__in=batch).update(related_refreshed_at=started)
+            cache.bump_versions_on_commit(cache.post_scope(corpus.slugs[post_id]) for post_id in batch)
+        refreshed += len(batch)
+        if progress:
+            progress(refreshed, len(stale))
+    return {'refreshed': refreshed, 'total': len(corpus)}
+
+
+def related_cards(post):
+    """Cards of the stored related posts of ``post``, best first"""
+    return (
+        Post.objects.published()
+        .filter(related_from__post=post)
+        .order_by('related_from__rank')
+        .cards()
+    )
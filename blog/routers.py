@@ -0,0 +1,128 @@
+"""
+Primary/replica database routing.
+
+Aliases listed in ``BLOG_DATABASE_REPLICAS`` are read-only copies of
+``default``. ``PrimaryPinningMiddleware`` decides per request where its reads
+go and ``PrimaryReplicaRouter`` follows that decision:
+
+* ``GET``, ``HEAD`` and ``OPTIONS`` requests read from one replica, picked at
+  random and kept for the whole request so a page never mixes two replicas'
+  lag.
+* Every other method reads from the primary, and its response sets a
+  short-lived ``BLOG_PRIMARY_PIN_COOKIE``. Requests carrying that cookie read
+  from the primary too, so the redirect after publishing a post or adding a
+  comment, and whatever the same browser opens within
+  ``BLOG_PRIMARY_PIN_SECONDS``, sees the write before the replicas do.
+* Reads inside a transaction on the primary stay on the primary, and so do
+  session lookups.
+* Page and feed cache misses render from the replica like everything else,
+  but within ``BLOG_PRIMARY_PIN_SECONDS`` of the last cache version bump they
+  are only cached that long (``blog.cache.lag_safe_timeout``), so a page
+  rendered from a replica that has not caught up expires with the lag.
+
+Writes always go to the primary. Work outside a request (management
+commands, the job worker) is not routed and uses ``default``.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULT_PIN_COOKIE = 'blog_primary'
+DEFAULT_PIN_SECONDS = 10
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# A session missing from a lagging replica would log its user out
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_read_database = ContextVar('blog_read_database', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'BLOG_DATABASE_REPLICAS', []))
+
+
+def get_pin_cookie():
+    return getattr(settings, 'BLOG_PRIMARY_PIN_COOKIE', DEFAULT_PIN_COOKIE)
+
+
+def get_pin_seconds():
+    return getattr(settings, 'BLOG_PRIMARY_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+
+
+def reading_from_replica():
+    """Whether the current request reads from a replica"""
+    return _read_database.get() not in (None, DEFAULT_DB_ALIAS)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and reads where the current request was pinned"""
+
+    def db_for_read(self, model, **hints):
+        database = _read_database.get()
+        if database is None:
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if database != DEFAULT_DB_ALIAS and connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # The transaction may have written rows the replicas have not seen
+            return DEFAULT_DB_ALIAS
+        return database
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class PrimaryPinningMiddleware:
+    """Choose the database the reads of each request go to"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _read_database.set(self.read_database(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_database.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        # Copied into the threads that run the ORM
+        token = _read_database.set(self.read_database(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_database.reset(token)
+        return self.finish(request, response)
+
+    def read_database(self, request):
+        if request.method not in _SAFE_METHODS or get_pin_cookie() in request.COOKIES:
+            return DEFAULT_DB_ALIAS
+        return random.choice(get_replicas())
+
+    def finish(self, request, response):
+        if request.method not in _SAFE_METHODS:
+            response.set_cookie(
+                get_pin_cookie(), '1', max_age=get_pin_seconds(), httponly=True, samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
@@ -0,0 +1,251 @@
+"""
+Full-text search over published posts.
+
+The index lives next to the ORM tables rather than inside them: an FTS5
+virtual table on SQLite and a weighted ``tsvector`` column with a GIN index
+on PostgreSQL. Both store the post title and its tag-stripped body keyed by
+post id, so a search never touches the raw CKEditor HTML in ``blog_post``.
+"""
+import html
+import re
+
+from django.db import NotSupportedError, connections, router
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+INDEX_TABLE = 'blog_post_search'
+
+# Private-use characters mark highlighted terms in snippets so the text can
+# be HTML-escaped before the markers are swapped for <mark> tags.
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def document_text(content):
+    """Return the plain text of a post body with tags and entities removed"""
+    return ' '.join(html.unescape(strip_tags(content or '')).split())
+
+
+def render_snippet(snippet):
+    """Escape a raw snippet and turn highlight markers into <mark> tags"""
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+class SQLiteSearchBackend:
+    """FTS5 index using the porter stemmer and bm25 ranking"""
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} "
+            f"USING fts5(title, body, tokenize='porter unicode61')"
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def index(self, cursor, rows):
+        self.remove(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+            rows,
+        )
+
+    def remove(self, cursor, pks):
+        if pks:
+            placeholders = ', '.join(['%s'] * len(pks))
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid IN ({placeholders})', list(pks))
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+    def _match_expression(self, query):
+        # Quote every token so user input can never be parsed as FTS5 syntax;
+        # the last token is a prefix match to support search-as-you-type.
+        tokens = _TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def count(self, cursor, query):
+        expression = self._match_expression(query)
+        if expression is None:
+            return 0
+        cursor.execute(f'SELECT count(*) FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s', [expression])
+        return cursor.fetchone()[0]
+
+    def search(self, cursor, query, offset, limit):
+        expression = self._match_expression(query)
+        if expression is None:
+            return []
+        # bm25() returns lower-is-better scores; titles weigh ten times the body.
+        cursor.execute(
+            f"SELECT rowid, -bm25({INDEX_TABLE}, 10.0, 1.0), "
+            f"snippet({INDEX_TABLE}, 1, %s, %s, '…', 24) "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s "
+            f"ORDER BY bm25({INDEX_TABLE}, 10.0, 1.0), rowid DESC LIMIT %s OFFSET %s",
+            [HIGHLIGHT_START, HIGHLIGHT_END, expression, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+class PostgreSQLSearchBackend:
+    """tsvector index with title/body weights and ts_rank_cd ranking"""
+
+    config = 'english'
+    headline_options = (
+        f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, '
+        'MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=" … "'
+    )
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+            'post_id bigint PRIMARY KEY REFERENCES blog_post (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'title text NOT NULL, body text NOT NULL, document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_idx '
+            f'ON {INDEX_TABLE} USING GIN (document)'
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (post_id, title, body, document) '
+            f"VALUES (%s, %s, %s, setweight(to_tsvector('{self.config}', %s), 'A') "
+            f"|| setweight(to_tsvector('{self.config}', %s), 'B')) "
+            'ON CONFLICT (post_id) DO UPDATE SET title = EXCLUDED.title, '
+            'body = EXCLUDED.body, document = EXCLUDED.document',
+            [(pk, title, body, title, body) for pk, title, body in rows],
+        )
+
+    def remove(self, cursor, pks):
+        if pks:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE post_id = ANY(%s)', [list(pks)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {INDEX_TABLE}')
+
+    def count(self, cursor, query):
+        cursor.execute(
+            f"SELECT count(*) FROM {INDEX_TABLE} "
+            f"WHERE document @@ websearch_to_tsquery('{self.config}', %s)",
+            [query],
+        )
+        return cursor.fetchone()[0]
+
+    def search(self, cursor, query, offset, limit):
+        cursor.execute(
+            f"SELECT post_id, ts_rank_cd(document, q), "
+            f"ts_headline('{self.config}', body, q, %s) "
+            f"FROM {INDEX_TABLE}, websearch_to_tsquery('{self.config}', %s) q "
+            f"WHERE document @@ q ORDER BY 2 DESC, post_id DESC LIMIT %s OFFSET %s",
+            [self.headline_options, query, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_backend(connection):
+    """Return the search backend for a database connection"""
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise NotSupportedError(f'Full-text search is not available on {connection.vendor}.')
+
+
+def _write_connection():
+    from .models import Post
+    return connections[router.db_for_write(Post)]
+
+
+def index_posts(posts):
+    """Add or refresh index entries for the given posts"""
+    rows = [(post.pk, post.title, document_text(post.content)) for post in posts]
+    if not rows:
+        return
+    connection = _write_connection()
+    with connection.cursor() as cursor:
+        get_backend(connection).index(cursor, rows)
+
+
+def remove_posts(pks):
+    """Drop index entries for the given post ids"""
+    connection = _write_connection()
+    with connection.cursor() as cursor:
+        get_backend(connection).remove(cursor, list(pks))
+
+
+def clear_index():
+    """Remove every entry from the index"""
+    connection = _write_connection()
+    with connection.cursor() as cursor:
+        get_backend(connection).clear(cursor)
+
+
+class SearchResults:
+    """
+    Lazily evaluated, relevance-ordered search results.
+
+    Supports ``count()`` and slicing, so it can be handed to a Paginator:
+    only the requested page is ranked and loaded. Each returned post carries
+    ``search_rank`` and an HTML-safe ``search_snippet``.
+    """
+
+    def __init__(self, query, queryset):
+        self.query = query
+        self.queryset = queryset
+        self._count = None
+
+    def _run(self, method, *args):
+        connection = connections[router.db_for_read(self.queryset.model)]
+        with connection.cursor() as cursor:
+            return getattr(get_backend(connection), method)(cursor, self.query, *args)
+
+    def count(self):
+        if self._count is None:
+            self._count = self._run('count')
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if stop <= start:
+            return []
+        hits = self._run('search', start, stop - start)
+        posts = {post.pk: post for post in self.queryset.filter(pk__in=[pk for pk, _, _ in hits])}
+        results = []
+        for pk, rank, snippet in hits:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.search_snippet = render_snippet(snippet)
+            results.append(post)
+        return results
+
+
+def search_posts(query, queryset):
+    """Return ranked results for ``query`` restricted to ``queryset``"""
+    return SearchResults(query, queryset)
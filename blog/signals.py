@@ -1,32 +1,272 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Post
+from . import cache, jobs, search
+from .counters import adjust_published_post_count
+from .models import Post, Category, Tag, Comment, RelatedPost, adjust_approved_comment_counts, comments_moderated
+
+# Fields that feed the full-text index; saves touching none of them skip it
+SEARCH_INDEX_FIELDS = {'title', 'content', 'status'}
+
+# Fields that affect the published-post counters on Category and Tag
+COUNTER_FIELDS = {'status', 'category', 'category_id'}
 
 
 @receiver(pre_save, sender=Post)
-def set_published_date(sender, instance, **kwargs):
-    """Set published_at when post status changes to published"""
-    if instance.pk:
-        try:
-            old_instance = Post.objects.get(pk=instance.pk)
-            if old_instance.status == 'draft' and instance.status == 'published':
-                if not instance.published_at:
-                    instance.published_at = timezone.now()
-        except Post.DoesNotExist:
-            pass
+@receiver(pre_save, sender=Comment)
+def capture_previous_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Snapshot the stored values of tracked fields so later handlers can detect changes"""
+    if raw:
+        instance._previous_state = None
+    elif update_fields and not instance.tracks_any(update_fields):
+        # Tracked columns are not written, so their stored values are the current ones
+        instance._previous_state = {name: getattr(instance, name) for name in instance.tracked_fields}
     else:
-        if instance.status == 'published' and not instance.published_at:
+        # Known from loading the instance; queries only for deferred or hand-built instances
+        instance._previous_state = instance.get_stored_values()
+
+
+@receiver(pre_save, sender=Post)
+def set_published_date(sender, instance, update_fields=None, **kwargs):
+    """Set published_at when post status changes to published"""
+    if update_fields and 'status' not in update_fields:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if instance.status == 'published' and not instance.published_at:
+        if previous is None or previous['status'] == 'draft':
             instance.published_at = timezone.now()
 
 
 @receiver(post_save, sender=Post)
-def notify_post_published(sender, instance, created, **kwargs):
-    """Send notification when a post is published"""
+def notify_post_published(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Queue the notification for a published post"""
+    if raw or instance.status != 'published':
+        return
+    if update_fields and 'status' not in update_fields:
+        # Counter and bookkeeping saves are not news
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if not created and previous is not None and previous['status'] == 'published':
+        # Edits to a post that is already out are not announced again
+        return
+    # A post is announced once, when it first goes out, however often it is saved or republished
+    jobs.enqueue(
+        'blog.notify_post_published', {'post_id': instance.pk, 'created': created},
+        key=f'post-published:{instance.pk}',
+    )
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the full-text index in step with published posts"""
+    if raw or (update_fields and not SEARCH_INDEX_FIELDS.intersection(update_fields)):
+        return
     if instance.status == 'published':
-        # In a real application, you would send emails, push notifications, etc.
-        # For demonstration, we'll just print a message
-        if created:
-            print(f"New post published: {instance.title} by {instance.author.username}")
+        search.index_posts([instance])
+    else:
+        search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def generate_featured_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Create resized copies of a newly uploaded featured image"""
+    if raw or not instance.featured_image or (update_fields and 'featured_image' not in update_fields):
+        return
+    name = instance.featured_image.name
+    jobs.enqueue('blog.generate_image_variants', {'name': name}, key=f'image-variants:{name}')
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop deleted posts from the full-text index"""
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def update_published_counts(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Move published-post counters when a post's status or category changes"""
+    if raw or (update_fields and not COUNTER_FIELDS.intersection(update_fields)):
+        return
+    previous = getattr(instance, '_previous_state', None) or {}
+    was_published = previous.get('status') == 'published'
+    is_published = instance.status == 'published'
+    old_category_id = previous.get('category_id')
+    if was_published == is_published and (not is_published or old_category_id == instance.category_id):
+        return
+
+    # Post.save() runs this inside the transaction that wrote the row
+    if was_published:
+        adjust_published_post_count(Category, [old_category_id], -1)
+    if is_published:
+        adjust_published_post_count(Category, [instance.category_id], 1)
+    if was_published != is_published and not created:
+        tag_ids = list(instance.tags.values_list('pk', flat=True))
+        adjust_published_post_count(Tag, tag_ids, 1 if is_published else -1)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep tag counters in step with tags added to or removed from published posts"""
+    if action in ('pre_remove', 'pre_clear'):
+        # Only links that actually exist may decrement a counter
+        instance._removed_tag_links = []
+        if reverse:
+            linked = instance.posts.filter(status='published')
+        elif instance.status == 'published':
+            linked = instance.tags.all()
         else:
-            print(f"Post updated and published: {instance.title}")
+            return
+        if action == 'pre_remove':
+            linked = linked.filter(pk__in=pk_set)
+        instance._removed_tag_links = list(linked.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_add':
+        sign, linked_pks = 1, pk_set
+        if reverse:
+            linked_pks = Post.objects.filter(pk__in=pk_set, status='published').values_list('pk', flat=True)
+        elif instance.status != 'published':
+            return
+    else:
+        sign, linked_pks = -1, getattr(instance, '_removed_tag_links', [])
+
+    # Related managers send m2m_changed inside the transaction that changes the links
+    if reverse:
+        adjust_published_post_count(Tag, [instance.pk], sign * len(linked_pks))
+    else:
+        adjust_published_post_count(Tag, list(linked_pks), sign)
+
+
+@receiver(pre_delete, sender=Post)
+def capture_deleted_post_tags(sender, instance, **kwargs):
+    """Remember a published post's tags before its links are deleted"""
+    if instance.status == 'published':
+        instance._deleted_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Post)
+def expire_related_lists(sender, instance, **kwargs):
+    """Have blog.related rebuild the lists that showed a post before they lose it"""
+    slugs = list(_referring_slugs(instance))
+    if slugs:
+        Post.objects.filter(slug__in=slugs).update(related_refreshed_at=None)
+        cache.bump_versions_on_commit(cache.post_scope(slug) for slug in slugs)
+
+
+@receiver(post_delete, sender=Post)
+def release_published_counts(sender, instance, **kwargs):
+    """Decrement counters for a deleted published post"""
+    if instance.status != 'published':
+        return
+    # Deletion sends post_delete inside the transaction that removes the row
+    adjust_published_post_count(Category, [instance.category_id], -1)
+    adjust_published_post_count(Tag, getattr(instance, '_deleted_tag_ids', []), -1)
+
+
+@receiver(post_save, sender=Comment)
+def update_approved_comment_count(sender, instance, raw=False, **kwargs):
+    """Keep Post.approved_comment_count in step with comment approval"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None) or {}
+    was_approved = previous.get('approved', False)
+    old_post_id = previous.get('post_id', instance.post_id)
+    deltas = {}
+    if was_approved:
+        deltas[old_post_id] = -1
+    if instance.approved:
+        deltas[instance.post_id] = deltas.get(instance.post_id, 0) + 1
+    adjust_approved_comment_counts(deltas)
+
+
+@receiver(post_delete, sender=Comment)
+def release_approved_comment_count(sender, instance, **kwargs):
+    """Decrement the post's counter when an approved comment is deleted"""
+    if instance.loaded_values().get('approved', instance.approved):
+        adjust_approved_comment_counts({instance.post_id: -1})
+
+
+def _post_slugs(post_ids):
+    return Post.objects.filter(pk__in=post_ids).values_list('slug', flat=True)
+
+
+def _referring_slugs(post):
+    """Slugs of the posts listing ``post`` among their related posts"""
+    return RelatedPost.objects.filter(related=post).values_list('post__slug', flat=True)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_pages(sender, instance, raw=False, **kwargs):
+    """Expire cached pages showing a saved post"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None) or {}
+    scopes = {cache.post_scope(instance.slug)}
+    if previous.get('slug'):
+        scopes.add(cache.post_scope(previous['slug']))
+    if instance.status == 'published' or previous.get('status') == 'published':
+        scopes.add(cache.HOME)
+        category_ids = {instance.category_id, previous.get('category_id')}
+        scopes.update(cache.category_scope(slug) for slug in
+                      Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True))
+        scopes.update(cache.tag_scope(slug) for slug in instance.tags.values_list('slug', flat=True))
+        # Posts listing this one among their related posts show its title and excerpt
+        scopes.update(cache.post_scope(slug) for slug in _referring_slugs(instance))
+    cache.bump_versions_on_commit(scopes)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    """Expire cached pages showing a deleted post"""
+    scopes = {cache.post_scope(instance.slug)}
+    if instance.status == 'published':
+        scopes.add(cache.HOME)
+        scopes.update(cache.category_scope(slug) for slug in
+                      Category.objects.filter(pk=instance.category_id).values_list('slug', flat=True))
+        scopes.update(cache.tag_scope(slug) for slug in
+                      Tag.objects.filter(pk__in=getattr(instance, '_deleted_tag_ids', [])).values_list('slug', flat=True))
+    cache.bump_versions_on_commit(scopes)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_tagged_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    """Expire cached pages when tags are added to or removed from posts"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    changed = pk_set if action != 'post_clear' else getattr(instance, '_removed_tag_links', [])
+    scopes = {cache.HOME}
+    if reverse:
+        scopes.add(cache.tag_scope(instance.slug))
+        scopes.update(cache.post_scope(slug) for slug in _post_slugs(changed))
+    else:
+        scopes.add(cache.post_scope(instance.slug))
+        scopes.update(cache.tag_scope(slug) for slug in Tag.objects.filter(pk__in=changed).values_list('slug', flat=True))
+    cache.bump_versions_on_commit(scopes)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_taxonomy_pages(sender, instance, raw=False, **kwargs):
+    """Category and tag names appear on most pages; expire them all"""
+    if not raw:
+        cache.bump_versions_on_commit([cache.TAXONOMY])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post_page(sender, instance, raw=False, **kwargs):
+    """Expire a post's page when one of its visible comments changes"""
+    if raw:
+        return
+    if instance.approved or instance.loaded_values().get('approved'):
+        cache.bump_versions_on_commit(cache.post_scope(slug) for slug in _post_slugs([instance.post_id]))
+
+
+@receiver(comments_moderated, sender=Comment)
+def invalidate_moderated_post_pages(sender, post_ids, **kwargs):
+    """Expire pages of posts whose comments were bulk approved or unapproved"""
+    cache.bump_versions_on_commit(cache.post_scope(slug) for slug in _post_slugs(post_ids))
@@ -0,0 +1,153 @@
+"""
+Segmented sitemaps written to disk.
+
+URLs of published posts, categories and tags go into sitemap files of at
+most ``BLOG_SITEMAP_SEGMENT_SIZE`` URLs (50,000, the protocol limit), listed
+by a sitemap index. Segment ``n`` of a section holds the rows with primary
+keys from ``n * size`` to ``(n + 1) * size - 1``, so a post keeps its segment
+for life and one GROUP BY query gives a fingerprint per segment: row count,
+sum of primary keys and, for posts, the newest ``updated_at``. Saving a post
+moves its ``updated_at`` past every other row's, so comparing fingerprints
+with the ``manifest.json`` of the previous run finds exactly the segments to
+rewrite. Rows are streamed with ``iterator()`` and written straight to the
+file, which keeps memory flat however many posts there are.
+
+Categories and tags have no modification time; there are few of them, so
+their segments are rewritten on every run.
+"""
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Sum
+
+from .models import Category, Post, Tag
+
+DEFAULT_SEGMENT_SIZE = 50000
+INDEX_NAME = 'index'
+MANIFEST = 'manifest.json'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _sections():
+    """Section name, queryset and modification-time field of each sitemap section"""
+    return [
+        ('posts', Post.objects.published().only('slug', 'updated_at'), 'updated_at'),
+        ('categories', Category.objects.filter(published_post_count__gt=0).only('slug'), None),
+        ('tags', Tag.objects.filter(published_post_count__gt=0).only('slug'), None),
+    ]
+
+
+def get_root():
+    return str(getattr(settings, 'BLOG_SITEMAP_ROOT', settings.BASE_DIR / 'sitemaps'))
+
+
+def get_segment_size():
+    return getattr(settings, 'BLOG_SITEMAP_SEGMENT_SIZE', DEFAULT_SEGMENT_SIZE)
+
+
+def sitemap_path(name=INDEX_NAME, root=None):
+    """File holding the sitemap index (``index``) or segment ``name``"""
+    filename = 'sitemap.xml' if name == INDEX_NAME else f'sitemap-{name}.xml'
+    return os.path.join(root or get_root(), filename)
+
+
+def _w3c(value):
+    return value.astimezone(dt_timezone.utc).replace(microsecond=0).isoformat()
+
+
+def _fingerprints(queryset, size, lastmod_field):
+    aggregates = {'count': Count('pk'), 'checksum': Sum('pk')}
+    if lastmod_field:
+        aggregates['lastmod'] = Max(lastmod_field)
+    rows = (
+        queryset.order_by()
+        .annotate(segment=F('pk') / size)
+        .values('segment')
+        .annotate(**aggregates)
+    )
+    return {
+        # Full precision: two saves within a second must still differ
+        row['segment']: [row['count'], row['checksum'], row['lastmod'].isoformat() if row.get('lastmod') else None]
+        for row in rows
+    }
+
+
+def _atomic_write(path, chunks):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        for chunk in chunks:
+            handle.write(chunk)
+    os.replace(temporary, path)
+
+
+def _segment_xml(queryset, base_url, lastmod_field):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS}">\n'
+    for obj in queryset.order_by('pk').iterator(chunk_size=2000):
+        lastmod = f'<lastmod>{_w3c(getattr(obj, lastmod_field))}</lastmod>' if lastmod_field else ''
+        yield f'<url><loc>{escape(base_url + obj.get_absolute_url())}</loc>{lastmod}</url>\n'
+    yield '</urlset>\n'
+
+
+def _index_xml(segments, base_url):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{XMLNS}">\n'
+    for name, entry in sorted(segments.items()):
+        lastmod = f'<lastmod>{_w3c(datetime.fromisoformat(entry[2]))}</lastmod>' if entry[2] else ''
+        location = escape(f'{base_url}/sitemap-{name}.xml')
+        yield f'<sitemap><loc>{location}</loc>{lastmod}</sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST)) as handle:
+            return json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def generate(base_url=None, root=None, full=False, progress=None):
+    """
+    Bring the sitemap files in ``root`` up to date and return how many
+    segments were ``written``, left ``unchanged`` and ``removed``.
+    """
+    root = root or get_root()
+    base_url = (base_url or settings.BLOG_SITE_URL).rstrip('/')
+    size = get_segment_size()
+    os.makedirs(root, exist_ok=True)
+
+    manifest = load_manifest(root) or {}
+    previous = manifest.get('segments', {})
+    reusable = not full and manifest.get('base_url') == base_url and manifest.get('segment_size') == size
+
+    segments = {}
+    stats = {'written': 0, 'unchanged': 0, 'removed': 0}
+    for section, queryset, lastmod_field in _sections():
+        for number, fingerprint in sorted(_fingerprints(queryset, size, lastmod_field).items()):
+            name = f'{section}-{number:05d}'
+            segments[name] = fingerprint
+            path = sitemap_path(name, root)
+            if reusable and lastmod_field and previous.get(name) == fingerprint and os.path.exists(path):
+                stats['unchanged'] += 1
+                continue
+            rows = queryset.filter(pk__gte=number * size, pk__lt=(number + 1) * size)
+            _atomic_write(path, _segment_xml(rows, base_url, lastmod_field))
+            stats['written'] += 1
+            if progress:
+                progress(name)
+
+    for name in set(previous) - set(segments):
+        # Every row of the segment was unpublished or deleted
+        try:
+            os.remove(sitemap_path(name, root))
+        except FileNotFoundError:
+            pass
+        stats['removed'] += 1
+
+    _atomic_write(sitemap_path(INDEX_NAME, root), _index_xml(segments, base_url))
+    _atomic_write(os.path.join(root, MANIFEST), [json.dumps(
+        {'base_url': base_url, 'segment_size': size, 'segments': segments}, indent=1, sort_keys=True,
+    )])
+    return stats
@@ -0,0 +1,210 @@
+"""
+Deterministic synthetic datasets for benchmarking and index tuning.
+
+``generate()`` creates users, categories and tags up front and then posts,
+tag links and comments in independent chunks, each written with a few
+``bulk_create`` calls. Every chunk draws from its own random generator
+seeded with ``(seed, chunk number)``, so the same seed produces the same
+dataset whether the chunks run in one process or are spread over many.
+``bulk_create`` skips ``save()`` and signals, so derived columns are filled in
+here and the denormalized counters are recomputed at the end.
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.db.models import F
+
+from .content import process_content
+from .counters import recount_approved_comments, recount_published_posts
+from .models import Category, Comment, Post, Tag
+
+PREFIX = 'synthetic'
+PASSWORD = 'synthetic123'
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+SPAN_SECONDS = 5 * 365 * 24 * 3600
+
+WORDS = (
+    'django python query index cache latency database server request response template '
+    'model view signal worker queue backend frontend deploy release feature design pattern '
+    'testing benchmark profile memory thread process async event loop socket stream batch '
+    'schema migration table column row join filter order limit offset cursor page search '
+    'token vector rank score feed sitemap image thumbnail upload storage media static file '
+    'author reader comment post category tag archive draft publish review edit update create '
+    'delete secure session cookie header status error retry timeout backoff scale shard '
+    'replica primary read write commit rollback lock transaction isolation consistency'
+).split()
+CATEGORY_NAMES = (
+    'Technology', 'Programming', 'Web Development', 'Data Science', 'DevOps', 'Security',
+    'Design', 'Career', 'Startups', 'Productivity', 'Travel', 'Food', 'Lifestyle', 'Science',
+    'Business', 'Education', 'Health', 'Gaming', 'Music', 'Photography',
+)
+
+
+def _zipf_weights(count):
+    """Cumulative weights so a few items are popular and most are rare"""
+    return list(accumulate(1 / (rank + 1) for rank in range(count)))
+
+
+def _sentence(rng, length):
+    words = rng.choices(WORDS, k=length)
+    return ' '.join(words).capitalize() + '.'
+
+
+def _body(rng, words):
+    parts = []
+    written = 0
+    section = 0
+    while written < words:
+        if written and rng.random() < 0.25:
+            section += 1
+            parts.append(f'<h2>{_sentence(rng, 3)[:-1]} {section}</h2>')
+        sentences = [_sentence(rng, rng.randint(6, 16)) for _ in range(rng.randint(2, 5))]
+        written += sum(len(sentence.split()) for sentence in sentences)
+        parts.append(f'<p>{" ".join(sentences)}</p>')
+    return ''.join(parts)
+
+
+def create_fixtures(users, tags):
+    """Create synthetic users, categories and tags; return the ids posts draw from"""
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    authors = max(1, users // 20)
+    User.objects.bulk_create([
+        User(
+            username=f'{PREFIX}-{"author" if index < authors else "reader"}-{index:07d}',
+            email=f'{PREFIX}{index}@example.com',
+            role='author' if index < authors else 'reader',
+            password=password,
+        )
+        for index in range(users)
+    ], batch_size=1000, ignore_conflicts=True)
+    Category.objects.bulk_create([
+        Category(name=f'{name} ({PREFIX})', slug=f'{PREFIX}-{index:02d}')
+        for index, name in enumerate(CATEGORY_NAMES)
+    ], ignore_conflicts=True)
+    Tag.objects.bulk_create([
+        Tag(name=f'{WORDS[index % len(WORDS)]}-{index:05d}', slug=f'{PREFIX}-tag-{index:05d}')
+        for index in range(tags)
+    ], batch_size=1000, ignore_conflicts=True)
+
+    synthetic_users = User.objects.filter(username__startswith=f'{PREFIX}-').order_by('username')
+    return {
+        'author_ids': list(synthetic_users.filter(role='author').values_list('pk', flat=True)),
+        'user_ids': list(synthetic_users.values_list('pk', flat=True)),
+        'category_ids': list(Category.objects.filter(slug__startswith=f'{PREFIX}-')
+                             .order_by('slug').values_list('pk', flat=True)),
+        'tag_ids': list(Tag.objects.filter(slug__startswith=f'{PREFIX}-tag-')
+                        .order_by('slug').values_list('pk', flat=True)),
+    }
+
+
+def generate_chunk(fixtures, seed, chunk, start, count, options):
+    """Create posts ``start`` to ``start + count`` with their tags and comments"""
+    rng = random.Random(f'{seed}:{chunk}')
+    tag_weights = _zipf_weights(len(fixtures['tag_ids']))
+    category_weights = _zipf_weights(len(fixtures['category_ids']))
+
+    posts = []
+    for index in range(start, start + count):
+        title = _sentence(rng, rng.randint(4, 9))[:-1]
+        processed = process_content(_body(rng, max(20, int(rng.expovariate(1 / options['words'])))))
+        published = rng.random() < options['published_ratio']
+        posts.append(Post(
+            title=title,
+            slug=f'{PREFIX}-{index:08d}',
+            content=processed.html,
+            rendered_content=processed.html,
+            word_count=processed.word_count,
+            reading_time=processed.reading_time,
+            toc=processed.toc,
+            excerpt=processed.excerpt,
+            author_id=rng.choice(fixtures['author_ids']),
+            category_id=rng.choices(fixtures['category_ids'], cum_weights=category_weights)[0],
+            status='published' if published else 'draft',
+            published_at=EPOCH + timedelta(seconds=rng.randrange(SPAN_SECONDS)) if published else None,
+            views=int(rng.paretovariate(1.2) * 10) if published else 0,
+        ))
+
+    with transaction.atomic():
+        Post.objects.bulk_create(posts, batch_size=options['batch_size'])
+        post_ids = [post.pk for post in posts]
+        # auto_now_add stamps the insert time; line the history up with publication
+        Post.objects.filter(pk__in=post_ids, published_at__isnull=False).update(created_at=F('published_at'))
+
+        links = []
+        for post in posts:
+            if fixtures['tag_ids']:
+                chosen = set(rng.choices(fixtures['tag_ids'], cum_weights=tag_weights, k=rng.randint(0, 4)))
+                links.extend(Post.tags.through(post_id=post.pk, tag_id=tag_id) for tag_id in chosen)
+        Post.tags.through.objects.bulk_create(links, batch_size=options['batch_size'])
+
+        comments = []
+        for post in posts:
+            if post.status != 'published':
+                continue
+            for _ in range(int(rng.expovariate(1 / options['comments'])) if options['comments'] else 0):
+                comments.append(Comment(
+                    post_id=post.pk,
+                    user_id=rng.choice(fixtures['user_ids']),
+                    content=_sentence(rng, rng.randint(5, 30)),
+                    approved=rng.random() < 0.85,
+                ))
+        Comment.objects.bulk_create(comments, batch_size=options['batch_size'])
+    return len(posts), len(links), len(comments)
+
+
+_worker_fixtures = None
+
+
+def _init_worker(fixtures):
+    # Also covers the "spawn" start method, where children start without Django
+    global _worker_fixtures
+    django.setup()
+    _worker_fixtures = fixtures
+
+
+def _generate_in_worker(seed, chunk, start, count, options):
+    return generate_chunk(_worker_fixtures, seed, chunk, start, count, options)
+
+
+def generate(posts, users, tags, seed=0, workers=1, chunk_size=2000, words=300, comments=3,
+             published_ratio=0.9, batch_size=1000, progress=None):
+    """Build a synthetic dataset and return (posts, tag links, comments) created"""
+    if Post.objects.filter(slug__startswith=f'{PREFIX}-').exists():
+        raise ValueError('Synthetic posts already exist; generate into an empty database.')
+    fixtures = create_fixtures(users, tags)
+    if not fixtures['author_ids']:
+        raise ValueError('At least one synthetic user is needed to author posts.')
+    options = {'words': words, 'comments': comments, 'published_ratio': published_ratio, 'batch_size': batch_size}
+    chunks = [
+        (seed, number, start, min(chunk_size, posts - start), options)
+        for number, start in enumerate(range(0, posts, chunk_size))
+    ]
+
+    totals = [0, 0, 0]
+    if workers <= 1:
+        results = (generate_chunk(fixtures, *chunk) for chunk in chunks)
+    else:
+        # Forked children must open their own database connections
+        connections.close_all()
+        # The id lists are sent to each process once rather than with every chunk
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fixtures,))
+        results = pool.map(_generate_in_worker, *zip(*chunks)) if chunks else []
+    try:
+        for result in results:
+            totals = [total + value for total, value in zip(totals, result)]
+            if progress:
+                progress(*totals)
+    finally:
+        if workers > 1:
+            pool.shutdown()
+
+    recount_published_posts(Category, Tag, Post)
+    recount_approved_comments(Post, Comment)
+    return tuple(totals)
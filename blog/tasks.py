@@ -0,0 +1,24 @@
+"""Background jobs for post-publish side effects, run by blog.jobs workers"""
+from . import images
+from .jobs import job
+from .models import Post
+
+
+@job('blog.notify_post_published')
+def notify_post_published(post_id, created):
+    """Send notification when a post is published"""
+    post = Post.objects.select_related('author').filter(pk=post_id, status='published').first()
+    if post is None:
+        return
+    # In a real application, you would send emails, push notifications, etc.
+    # For demonstration, we'll just print a message
+    if created:
+        print(f"New post published: {post.title} by {post.author.username}")
+    else:
+        print(f"Post updated and published: {post.title}")
+
+
+@job('blog.generate_image_variants')
+def generate_image_variants(name):
+    """Create resized copies of an uploaded image"""
+    images.generate_variants(name)
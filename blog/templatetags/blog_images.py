@@ -0,0 +1,22 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from blog import images
+
+register = template.Library()
+
+
+@register.inclusion_tag('blog/includes/responsive_image.html')
+def responsive_image(image, alt='', css_class='', style='', sizes='100vw'):
+    """Render an uploaded image as a <picture> offering its resized WebP and JPEG variants"""
+    name = getattr(image, 'name', image)
+    widths = images.variant_widths(name)
+    return {
+        'src': default_storage.url(name),
+        'webp_srcset': images.srcset(name, 'webp', widths=widths),
+        'jpeg_srcset': images.srcset(name, 'jpeg', widths=widths),
+        'alt': alt,
+        'css_class': css_class,
+        'style': style,
+        'sizes': sizes,
+    }
@@ -1,3 +1,1241 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import (
+    AsyncClient, AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from . import benchmarks, popularity, queryplans, related, routers, sitemaps
+from .async_views import AsyncHomeView, AsyncPostDetailView
+from .cache import HOME, bump_versions, get_cache, lag_safe_timeout
+from .cards import PostCard
+from .content import process_content
+from .images import variant_name
+from .jobs import claim, enqueue, job, run
+from .pagination import CursorPaginator
+from .models import Category, Comment, Job, Post, PostViewBucket, RelatedPost, Tag
+from .search import search_posts
+from .viewcounts import ViewCountBuffer
+
+User = get_user_model()
+
+# The manifest storage needs collectstatic; tests render templates without it
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES, BLOG_VIEW_COUNT_FLUSH_INTERVAL=0, USER_ACTIVITY_WINDOW=0, BLOG_JOBS_EAGER=True,
+    BLOG_REQUEST_LOG_SAMPLE_RATE=0,
+)
+class BlogTestCase(TestCase):
+    """Shared fixtures for blog tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass12345', role='author')
+
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+
+    def create_post(self, title, content='<p>Body</p>', status='published', **kwargs):
+        return Post.objects.create(title=title, content=content, status=status, author=self.author, **kwargs)
+
+
+class SearchTests(BlogTestCase):
+    def published(self):
+        return Post.objects.filter(status='published')
+
+    def test_ranks_title_matches_first_and_highlights(self):
+        body_match = self.create_post('Cooking notes', '<p>A short word on <b>django</b> templates</p>')
+        title_match = self.create_post('Django tips', '<p>Some django advice</p>')
+
+        results = search_posts('django', self.published())
+
+        self.assertEqual(results.count(), 2)
+        self.assertEqual([post.pk for post in results[0:2]], [title_match.pk, body_match.pk])
+        self.assertIn('<mark>django</mark>', results[0].search_snippet)
+        self.assertNotIn('<b>', results[1].search_snippet)
+
+    def test_index_follows_status_and_deletes(self):
+        post = self.create_post('Hidden gem', status='draft')
+        self.assertEqual(search_posts('gem', self.published()).count(), 0)
+
+        post.status = 'published'
+        post.save()
+        self.assertEqual(search_posts('gem', self.published()).count(), 1)
+
+        post.delete()
+        self.assertEqual(search_posts('gem', self.published()).count(), 0)
+
+    def test_query_syntax_is_escaped(self):
+        self.create_post('Quotes and stars')
+        self.assertEqual(search_posts('"quotes* AND (', self.published()).count(), 1)
+
+    def test_rebuild_command(self):
+        self.create_post('Rebuilt entry')
+        call_command('rebuild_search_index', batch_size=1, stdout=open('/dev/null', 'w'))
+        self.assertEqual(search_posts('rebuilt', self.published()).count(), 1)
+
+    def test_search_view(self):
+        self.create_post('Searchable title', '<p>Searchable body</p>')
+        response = self.client.get(reverse('blog:search'), {'query': 'searchable'})
+        self.assertContains(response, 'Searchable title')
+        self.assertContains(response, 'Found 1 post')
+
+
+class ViewCountTests(BlogTestCase):
+    def test_buffered_views_are_flushed_as_increments(self):
+        first = self.create_post('First')
+        second = self.create_post('Second')
+        buffer = ViewCountBuffer()
+
+        with self.settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=60):
+            buffer._ensure_worker = lambda: None
+            for post in (first, first, second):
+                buffer.record(post.pk)
+            self.assertEqual(buffer.pending(first.pk), 2)
+            first.refresh_from_db()
+            self.assertEqual(first.views, 0)
+
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(buffer.flush(), 3)
+            updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "blog_post" SET "views"')]
+            self.assertEqual(len(updates), 2)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.views, second.views), (2, 1))
+        self.assertEqual(buffer.pending(first.pk), 0)
+
+    @override_settings(BLOG_VIEW_COUNTING=False)
+    def test_counting_can_be_turned_off(self):
+        post = self.create_post('Uncounted')
+        self.client.get(post.get_absolute_url())
+        post.refresh_from_db()
+        self.assertEqual(post.views, 0)
+        self.assertFalse(PostViewBucket.objects.exists())
+
+    def test_detail_view_counts_without_saving_post(self):
+        post = self.create_post('Counted')
+        updated_at = post.updated_at
+
+        response = self.client.get(post.get_absolute_url())
+
+        self.assertContains(response, '1 views')
+        post.refresh_from_db()
+        self.assertEqual(post.views, 1)
+        self.assertEqual(post.updated_at, updated_at)
+
+
+class PopularityTests(BlogTestCase):
+    def read(self, post, views, at):
+        Post.objects.filter(pk=post.pk).update(**popularity.score_updates(views, at))
+        popularity.record_buckets({post.pk: views}, at)
+
+    def test_views_feed_buckets_and_rankings(self):
+        first, second = self.create_post('First'), self.create_post('Second')
+        self.create_post('Unread')
+        for post in (second, first, second):
+            self.client.get(post.get_absolute_url())
+
+        self.assertEqual(PostViewBucket.objects.get(post=second).views, 2)
+        popularity.refresh()
+        response = self.client.get(reverse('blog:trending'))
+        self.assertEqual([card.pk for card in response.context['posts']], [second.pk, first.pk])
+        response = self.client.get(reverse('blog:popular'))
+        self.assertEqual([card.pk for card in response.context['posts']], [second.pk, first.pk])
+        self.assertContains(self.client.get(reverse('blog:home')), 'Trending')
+
+    def test_recent_views_outrank_older_ones(self):
+        now = timezone.now()
+        half_life = timedelta(seconds=popularity.get_half_life())
+        old_favourite, rising = self.create_post('Old favourite'), self.create_post('Rising')
+        self.read(old_favourite, 10, now - 4 * half_life)
+        self.read(rising, 3, now)
+
+        self.assertEqual(popularity.compute_trending(now, 10), [rising.pk, old_favourite.pk])
+        # Popularity within the window ignores decay
+        self.assertEqual(popularity.compute_popular(now, 10), [old_favourite.pk, rising.pk])
+
+    def test_scores_carry_over_into_the_next_era(self):
+        era, _ = popularity.era_and_weight(timezone.now())
+        era_start = datetime.fromtimestamp(
+            era * popularity.ERA_HALF_LIVES * popularity.get_half_life(), tz=dt_timezone.utc,
+        )
+        half_life = timedelta(seconds=popularity.get_half_life())
+        carried, fresh = self.create_post('Carried'), self.create_post('Fresh')
+        self.read(carried, 4, era_start - half_life)
+        self.read(carried, 1, era_start + half_life)
+        self.read(fresh, 1, era_start + half_life)
+
+        carried.refresh_from_db()
+        self.assertEqual(carried.trending_era, era)
+        # 4 views two half-lives before the new one count as one more, each worth 2 this era
+        self.assertAlmostEqual(carried.trending_score, 2 * 2.0, places=6)
+        self.assertEqual(popularity.compute_trending(era_start + half_life, 10), [carried.pk, fresh.pk])
+
+    def test_readers_never_rebuild_rankings(self):
+        self.create_post('Read')
+        with self.assertNumQueries(0):
+            self.assertEqual(popularity.get_ranking(popularity.TRENDING), [])
+        # The view-count flusher rebuilds them off the request path
+        ViewCountBuffer()._refresh_rankings()
+        self.assertEqual(popularity.get_ranking(popularity.POPULAR), [])
+        self.assertIsNotNone(get_cache().get('blog:ranking:popular'))
+
+
+class PublishedPostCountTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Tech')
+        self.other_category = Category.objects.create(name='Food')
+        self.tag = Tag.objects.create(name='Python')
+
+    def assertCounts(self, category, other_category, tag):
+        for obj in (self.category, self.other_category, self.tag):
+            obj.refresh_from_db()
+        self.assertEqual(
+            (self.category.published_post_count, self.other_category.published_post_count,
+             self.tag.published_post_count),
+            (category, other_category, tag),
+        )
+
+    def test_counts_follow_post_lifecycle(self):
+        draft = self.create_post('Draft', status='draft', category=self.category)
+        draft.tags.add(self.tag)
+        self.assertCounts(0, 0, 0)
+
+        draft.status = 'published'
+        draft.save()
+        self.assertCounts(1, 0, 1)
+
+        draft.category = self.other_category
+        draft.save()
+        self.assertCounts(0, 1, 1)
+
+        draft.tags.remove(self.tag)
+        self.assertCounts(0, 1, 0)
+
+        self.tag.posts.add(draft)
+        self.assertCounts(0, 1, 1)
+
+        draft.delete()
+        self.assertCounts(0, 0, 0)
+
+    def test_recount_repairs_drift(self):
+        post = self.create_post('Live', category=self.category)
+        post.tags.add(self.tag)
+        Category.objects.update(published_post_count=7)
+        Tag.objects.update(published_post_count=0)
+
+        call_command('recount', stdout=open('/dev/null', 'w'))
+
+        self.assertCounts(1, 0, 1)
+
+    def test_home_sidebar_skips_drafts(self):
+        self.create_post('Only draft', status='draft', category=self.category)
+        response = self.client.get(reverse('blog:home'))
+        self.assertNotContains(response, 'Tech <span')
+
+
+@override_settings(STORAGES=TEST_STORAGES, BLOG_JOBS_EAGER=True, BLOG_REQUEST_LOG_SAMPLE_RATE=0)
+class PublishedPostCountAtomicityTests(TransactionTestCase):
+    def test_failed_counter_update_rolls_back_the_post(self):
+        author = User.objects.create_user('author', password='pass12345', role='author')
+        category = Category.objects.create(name='Tech')
+
+        with mock.patch('blog.signals.adjust_published_post_count', side_effect=DatabaseError('counter')):
+            with self.assertRaises(DatabaseError):
+                Post.objects.create(title='Lost', status='published', author=author, category=category)
+
+        self.assertFalse(Post.objects.filter(title='Lost').exists())
+        category.refresh_from_db()
+        self.assertEqual(category.published_post_count, 0)
+
+
+class ApprovedCommentCountTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.reader = User.objects.create_user('reader', password='pass12345')
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Discussed')
+
+    def comment(self, **kwargs):
+        return Comment.objects.create(post=self.post, user=self.reader, content='Hi', **kwargs)
+
+    def assertCount(self, expected):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.approved_comment_count, expected)
+
+    def test_count_follows_save_and_delete(self):
+        pending = self.comment()
+        self.assertCount(0)
+
+        pending.approved = True
+        pending.save()
+        self.assertCount(1)
+        pending.save()
+        self.assertCount(1)
+
+        Comment.objects.get(pk=pending.pk).delete()
+        self.assertCount(0)
+
+    def test_bulk_moderation_keeps_count(self):
+        self.comment()
+        self.comment()
+        self.comment(approved=True)
+        self.assertCount(1)
+
+        self.assertEqual(Comment.objects.filter(post=self.post).approve(), 2)
+        self.assertCount(3)
+
+        self.assertEqual(Comment.objects.filter(post=self.post).disapprove(), 3)
+        self.assertCount(0)
+
+    def test_purge_releases_approved_comments(self):
+        self.comment()
+        self.comment(approved=True)
+        self.comment(approved=True)
+        self.assertCount(2)
+
+        self.assertEqual(Comment.objects.filter(post=self.post).purge(), 3)
+        self.assertCount(0)
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+
+    def test_moderation_endpoint_only_touches_own_posts(self):
+        other_author = User.objects.create_user('other', password='pass12345', role='author')
+        foreign_post = Post.objects.create(title='Foreign', content='<p>x</p>', status='published', author=other_author)
+        mine = [self.comment(), self.comment()]
+        foreign = Comment.objects.create(post=foreign_post, user=self.reader, content='Spam')
+        self.client.force_login(self.author)
+        ids = [comment.pk for comment in mine] + [foreign.pk]
+
+        # Session, user and activity stamp, then a savepoint around the locking
+        # SELECT, one UPDATE of comments and one of counters, and the slugs to expire
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('blog:moderate_comments'), {'action': 'approve', 'comment_ids': ids})
+        self.assertRedirects(response, reverse('blog:author_dashboard'), fetch_redirect_response=False)
+        self.assertCount(2)
+        self.assertFalse(Comment.objects.get(pk=foreign.pk).approved)
+
+        self.client.post(reverse('blog:moderate_comments'), {'action': 'delete', 'comment_ids': ids})
+        self.assertCount(0)
+        self.assertTrue(Comment.objects.filter(pk=foreign.pk).exists())
+        self.assertEqual(self.client.get(reverse('blog:moderate_comments')).status_code, 405)
+
+    def test_single_comment_moderation_requires_post(self):
+        comment = self.comment()
+        self.client.force_login(self.author)
+        # A GET would leave the moderator unpinned from the primary after the write
+        for name in ('blog:approve_comment', 'blog:delete_comment'):
+            self.assertEqual(self.client.get(reverse(name, args=[comment.pk])).status_code, 405)
+        self.assertFalse(Comment.objects.get(pk=comment.pk).approved)
+
+        response = self.client.post(reverse('blog:approve_comment', args=[comment.pk]))
+        self.assertRedirects(response, reverse('blog:author_dashboard'), fetch_redirect_response=False)
+        self.assertTrue(Comment.objects.get(pk=comment.pk).approved)
+        self.client.post(reverse('blog:delete_comment', args=[comment.pk]))
+        self.assertFalse(Comment.objects.filter(pk=comment.pk).exists())
+
+    def test_full_post_save_does_not_overwrite_counters(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        self.comment(approved=True)
+
+        stale.title = 'Renamed'
+        stale.save()
+
+        self.assertCount(1)
+
+
+@override_settings(BLOG_COMMENTS_PER_PAGE=2)
+class CommentPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Discussed')
+        # Authors' comments are approved on save
+        self.comments = [
+            Comment.objects.create(post=self.post, user=self.author, content=f'Comment {index}')
+            for index in range(5)
+        ]
+
+    def test_detail_renders_only_the_first_page(self):
+        response = self.client.get(self.post.get_absolute_url())
+        page = response.context['comments_page']
+        self.assertEqual([comment.pk for comment in page], [self.comments[4].pk, self.comments[3].pk])
+        self.assertNotContains(response, 'Comment 2')
+        self.assertContains(response, f'{reverse("blog:post_comments", args=[self.post.slug])}?cursor={page.next_cursor}')
+
+    def test_load_more_walks_the_remaining_comments(self):
+        url = reverse('blog:post_comments', args=[self.post.slug])
+        seen, cursor = [], ''
+        while cursor is not None:
+            data = self.client.get(url, {'cursor': cursor, 'format': 'json'}).json()
+            seen.extend(text for text in ('Comment 4', 'Comment 3', 'Comment 2', 'Comment 1', 'Comment 0')
+                        if text in data['html'])
+            cursor = data['next_cursor']
+        self.assertEqual(seen, ['Comment 4', 'Comment 3', 'Comment 2', 'Comment 1', 'Comment 0'])
+
+        fragment = self.client.get(url)
+        self.assertContains(fragment, 'Load more comments')
+        self.assertNotContains(fragment, '<html')
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 404)
+
+    def test_drafts_hide_their_comments(self):
+        draft = self.create_post('Unpublished', status='draft')
+        self.assertEqual(self.client.get(reverse('blog:post_comments', args=[draft.slug])).status_code, 404)
+
+
+class PageCacheTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Cached post', '<p>Original body</p>')
+
+    def get_detail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(self.post.get_absolute_url())
+
+    def test_anonymous_detail_is_cached_and_still_counts_views(self):
+        self.get_detail()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_detail()
+        self.assertContains(response, 'Original body')
+        # Only the write-through of the view count touches the database
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('SELECT')])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_post_change_invalidates_page(self):
+        self.get_detail()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.content = '<p>Edited body</p>'
+            self.post.save()
+        self.assertContains(self.get_detail(), 'Edited body')
+
+    def test_approved_comment_invalidates_page(self):
+        self.get_detail()
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, user=self.author, content='Fresh comment')
+        self.assertContains(self.get_detail(), 'Fresh comment')
+
+    def test_listing_invalidated_by_new_post(self):
+        self.client.get(reverse('blog:home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post('Brand new post')
+        self.assertContains(self.client.get(reverse('blog:home')), 'Brand new post')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.get_detail()
+        self.client.force_login(self.author)
+        self.assertContains(self.get_detail(), 'Edit Post')
+
+    @override_settings(BLOG_PAGE_CACHE_TIMEOUT=300, BLOG_FEED_CACHE_TIMEOUT=600)
+    def test_versions_of_unknown_slugs_expire(self):
+        cache = get_cache()
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            self.assertEqual(self.client.get(reverse('blog:post_detail', args=['no-such-post'])).status_code, 404)
+        self.assertTrue(add.call_args_list)
+        for call in add.call_args_list:
+            self.assertEqual(call.args[2], 1200)
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False)
+class ConditionalGetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Validated post')
+
+    def get(self, url, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, headers=headers)
+
+    def test_detail_revalidates_without_rendering_and_counts_view(self):
+        url = self.post.get_absolute_url()
+        etag = self.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        with self.assertTemplateNotUsed('blog/post_detail.html'), CaptureQueriesContext(connection) as queries:
+            response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('SELECT')]), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_detail_validator_follows_approved_comments(self):
+        url = self.post.get_absolute_url()
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            reader = User.objects.create_user('reader', password='pass12345')
+            comment = Comment.objects.create(post=self.post, user=reader, content='Pending')
+        self.assertEqual(self.get(url, if_none_match=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.approved = True
+            comment.save()
+        self.assertContains(self.get(url, if_none_match=etag), 'Pending')
+
+    def test_listing_validator_follows_posts_on_the_page(self):
+        url = reverse('blog:home')
+        response = self.get(url)
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Renamed post'
+            self.post.save()
+        self.assertContains(self.get(url, if_none_match=response['ETag']), 'Renamed post')
+
+    def test_listing_changes_when_a_post_on_it_is_removed(self):
+        older = self.create_post('Older post')
+        url = reverse('blog:home')
+        response = self.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.status = 'draft'
+            self.post.save()
+        response = self.get(url, if_none_match=response['ETag'], if_modified_since=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Validated post')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            older.delete()
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 200)
+
+    def test_etag_differs_per_viewer(self):
+        url = self.post.get_absolute_url()
+        etag = self.get(url)['ETag']
+        self.client.force_login(self.author)
+        self.assertEqual(self.get(url, if_none_match=etag).status_code, 200)
+
+    @override_settings(BLOG_PAGE_CACHE_ENABLED=True)
+    def test_cached_page_revalidates_without_queries(self):
+        url = reverse('blog:home')
+        etag = self.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+
+class FeedTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Python', slug='python')
+        self.post = self.create_post(
+            'Feed post', '<p>Feed body paragraph.</p>', category=self.category, excerpt='Stored summary',
+        )
+
+    def get(self, url, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, headers=headers)
+
+    def test_feed_uses_excerpt_and_is_served_from_cache(self):
+        response = self.get(reverse('blog:latest_feed'))
+        self.assertContains(response, 'Stored summary')
+        self.assertNotContains(response, 'Feed body paragraph')
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            cached = self.get(reverse('blog:latest_feed'))
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(self.get(reverse('blog:latest_feed'), if_none_match=response['ETag']).status_code, 304)
+
+    def test_feed_regenerated_only_when_its_posts_change(self):
+        url = reverse('blog:category_atom_feed', args=['python'])
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post('Elsewhere')
+        self.assertEqual(self.get(url, if_none_match=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post('Another Python post', category=self.category)
+        self.assertContains(self.get(url, if_none_match=etag), 'Another Python post')
+
+    def test_latest_feed_follows_category_renames(self):
+        url = reverse('blog:latest_feed')
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Python 3'
+            self.category.save()
+        self.assertContains(self.get(url, if_none_match=etag), 'Python 3')
+
+    def test_feed_changes_when_a_post_is_unpublished(self):
+        url = reverse('blog:latest_feed')
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.status = 'draft'
+            self.post.save()
+        response = self.get(url, if_none_match=etag, if_modified_since=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Feed post')
+
+    def test_tag_feed_and_unknown_slugs(self):
+        tag = Tag.objects.create(name='orm', slug='orm')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.add(tag)
+        self.assertContains(self.get(reverse('blog:tag_feed', args=['orm'])), 'Feed post')
+        self.assertEqual(self.get(reverse('blog:tag_feed', args=['missing'])).status_code, 404)
+
+class SitemapTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings_override = override_settings(
+            BLOG_SITEMAP_ROOT=self.root, BLOG_SITEMAP_SEGMENT_SIZE=10, BLOG_SITE_URL='https://blog.example',
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.category = Category.objects.create(name='Python', slug='python')
+        self.posts = [self.create_post(f'Post {index}', category=self.category) for index in range(25)]
+        self.create_post('Draft', status='draft')
+
+    def read(self, name):
+        with open(sitemaps.sitemap_path(name)) as handle:
+            return handle.read()
+
+    def test_segments_cover_published_posts_and_listings(self):
+        call_command('generate_sitemaps', stdout=io.StringIO())
+
+        manifest = sitemaps.load_manifest(self.root)
+        post_segments = [name for name in manifest['segments'] if name.startswith('posts-')]
+        self.assertEqual(sum(manifest['segments'][name][0] for name in post_segments), 25)
+        urls = ''.join(self.read(name) for name in post_segments)
+        self.assertIn(f'https://blog.example{self.posts[0].get_absolute_url()}', urls)
+        self.assertNotIn('draft', urls)
+        self.assertIn(self.category.get_absolute_url(), self.read('categories-00000'))
+        self.assertEqual(self.read('index').count('<sitemap>'), len(manifest['segments']))
+
+        response = self.client.get(reverse('blog:sitemap_index'))
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        self.assertIn(b'https://blog.example/sitemap-posts-', b''.join(response.streaming_content))
+
+    def test_regeneration_rewrites_only_changed_segments(self):
+        post_segments = len({post.pk // 10 for post in self.posts})
+        # The category segment has no modification time and is rewritten every run
+        self.assertEqual(sitemaps.generate(), {'written': post_segments + 1, 'unchanged': 0, 'removed': 0})
+        self.assertEqual(sitemaps.generate(), {'written': 1, 'unchanged': post_segments, 'removed': 0})
+
+        edited = self.posts[-1]
+        edited.slug = 'edited-title'
+        edited.save()
+        self.assertEqual(sitemaps.generate(), {'written': 2, 'unchanged': post_segments - 1, 'removed': 0})
+        segment = f'posts-{edited.pk // 10:05d}'
+        self.assertIn('/post/edited-title/', self.read(segment))
+
+        for post in Post.objects.filter(pk__gte=edited.pk // 10 * 10):
+            post.delete()
+        self.assertEqual(sitemaps.generate()['removed'], 1)
+        self.assertFalse(os.path.exists(sitemaps.sitemap_path(segment)))
+
+    def test_robots_advertises_sitemap_without_blocking_anything(self):
+        response = self.client.get(reverse('blog:robots_txt'))
+        self.assertEqual(response.content.decode(), 'User-agent: *\nDisallow:\nSitemap: https://blog.example/sitemap.xml\n')
+
+
+class RelatedPostTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        python = Tag.objects.create(name='Python', slug='python')
+        self.django_post = self.create_post('Django signals', '<p>Django signals decouple model saves from caches.</p>')
+        self.orm_post = self.create_post('Django ORM', '<p>The Django ORM builds queries from model querysets.</p>')
+        self.django_post.tags.add(python)
+        self.orm_post.tags.add(python)
+        self.baking = self.create_post('Sourdough bread', '<p>Bake sourdough bread with a lively starter.</p>')
+        self.create_post('Draft about Django', '<p>Django models and signals.</p>', status='draft')
+
+    def related_ids(self, post):
+        return list(RelatedPost.objects.filter(post=post).values_list('related_id', flat=True))
+
+    def test_similar_posts_rank_first(self):
+        self.assertEqual(related.refresh(top_k=2), {'refreshed': 3, 'total': 3})
+        self.assertEqual(self.related_ids(self.django_post), [self.orm_post.pk])
+        self.assertEqual(self.related_ids(self.baking), [])
+        self.assertFalse(RelatedPost.objects.filter(related__status='draft').exists())
+
+        response = self.client.get(self.django_post.get_absolute_url())
+        self.assertEqual([card.pk for card in response.context['related_posts']], [self.orm_post.pk])
+        self.assertContains(response, 'Related Posts')
+
+    def test_refresh_only_rescores_stale_posts(self):
+        related.refresh()
+        self.assertEqual(related.refresh()['refreshed'], 0)
+
+        self.baking.content = '<p>Django querysets and model signals, baked fresh.</p>'
+        self.baking.save()
+        # The edited post, plus the posts it now belongs next to
+        self.assertEqual(related.refresh()['refreshed'], 3)
+        self.assertIn(self.baking.pk, self.related_ids(self.django_post))
+
+        self.orm_post.status = 'draft'
+        self.orm_post.save()
+        related.refresh()
+        self.assertNotIn(self.orm_post.pk, self.related_ids(self.django_post))
+        self.assertFalse(RelatedPost.objects.filter(post=self.orm_post).exists())
+
+    def test_deleting_a_post_expires_lists_showing_it(self):
+        call_command('refresh_related_posts', stdout=io.StringIO())
+        self.orm_post.delete()
+        self.assertIsNone(Post.objects.get(pk=self.django_post.pk).related_refreshed_at)
+        self.assertEqual(related.refresh()['refreshed'], 1)
+
+
+class CursorPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.create_post(f'Post {i}') for i in range(5)]
+        # Two posts share a timestamp so the id tiebreaker is exercised
+        Post.objects.filter(pk=self.posts[2].pk).update(published_at=self.posts[3].published_at)
+
+    def test_walks_forward_and_back_without_counting(self):
+        paginator = CursorPaginator(Post.objects.filter(status='published'), 2)
+        expected = list(Post.objects.order_by('-published_at', '-id').values_list('pk', flat=True))
+
+        seen, cursor, pages = [], None, []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = paginator.page(cursor)
+            self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+            pages.append(page)
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual([post.pk for post in previous], [post.pk for post in pages[1]])
+        self.assertTrue(previous.has_previous())
+
+    def test_listing_view_uses_cursor_links_and_rejects_bad_tokens(self):
+        for i in range(10):
+            self.create_post(f'Extra {i}')
+        response = self.client.get(reverse('blog:home'))
+        self.assertContains(response, '?cursor=')
+        self.assertNotContains(response, 'Page 1 of')
+
+        response = self.client.get(reverse('blog:home'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ContentPipelineTests(BlogTestCase):
+    def test_save_stores_sanitized_body_and_derived_fields(self):
+        post = self.create_post('Processed', (
+            '<h2>First part</h2><p onclick="steal()">Some words here</p>'
+            '<script>alert(1)</script><img src="/media/a.png">'
+            '<h3>Detail</h3><a href="javascript:alert(1)">link</a>'
+        ))
+
+        self.assertNotIn('script', post.rendered_content)
+        self.assertNotIn('onclick', post.rendered_content)
+        self.assertNotIn('javascript:', post.rendered_content)
+        self.assertIn('<img src="/media/a.png" loading="lazy" decoding="async">', post.rendered_content)
+        self.assertIn('<h2 id="first-part">', post.rendered_content)
+        self.assertEqual(post.toc, [
+            {'level': 2, 'id': 'first-part', 'title': 'First part'},
+            {'level': 3, 'id': 'detail', 'title': 'Detail'},
+        ])
+        self.assertEqual(post.word_count, 7)
+        self.assertEqual(post.reading_time, 1)
+        self.assertEqual(post.excerpt, 'First part Some words here Detail link')
+
+    def test_listing_does_not_load_body(self):
+        self.create_post('Listed', '<p>Body text</p>')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('blog:home'))
+        post_selects = [q['sql'] for q in queries.captured_queries if 'FROM "blog_post"' in q['sql']]
+        self.assertTrue(post_selects)
+        for sql in post_selects:
+            self.assertNotIn('"blog_post"."content"', sql)
+            self.assertNotIn('"blog_post"."rendered_content"', sql)
+
+    def test_detail_serves_rendered_body(self):
+        post = self.create_post('Shown', '<p>Visible</p><script>hidden()</script>')
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, '<p>Visible</p>')
+        self.assertNotContains(response, 'hidden()')
+
+    def test_unclosed_dropped_elements_end_with_the_document(self):
+        self.assertEqual(process_content('<p>a<iframe src="https://youtube.com/x"></p>').html, '<p>a</p>')
+        self.assertEqual(process_content('<p>a<script/>b</p>').html, '<p>ab</p>')
+
+    def test_self_closed_dropped_elements_keep_what_follows(self):
+        self.assertEqual(process_content('<p>a</p><svg/><p>kept</p>').html, '<p>a</p><p>kept</p>')
+
+
+class PostCardTests(BlogTestCase):
+    def test_cards_project_listing_fields(self):
+        category = Category.objects.create(name='Guides')
+        self.create_post('Card', category=category, featured_image='post_images/card.png')
+        self.create_post('Loose')
+
+        with self.assertNumQueries(1):
+            cards = list(Post.objects.published().order_by('title').cards())
+
+        card, loose = cards
+        self.assertIsInstance(card, PostCard)
+        self.assertEqual(card.url, reverse('blog:post_detail', kwargs={'slug': 'card'}))
+        self.assertEqual(card.category_url, category.get_absolute_url())
+        self.assertEqual(card.category_name, 'Guides')
+        self.assertEqual(card.author_username, 'author')
+        self.assertEqual(card.image_url, '/media/post_images/card.png')
+        self.assertIsNone(loose.category_url)
+        self.assertIsNone(loose.image_url)
+
+    def test_listings_render_cards(self):
+        post = self.create_post('Listed card')
+        response = self.client.get(reverse('blog:home'))
+        self.assertIsInstance(response.context['posts'][0], PostCard)
+        self.assertContains(response, f'href="{post.get_absolute_url()}"')
+
+        response = self.client.get(reverse('blog:search'), {'query': 'listed'})
+        self.assertIsInstance(response.context['posts'][0], PostCard)
+
+
+class ImageVariantTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root, BLOG_IMAGE_WIDTHS=(160, 320, 640))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size=(400, 300)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_variants_used_in_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = self.create_post('Pictured', featured_image=self.upload())
+        name = post.featured_image.name
+
+        for width in (160, 320):
+            for fmt in ('webp', 'jpeg'):
+                self.assertTrue(default_storage.exists(variant_name(name, width, fmt)))
+        # Never upscale past the original width
+        self.assertFalse(default_storage.exists(variant_name(name, 640, 'webp')))
+        with default_storage.open(variant_name(name, 160, 'jpeg')) as variant:
+            self.assertEqual(Image.open(variant).size, (160, 120))
+
+        # The generated widths were recorded; rendering never asks the storage
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError('storage checked')):
+            response = self.client.get(reverse('blog:home'))
+        self.assertContains(response, f'{default_storage.url(variant_name(name, 160, "webp"))} 160w')
+        self.assertNotContains(response, '640w')
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_backfill_command(self):
+        post = self.create_post('Backfilled', featured_image=self.upload())
+        name = post.featured_image.name
+        self.assertFalse(default_storage.exists(variant_name(name, 160, 'webp')))
+
+        call_command('generate_image_variants', workers=1, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(variant_name(name, 320, 'webp')))
+
+
+class AsyncViewTests(BlogTestCase):
+    async def get(self, view, path, **kwargs):
+        request = AsyncRequestFactory().get(path)
+        request.user = AnonymousUser()
+        request.auser = sync_to_async(lambda: request.user)
+        response = await view.as_view()(request, **kwargs)
+        if hasattr(response, 'render'):
+            await sync_to_async(response.render)()
+        return response
+
+    async def test_home_renders_posts_and_sidebar(self):
+        category = await Category.objects.acreate(name='Async')
+        post = await sync_to_async(self.create_post)('Async home', category=category)
+
+        response = await self.get(AsyncHomeView, '/')
+        self.assertContains(response, post.get_absolute_url())
+        self.assertEqual(response.context_data['categories'], [category])
+
+    async def test_detail_counts_views_and_hides_drafts(self):
+        post = await sync_to_async(self.create_post)('Async detail', '<p>Async body</p>')
+        draft = await sync_to_async(self.create_post)('Async draft', status='draft')
+
+        response = await self.get(AsyncPostDetailView, post.get_absolute_url(), slug=post.slug)
+        self.assertContains(response, 'Async body')
+        await post.arefresh_from_db()
+        self.assertEqual(post.views, 1)
+
+        # The second request is served from the page cache and still counts
+        await self.get(AsyncPostDetailView, post.get_absolute_url(), slug=post.slug)
+        await post.arefresh_from_db()
+        self.assertEqual(post.views, 2)
+
+        with self.assertRaises(Http404):
+            await self.get(AsyncPostDetailView, draft.get_absolute_url(), slug=draft.slug)
+
+
+flaky_calls = []
+
+
+@job('tests.flaky', max_attempts=2)
+def flaky_job(fail_times):
+    flaky_calls.append(fail_times)
+    if len(flaky_calls) <= fail_times:
+        raise RuntimeError('temporary failure')
+
+
+@override_settings(BLOG_JOBS_EAGER=False, BLOG_JOB_RETRY_DELAY=30)
+class JobQueueTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        flaky_calls.clear()
+
+    def test_idempotency_key_queues_once(self):
+        first = enqueue('tests.flaky', {'fail_times': 0}, key='once')
+        second = enqueue('tests.flaky', {'fail_times': 0}, key='once')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.filter(idempotency_key='once').count(), 1)
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        queued = enqueue('tests.flaky', {'fail_times': 5})
+
+        (claimed,) = claim('test-worker')
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claim('other-worker'), [])
+        with self.assertLogs('blog.jobs', 'WARNING'):
+            self.assertFalse(run(claimed))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.QUEUED, 1))
+        self.assertIn('temporary failure', queued.last_error)
+        self.assertGreater((queued.run_after - timezone.now()).total_seconds(), 25)
+        self.assertEqual(claim('test-worker'), [])
+
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        with self.assertLogs('blog.jobs', 'ERROR'):
+            self.assertFalse(run(claim('test-worker')[0]))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+
+    def test_retry_succeeds(self):
+        enqueue('tests.flaky', {'fail_times': 1})
+        with self.assertLogs('blog.jobs', 'WARNING'):
+            run(claim('test-worker')[0])
+        Job.objects.update(run_after=timezone.now())
+        self.assertTrue(run(claim('test-worker')[0]))
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_publishing_queues_notification_once(self):
+        post = self.create_post('Announced')
+        post.title = 'Announced again'
+        post.save()
+        notifications = Job.objects.filter(name='blog.notify_post_published')
+        self.assertEqual(list(notifications.values_list('idempotency_key', flat=True)), [f'post-published:{post.pk}'])
+
+        draft = self.create_post('Quiet draft', status='draft')
+        self.assertEqual(notifications.count(), 1)
+        for status in ('published', 'draft', 'published'):
+            draft.status = status
+            draft.save()
+        announced = notifications.get(idempotency_key=f'post-published:{draft.pk}')
+        self.assertFalse(announced.payload['created'])
+        self.assertEqual(notifications.count(), 2)
+
+    def test_finished_jobs_are_pruned(self):
+        old, recent = enqueue('tests.flaky', {'fail_times': 0}), enqueue('tests.flaky', {'fail_times': 0})
+        failed = enqueue('tests.flaky', {'fail_times': 0})
+        long_ago = timezone.now() - timedelta(days=30)
+        Job.objects.filter(pk=old.pk).update(status=Job.DONE, finished_at=long_ago)
+        Job.objects.filter(pk=recent.pk).update(status=Job.DONE, finished_at=timezone.now())
+        Job.objects.filter(pk=failed.pk).update(status=Job.FAILED, finished_at=long_ago)
+
+        call_command('prune_jobs', stdout=io.StringIO())
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, failed.pk})
+
+
+class FieldTrackingTests(BlogTestCase):
+    def post_selects(self, queries):
+        return [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "blog_post"' in q['sql'] and 'blog_post_search' not in q['sql']
+        ]
+
+    def test_status_transition_detected_without_reloading(self):
+        post = Post.objects.get(pk=self.create_post('Tracked', status='draft').pk)
+        post.status = 'published'
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        self.assertEqual(self.post_selects(queries), [])
+        self.assertIsNotNone(post.published_at)
+        self.assertEqual(post.loaded_values()['status'], 'published')
+
+    def test_update_fields_save_skips_tracking(self):
+        post = self.create_post('Bumped')
+        post.views = 5
+        with CaptureQueriesContext(connection) as queries:
+            post.save(update_fields=['views'])
+        self.assertEqual(self.post_selects(queries), [])
+        self.assertFalse([q for q in queries.captured_queries if 'blog_job' in q['sql']])
+
+    def test_deferred_tracked_field_is_fetched_once(self):
+        post = self.create_post('Deferred', status='draft')
+        post = Post.objects.defer('status').get(pk=post.pk)
+        self.assertEqual(post.get_stored_values()['status'], 'draft')
+        with self.assertNumQueries(0):
+            post.get_stored_values()
+
+
+class SyntheticDataTests(BlogTestCase):
+    def test_scale_mode_bulk_creates_consistent_data(self):
+        call_command('populate_data', scale=30, users=10, tags=8, chunk_size=10, seed=7, stdout=io.StringIO())
+
+        posts = Post.objects.filter(slug__startswith='synthetic-')
+        self.assertEqual(posts.count(), 30)
+        published = posts.filter(status='published')
+        self.assertFalse(published.filter(published_at__isnull=True).exists())
+        self.assertTrue(posts.exclude(rendered_content='').exists())
+        for category in Category.objects.filter(slug__startswith='synthetic-'):
+            self.assertEqual(category.published_post_count, published.filter(category=category).count())
+        self.assertTrue(search_posts(published.first().title, Post.objects.all()).count())
+
+        with self.assertRaises(CommandError):
+            call_command('populate_data', scale=5, stdout=io.StringIO())
+
+
+@override_settings(BLOG_SERVER_TIMING=True)
+class InstrumentationTests(BlogTestCase):
+    def test_server_timing_header_reports_phases_and_queries(self):
+        post = self.create_post('Timed')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(post.get_absolute_url())
+
+        timing = response['Server-Timing']
+        for phase in ('db;dur=', 'view;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(phase, timing)
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+
+    def test_async_requests_count_queries_run_in_threads(self):
+        post = self.create_post('Timed')
+        response = async_to_sync(AsyncClient().get)(post.get_absolute_url())
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    @override_settings(BLOG_REQUEST_LOG_SAMPLE_RATE=1, BLOG_SLOW_QUERY_MS=1e-9)
+    def test_logs_request_line_and_slow_queries(self):
+        with self.assertLogs('blog.instrumentation', level='INFO') as logs:
+            self.client.get(reverse('blog:home'))
+
+        request_lines = [json.loads(record.getMessage()) for record in logs.records if record.name == 'blog.instrumentation']
+        self.assertEqual(len(request_lines), 1)
+        self.assertEqual(request_lines[0]['path'], '/')
+        self.assertEqual(request_lines[0]['status'], 200)
+        slow = [record for record in logs.records if record.name == 'blog.instrumentation.sql']
+        self.assertEqual(len(slow), request_lines[0]['queries'])
+        self.assertEqual(request_lines[0]['slow_queries'], len(slow))
+
+    @override_settings(BLOG_SERVER_TIMING=False)
+    def test_header_can_be_turned_off(self):
+        self.assertFalse(self.client.get(reverse('blog:home')).has_header('Server-Timing'))
+
+    def test_header_is_off_by_default_outside_debug(self):
+        with self.settings(DEBUG=False):
+            del settings.BLOG_SERVER_TIMING
+            self.assertFalse(self.client.get(reverse('blog:home')).has_header('Server-Timing'))
+
+
+def database_state():
+    """Rows a benchmark run against the configured database must leave alone"""
+    return {
+        'comments': list(Comment.objects.order_by('pk').values_list('pk', 'approved')),
+        'views': list(Post.objects.order_by('pk').values_list('pk', 'views', 'trending_score')),
+        'buckets': PostViewBucket.objects.count(),
+        'sessions': Session.objects.count(),
+        'logins': list(User.objects.order_by('pk').values_list('pk', 'last_login', 'last_activity')),
+    }
+
+
+class BenchmarkTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        call_command('populate_data', scale=20, users=10, tags=5, comments=4, seed=3, stdout=io.StringIO())
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        self.output = output.name
+
+    def benchmark(self, *args):
+        call_command(
+            'benchmark', '--use-current-db', '--requests', '3', '--warmup', '0', '--output', self.output,
+            *args, stdout=io.StringIO(),
+        )
+        with open(self.output) as handle:
+            return json.load(handle)
+
+    def test_writes_results_for_every_read_only_endpoint(self):
+        state = database_state()
+        endpoints = self.benchmark()['endpoints']
+        self.assertEqual(set(endpoints), {endpoint.name for endpoint in benchmarks.ENDPOINTS if not endpoint.writes})
+        # The configured database is left as it was
+        self.assertEqual(database_state(), state)
+        for name, result in endpoints.items():
+            self.assertEqual(result['requests'], 3)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertTrue(all(status < 400 for status in result['statuses']), name)
+        self.assertGreater(endpoints['post_detail']['queries'], 0)
+
+    def test_fails_on_query_regression_against_baseline(self):
+        results = self.benchmark('--endpoint', 'home')
+        results['endpoints']['home']['queries'] -= 1
+        baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(baseline))
+        with open(baseline, 'w') as handle:
+            json.dump(results, handle)
+
+        with self.assertRaisesMessage(CommandError, 'home:'):
+            self.benchmark('--endpoint', 'home', '--baseline', baseline, '--tolerance', '100')
+
+
+class QueryPlanTests(BlogTestCase):
+    def test_reports_plans_for_every_endpoint(self):
+        call_command('populate_data', scale=20, users=10, tags=5, comments=4, seed=3, stdout=io.StringIO())
+        state = database_state()
+        out = io.StringIO()
+        call_command(
+            'explain_queries', '--use-current-db', '--format', 'json', '--min-rows', '0',
+            stdout=out, stderr=io.StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(database_state(), state)
+        self.assertEqual(set(report), {endpoint.name for endpoint in benchmarks.ENDPOINTS if not endpoint.writes})
+        self.assertGreater(report['post_detail']['explained'], 0)
+        for name, result in report.items():
+            self.assertLess(result['status'], 400, name)
+            for finding in result['findings']:
+                self.assertIn(finding['kind'].split()[0], ('sequential', 'sort'), name)
+
+    def test_suggests_missing_composite_index(self):
+        sql = (
+            'SELECT "blog_post"."id" FROM "blog_post" WHERE ("blog_post"."author_id" = %s '
+            'AND "blog_post"."status" = %s) ORDER BY "blog_post"."created_at" DESC LIMIT 10'
+        )
+        self.assertEqual(
+            queryplans.suggest_index(sql, 'blog_post'), ('blog.Post', ['author', 'status', '-created_at'])
+        )
+        # A unique column already narrows the lookup to one row
+        self.assertIsNone(queryplans.suggest_index(sql.replace('author_id', 'slug'), 'blog_post'))
+
+    def test_comment_pages_are_read_in_index_order(self):
+        post = self.create_post('Commented post')
+        Comment.objects.create(post=post, user=self.author, content='First', approved=True)
+        page = Comment.objects.filter(post=post, approved=True).order_by('-created_at', '-id')[:21]
+        findings, lines = queryplans.explain(*page.query.sql_with_params())
+        self.assertEqual(findings, [])
+        self.assertTrue(any('blog_comment_post_keyset_idx' in line for line in lines), lines)
+
+
+def route(request):
+    """Where reads of posts and sessions go while ``request`` is being served"""
+    router = routers.PrimaryReplicaRouter()
+    seen = {}
+
+    def view(request):
+        seen['post'] = router.db_for_read(Post)
+        seen['session'] = router.db_for_read(Session)
+        return HttpResponse()
+
+    response = routers.PrimaryPinningMiddleware(view)(request)
+    return seen, response
+
+
+# The router is not installed in tests; it is asked directly where reads would go
+@override_settings(BLOG_DATABASE_REPLICAS=['replica1'], BLOG_PRIMARY_PIN_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    def test_safe_requests_read_from_a_replica(self):
+        seen, response = route(RequestFactory().get('/'))
+        self.assertEqual(seen['post'], 'replica1')
+        self.assertEqual(seen['session'], 'default')
+        self.assertNotIn('blog_primary', response.cookies)
+        # Outside a request nothing is routed
+        self.assertIsNone(routers.PrimaryReplicaRouter().db_for_read(Post))
+        self.assertEqual(routers.PrimaryReplicaRouter().db_for_write(Post), 'default')
+
+    def test_writes_pin_the_browser_to_the_primary(self):
+        seen, response = route(RequestFactory().post('/'))
+        self.assertEqual(seen['post'], 'default')
+        self.assertEqual(response.cookies['blog_primary']['max-age'], 10)
+
+        request = RequestFactory().get('/')
+        request.COOKIES['blog_primary'] = '1'
+        self.assertEqual(route(request)[0]['post'], 'default')
+
+    def test_pages_rendered_from_a_replica_after_a_bump_expire_with_the_lag(self):
+        get_cache().clear()
+        timeouts = []
+
+        def view(request):
+            timeouts.append(lag_safe_timeout(300))
+            bump_versions([HOME])
+            timeouts.extend([lag_safe_timeout(300), lag_safe_timeout(None)])
+            return HttpResponse()
+
+        routers.PrimaryPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(timeouts, [300, 10, 10])
+        # Pinned requests read the primary, which is never behind
+        self.assertEqual(lag_safe_timeout(300), 300)
+
+    @override_settings(BLOG_DATABASE_REPLICAS=[])
+    def test_middleware_unused_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            routers.PrimaryPinningMiddleware(lambda request: HttpResponse())
+
+
+@override_settings(BLOG_DATABASE_REPLICAS=['replica1'])
+class ReplicaPinningTests(BlogTestCase):
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        # Every test runs inside a transaction
+        self.assertEqual(route(RequestFactory().get('/'))[0]['post'], 'default')
+
+    def test_page_cache_miss_reads_from_a_replica(self):
+        self.create_post('Cached')
+        decisions = []
+
+        def db_for_read(router, model, **hints):
+            # Record the request's choice; the query itself still runs on the test database
+            decisions.append(routers._read_database.get())
+            return None
+
+        with mock.patch.object(routers.PrimaryReplicaRouter, 'db_for_read', db_for_read), \
+                self.settings(DATABASE_ROUTERS=['blog.routers.PrimaryReplicaRouter']):
+            response = self.client.get(reverse('blog:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(decisions)
+        self.assertEqual(set(decisions), {'replica1'})
+
+    def test_redirect_after_comment_is_pinned(self):
+        post = self.create_post('Pinned')
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('blog:add_comment', args=[post.slug]), {'content': 'First!'})
+        self.assertRedirects(response, post.get_absolute_url())
+        self.assertIn('blog_primary', response.cookies)
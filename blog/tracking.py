@@ -0,0 +1,65 @@
+"""
+Change tracking for model fields.
+
+Models list the fields they care about in ``tracked_fields`` (attribute
+names, e.g. ``category_id``). Their values are remembered when an instance
+is loaded from the database and refreshed after every save, so signal
+handlers can compare old and new values without reading the row again.
+"""
+from django.db.models import DEFERRED
+
+
+class TrackedFieldsMixin:
+    """Remember the stored values of ``tracked_fields`` on model instances"""
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.tracked_fields and value is not DEFERRED
+        }
+        return instance
+
+    def loaded_values(self):
+        """Tracked values known from loading or saving, without querying"""
+        return dict(getattr(self, '_stored_values', {}))
+
+    def get_stored_values(self):
+        """
+        Return every tracked field as currently stored, or None if the row
+        does not exist yet. Only fields deferred at load time (or instances
+        built by hand) cost a query.
+        """
+        if self.pk is None:
+            return None
+        stored = self.loaded_values()
+        missing = [name for name in self.tracked_fields if name not in stored]
+        if missing:
+            row = type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values(*missing).first()
+            if row is None:
+                return None
+            stored.update(row)
+            self._stored_values = {**getattr(self, '_stored_values', {}), **row}
+        return stored
+
+    def _written_by(self, name, update_fields):
+        field = self._meta.get_field(name)
+        return field.name in update_fields or field.attname in update_fields
+
+    def tracks_any(self, update_fields):
+        """Whether a save limited to ``update_fields`` can change a tracked field"""
+        return any(self._written_by(name, update_fields) for name in self.tracked_fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save handlers have seen the old values; these are now the stored ones
+        update_fields = kwargs.get('update_fields')
+        self._stored_values = {
+            **getattr(self, '_stored_values', {}),
+            **{
+                name: getattr(self, name) for name in self.tracked_fields
+                if update_fields is None or self._written_by(name, update_fields)
+            },
+        }
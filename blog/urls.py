@@ -1,23 +1,48 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, feeds, views
 
 app_name = 'blog'
 
+
+def read_view(sync_view, async_view):
+    """Use the async variant of a public read view when BLOG_ASYNC_VIEWS is on"""
+    return (async_view if settings.BLOG_ASYNC_VIEWS else sync_view).as_view()
+
+
 urlpatterns = [
     # Home and search
-    path('', views.HomeView.as_view(), name='home'),
-    path('search/', views.SearchView.as_view(), name='search'),
+    path('', read_view(views.HomeView, async_views.AsyncHomeView), name='home'),
+    path('search/', read_view(views.SearchView, async_views.AsyncSearchView), name='search'),
     
     # Post management
-    path('post/<slug:slug>/', views.PostDetailView.as_view(), name='post_detail'),
-    path('post/<slug:slug>/comment/', views.add_comment, name='add_comment'),
     path('post/create/', views.PostCreateView.as_view(), name='post_create'),
+    path('post/<slug:slug>/', read_view(views.PostDetailView, async_views.AsyncPostDetailView), name='post_detail'),
+    path('post/<slug:slug>/comment/', views.add_comment, name='add_comment'),
+    path('post/<slug:slug>/comments/', views.CommentPageView.as_view(), name='post_comments'),
     path('post/<slug:slug>/edit/', views.PostUpdateView.as_view(), name='post_update'),
     path('post/<slug:slug>/delete/', views.PostDeleteView.as_view(), name='post_delete'),
     
     # Category and tag filtering
-    path('category/<slug:slug>/', views.CategoryPostsView.as_view(), name='category_posts'),
-    path('tag/<slug:slug>/', views.TagPostsView.as_view(), name='tag_posts'),
+    path('category/<slug:slug>/', read_view(views.CategoryPostsView, async_views.AsyncCategoryPostsView), name='category_posts'),
+    path('tag/<slug:slug>/', read_view(views.TagPostsView, async_views.AsyncTagPostsView), name='tag_posts'),
+    
+    # Popularity rankings
+    path('trending/', views.RankedPostsView.as_view(ranking='trending'), name='trending'),
+    path('popular/', views.RankedPostsView.as_view(ranking='popular'), name='popular'),
+    
+    # Syndication feeds
+    path('feed/', feeds.LatestPostsFeed(), name='latest_feed'),
+    path('feed/atom/', feeds.AtomLatestPostsFeed(), name='latest_atom_feed'),
+    path('category/<slug:slug>/feed/', feeds.CategoryFeed(), name='category_feed'),
+    path('category/<slug:slug>/feed/atom/', feeds.AtomCategoryFeed(), name='category_atom_feed'),
+    path('tag/<slug:slug>/feed/', feeds.TagFeed(), name='tag_feed'),
+    path('tag/<slug:slug>/feed/atom/', feeds.AtomTagFeed(), name='tag_atom_feed'),
+    
+    # Sitemaps
+    path('sitemap.xml', views.sitemap, name='sitemap_index'),
+    path('sitemap-<slug:segment>.xml', views.sitemap, name='sitemap_segment'),
+    path('robots.txt', views.robots_txt, name='robots_txt'),
     
     # Author dashboard
     path('dashboard/', views.AuthorDashboardView.as_view(), name='author_dashboard'),
@@ -25,4 +50,5 @@ urlpatterns = [
     # Comment moderation
     path('comment/<int:pk>/approve/', views.approve_comment, name='approve_comment'),
     path('comment/<int:pk>/delete/', views.delete_comment, name='delete_comment'),
+    path('comments/moderate/', views.moderate_comments, name='moderate_comments'),
 ]
@@ -0,0 +1,137 @@
+"""
+Write-behind buffer for post view counts.
+
+Page views are counted in process memory and written back periodically by a
+background thread as one ``UPDATE ... SET views = views + n`` per distinct
+increment. Detail pages no longer issue a read-modify-write save on the
+hottest row of the table, and concurrent workers cannot lose each other's
+updates because the database applies the increments. The same statements
+add the views to the decayed scores of ``blog.popularity``.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10
+
+
+def counting_enabled():
+    """Whether detail pages count views at all"""
+    return getattr(settings, 'BLOG_VIEW_COUNTING', True)
+
+
+def get_flush_interval():
+    """Seconds between flushes; 0 writes every view through immediately"""
+    return getattr(settings, 'BLOG_VIEW_COUNT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+class ViewCountBuffer:
+    """Per-process counter of post views waiting to be written"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._in_flight = Counter()
+        self._worker = None
+
+    def record(self, post_id):
+        """Count one view and return the views of this post not yet persisted"""
+        if not counting_enabled():
+            return self.pending(post_id)
+        with self._lock:
+            self._pending[post_id] += 1
+            unsaved = self._pending[post_id] + self._in_flight[post_id]
+        if get_flush_interval() <= 0:
+            self.flush()
+        else:
+            self._ensure_worker()
+        return unsaved
+
+    def pending(self, post_id):
+        """Return the views of a post that have not been written yet"""
+        with self._lock:
+            return self._pending[post_id] + self._in_flight[post_id]
+
+    def flush(self):
+        """Write buffered views to the database and return how many were written"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, Counter()
+            self._in_flight.update(batch)
+
+        from . import popularity
+        from .models import Post
+
+        # Posts with the same number of new views share a single UPDATE
+        by_increment = defaultdict(list)
+        for post_id, count in batch.items():
+            by_increment[count].append(post_id)
+        now = timezone.now()
+        try:
+            with transaction.atomic(using=Post.objects.db):
+                for increment, post_ids in by_increment.items():
+                    Post.objects.filter(pk__in=post_ids).update(
+                        views=F('views') + increment, **popularity.score_updates(increment, now)
+                    )
+                popularity.record_buckets(batch, now)
+        except DatabaseError:
+            with self._lock:
+                self._pending.update(batch)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.subtract(batch)
+                self._in_flight = +self._in_flight
+        self._refresh_rankings()
+        return sum(batch.values())
+
+    def _refresh_rankings(self):
+        from . import popularity
+
+        try:
+            popularity.refresh_if_due()
+        except DatabaseError:
+            # The views are saved; the rankings catch up on the next flush
+            logger.exception('Failed to refresh trending rankings')
+
+    def _ensure_worker(self):
+        # Started lazily so every (forked) worker process gets its own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(max(get_flush_interval(), 1))
+            try:
+                if not self.flush():
+                    # Rankings still decay and their window moves on an idle site
+                    self._refresh_rankings()
+            except Exception:
+                logger.exception('Failed to flush buffered post views')
+            finally:
+                connections.close_all()
+
+
+view_counts = ViewCountBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counts.flush()
+    except Exception:
+        logger.exception('Failed to flush buffered post views on shutdown')
@@ -1,57 +1,164 @@
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.db.models import Count, Max, Q
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.template.response import TemplateResponse
+from django.views.decorators.http import condition, require_POST
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
 from .models import Post, Category, Tag, Comment
-from .forms import PostForm, CommentForm, SearchForm
+from .forms import PostForm, CommentForm, CommentModerationForm, SearchForm
+from .pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+from .cache import AnonymousPageCacheMixin, HOME, TAXONOMY, category_scope, post_scope, tag_scope
+from .conditional import ConditionalGetMixin, CursorPageConditionalMixin
+from . import popularity, sitemaps
+from .related import related_cards
+from .search import search_posts
+from .viewcounts import view_counts
 
 
-class HomeView(ListView):
+class HomeView(AnonymousPageCacheMixin, CursorPageConditionalMixin, CursorPaginationMixin, ListView):
     """Home page with list of published posts"""
     model = Post
     template_name = 'blog/home.html'
     context_object_name = 'posts'
     paginate_by = 9
+    pagination_mode = 'cursor'
+    trending_size = 5
+    
+    def get_page_cache_scopes(self):
+        return [HOME, TAXONOMY]
+    
+    def get_validator_queryset(self):
+        return Post.objects.published()
+    
+    def get_validators(self):
+        validators = super().get_validators()
+        if validators is None:
+            return None
+        # The sidebar moves with the trending ranking, not with the listing
+        last_modified, parts = validators
+        return last_modified, (parts, popularity.get_ranking(popularity.TRENDING)[:self.trending_size])
     
     def get_queryset(self):
-        return Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags')
+        return Post.objects.published().cards()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['search_form'] = SearchForm()
-        context['categories'] = Category.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0)
-        context['tags'] = Tag.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0)
+        context['categories'] = Category.objects.filter(published_post_count__gt=0)
+        context['tags'] = Tag.objects.filter(published_post_count__gt=0)
+        context['trending_posts'] = self.get_trending_posts()
         return context
+    
+    def get_trending_posts(self):
+        return popularity.ranked_cards(popularity.TRENDING, self.trending_size)
+
 
+def get_comment_paginator(post_id):
+    """Approved comments of a post, newest first, paged on (created_at, id)"""
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id, approved=True).select_related('user'),
+        getattr(settings, 'BLOG_COMMENTS_PER_PAGE', 20),
+        ordering=('-created_at', '-id'),
+    )
 
-class PostDetailView(DetailView):
+
+class PostDetailView(AnonymousPageCacheMixin, ConditionalGetMixin, DetailView):
     """Post detail view with comments"""
     model = Post
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
     
+    def get_page_cache_scopes(self):
+        return [post_scope(self.kwargs['slug']), TAXONOMY]
+    
+    def get_page_cache_meta(self):
+        return {'post_id': self.object.pk}
+    
+    def page_cache_hit(self, request, meta):
+        view_counts.record(meta['post_id'])
+    
+    def get_validators(self):
+        row = (
+            self.get_visible_posts(self.request.user)
+            .filter(slug=self.kwargs['slug'])
+            .values('pk', 'updated_at', 'approved_comment_count')
+            .annotate(latest_comment=Max('comments__updated_at', filter=Q(comments__approved=True)))
+            .first()
+        )
+        if row is None:
+            return None
+        self.validated_post_id = row['pk']
+        last_modified = max(filter(None, (row['updated_at'], row['latest_comment'])))
+        return last_modified, (row['pk'], row['updated_at'], row['approved_comment_count'], row['latest_comment'])
+    
+    def not_modified(self, request):
+        # The reader still viewed the post, just from their own cache
+        view_counts.record(self.validated_post_id)
+    
     def get_queryset(self):
-        qs = super().get_queryset()
-        if self.request.user.is_authenticated and self.request.user.is_author():
+        return self.get_visible_posts(self.request.user)
+    
+    def get_visible_posts(self, user):
+        """Published posts, plus drafts for authors who may preview them"""
+        # The page shows the pre-rendered body, never the raw editor HTML
+        qs = super().get_queryset().defer('content')
+        if user.is_authenticated and user.is_author():
             return qs
         return qs.filter(status='published')
     
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        # Increment view count
-        obj.views += 1
-        obj.save(update_fields=['views'])
+        # Buffer the view; the page shows the stored count plus unflushed views
+        obj.views += view_counts.record(obj.pk)
         return obj
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['comments'] = self.object.comments.filter(approved=True).select_related('user')
+        context['comments_page'] = self.get_comments_page()
+        context['related_posts'] = related_cards(self.object)
         context['comment_form'] = CommentForm()
         return context
+    
+    def get_comments_page(self):
+        """The first page of comments; later ones come from CommentPageView"""
+        return get_comment_paginator(self.object.pk).page()
+
+
+class CommentPageView(AnonymousPageCacheMixin, View):
+    """Further comments of a post, as an HTML fragment or with ?format=json"""
+    template_name = 'blog/includes/comment_list.html'
+    
+    def get_page_cache_scopes(self):
+        return [post_scope(self.kwargs['slug'])]
+    
+    def get(self, request, slug):
+        posts = Post.objects.filter(slug=slug)
+        if not (request.user.is_authenticated and request.user.is_author()):
+            posts = posts.filter(status='published')
+        post_id = posts.values_list('pk', flat=True).first()
+        if post_id is None:
+            raise Http404('No post found matching the query')
+        try:
+            page = get_comment_paginator(post_id).page(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        
+        context = {'comments_page': page, 'post_slug': slug}
+        if request.GET.get('format') == 'json':
+            return JsonResponse({
+                'html': TemplateResponse(request, self.template_name, context).render().rendered_content,
+                'next_cursor': page.next_cursor,
+            })
+        return TemplateResponse(request, self.template_name, context)
 
 
 @login_required
@@ -77,16 +184,23 @@ def add_comment(request, slug):
     return redirect('blog:post_detail', slug=slug)
 
 
-class CategoryPostsView(ListView):
+class CategoryPostsView(AnonymousPageCacheMixin, CursorPageConditionalMixin, CursorPaginationMixin, ListView):
     """Posts filtered by category"""
     model = Post
     template_name = 'blog/category_posts.html'
     context_object_name = 'posts'
     paginate_by = 9
+    pagination_mode = 'cursor'
+    
+    def get_page_cache_scopes(self):
+        return [category_scope(self.kwargs['slug']), TAXONOMY]
+    
+    def get_validator_queryset(self):
+        return Post.objects.published().filter(category__slug=self.kwargs['slug'])
     
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        return Post.objects.filter(category=self.category, status='published').select_related('author', 'category')
+        return Post.objects.published().filter(category=self.category).cards()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -94,16 +208,23 @@ class CategoryPostsView(ListView):
         return context
 
 
-class TagPostsView(ListView):
+class TagPostsView(AnonymousPageCacheMixin, CursorPageConditionalMixin, CursorPaginationMixin, ListView):
     """Posts filtered by tag"""
     model = Post
     template_name = 'blog/tag_posts.html'
     context_object_name = 'posts'
     paginate_by = 9
+    pagination_mode = 'cursor'
+    
+    def get_page_cache_scopes(self):
+        return [tag_scope(self.kwargs['slug']), TAXONOMY]
+    
+    def get_validator_queryset(self):
+        return Post.objects.published().filter(tags__slug=self.kwargs['slug'])
     
     def get_queryset(self):
         self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
-        return Post.objects.filter(tags=self.tag, status='published').select_related('author', 'category')
+        return Post.objects.published().filter(tags=self.tag).cards()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -111,20 +232,22 @@ class TagPostsView(ListView):
         return context
 
 
-class SearchView(ListView):
-    """Search posts by title or content"""
+class SearchView(CursorPaginationMixin, ListView):
+    """Search posts by title or content, ranked by relevance"""
     model = Post
     template_name = 'blog/search_results.html'
     context_object_name = 'posts'
     paginate_by = 9
+    # Results are ordered by relevance, which has no stable keyset
+    pagination_mode = 'offset'
     
     def get_queryset(self):
-        query = self.request.GET.get('query', '')
+        query = self.request.GET.get('query', '').strip()
         if query:
-            return Post.objects.filter(
-                Q(title__icontains=query) | Q(content__icontains=query),
-                status='published'
-            ).select_related('author', 'category')
+            return search_posts(
+                query,
+                Post.objects.published().cards()
+            )
         return Post.objects.none()
     
     def get_context_data(self, **kwargs):
@@ -134,6 +257,22 @@ class SearchView(ListView):
         return context
 
 
+class RankedPostsView(ListView):
+    """Posts of one of the precomputed popularity rankings"""
+    template_name = 'blog/ranked_posts.html'
+    context_object_name = 'posts'
+    ranking = popularity.TRENDING
+    
+    def get_queryset(self):
+        return popularity.ranked_cards(self.ranking)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['ranking'] = self.ranking
+        context['popular_days'] = popularity.get_popular_window().days
+        return context
+
+
 class AuthorDashboardView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     """Dashboard for authors to manage their posts"""
     model = Post
@@ -146,18 +285,20 @@ class AuthorDashboardView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     
     def get_queryset(self):
         if self.request.user.is_admin():
-            return Post.objects.all().select_related('author', 'category')
-        return Post.objects.filter(author=self.request.user).select_related('category')
+            return Post.objects.without_body().select_related('author', 'category')
+        return Post.objects.without_body().filter(author=self.request.user).select_related('category')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_admin():
-            context['pending_comments'] = Comment.objects.filter(approved=False).select_related('user', 'post')[:10]
-        else:
-            context['pending_comments'] = Comment.objects.filter(
-                post__author=self.request.user,
-                approved=False
-            ).select_related('user', 'post')[:10]
+        context['post_totals'] = self.get_queryset().order_by().aggregate(
+            total=Count('pk'), published=Count('pk', filter=Q(status='published'))
+        )
+        # Both queries read the partial index on pending comments
+        pending = moderatable_comments(self.request.user).filter(approved=False)
+        context['pending_count'] = pending.count()
+        context['pending_comments'] = pending.select_related('user', 'post').order_by('-created_at')[
+            :getattr(settings, 'BLOG_MODERATION_QUEUE_SIZE', 50)
+        ]
         return context
 
 
@@ -208,34 +349,93 @@ class PostDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+def moderatable_comments(user):
+    """Comments ``user`` may moderate: all for admins, those on their own posts otherwise"""
+    if user.is_admin():
+        return Comment.objects.all()
+    return Comment.objects.filter(post__author=user)
+
+
 @login_required
+@require_POST
 def approve_comment(request, pk):
     """Approve a comment"""
-    comment = get_object_or_404(Comment, pk=pk)
+    comment = get_object_or_404(Comment.objects.select_related('post'), pk=pk)
     
     # Check permissions
-    if not (request.user.is_admin() or comment.post.author == request.user):
+    if not (request.user.is_admin() or comment.post.author_id == request.user.pk):
         messages.error(request, 'You do not have permission to approve this comment.')
         return redirect('blog:home')
     
-    comment.approved = True
-    comment.save()
+    Comment.objects.filter(pk=comment.pk).approve()
     messages.success(request, 'Comment approved successfully!')
     
     return redirect('blog:author_dashboard')
 
 
 @login_required
+@require_POST
 def delete_comment(request, pk):
     """Delete a comment"""
-    comment = get_object_or_404(Comment, pk=pk)
+    comment = get_object_or_404(Comment.objects.select_related('post'), pk=pk)
     
     # Check permissions
-    if not (request.user.is_admin() or comment.post.author == request.user):
+    if not (request.user.is_admin() or comment.post.author_id == request.user.pk):
         messages.error(request, 'You do not have permission to delete this comment.')
         return redirect('blog:home')
     
-    comment.delete()
+    Comment.objects.filter(pk=comment.pk).purge()
     messages.success(request, 'Comment deleted successfully!')
     
     return redirect('blog:author_dashboard')
+
+
+@login_required
+@require_POST
+def moderate_comments(request):
+    """Approve, unapprove or delete a batch of comments in one statement"""
+    form = CommentModerationForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, 'Select at least one comment and an action.')
+        return redirect('blog:author_dashboard')
+    
+    # Comments the user may not moderate are silently left out
+    comments = moderatable_comments(request.user).filter(pk__in=form.cleaned_data['comment_ids'])
+    action = form.cleaned_data['action']
+    if action == 'approve':
+        count = comments.approve()
+        messages.success(request, f'{count} comment{"s" if count != 1 else ""} approved.')
+    elif action == 'disapprove':
+        count = comments.disapprove()
+        messages.success(request, f'{count} comment{"s" if count != 1 else ""} unapproved.')
+    else:
+        count = comments.purge()
+        messages.success(request, f'{count} comment{"s" if count != 1 else ""} deleted.')
+    
+    return redirect('blog:author_dashboard')
+
+
+def _sitemap_last_modified(request, segment=sitemaps.INDEX_NAME):
+    try:
+        return datetime.fromtimestamp(os.stat(sitemaps.sitemap_path(segment)).st_mtime, tz=dt_timezone.utc)
+    except FileNotFoundError:
+        return None
+
+
+@condition(last_modified_func=_sitemap_last_modified)
+def sitemap(request, segment=sitemaps.INDEX_NAME):
+    """Serve the sitemap index or one segment written by generate_sitemaps"""
+    try:
+        return FileResponse(open(sitemaps.sitemap_path(segment), 'rb'), content_type='application/xml')
+    except FileNotFoundError:
+        raise Http404('Sitemap not generated yet.')
+
+
+def robots_txt(request):
+    """Point crawlers at the sitemap"""
+    lines = [
+        'User-agent: *',
+        'Disallow:',
+        f'Sitemap: {settings.BLOG_SITE_URL.rstrip("/")}/sitemap.xml',
+    ]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain')